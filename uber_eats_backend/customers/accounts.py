@@ -0,0 +1,15 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+
+# Creates the user (and, through the post_save signal, its customer) and its token from an already hashed password
+def create_account(username, email, encoded_password):
+    with transaction.atomic():
+        user = User.objects.create(
+            username=User.normalize_username(username),
+            email=User.objects.normalize_email(email),
+            password=encoded_password,
+        )
+        token = Token.objects.create(user=user)
+    return user, token
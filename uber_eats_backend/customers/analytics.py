@@ -0,0 +1,146 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import DishDailySales, Order, OrderItem, RestaurantDailySales
+
+# Buckets the analytics endpoint can group the daily rollups into
+PERIODS = {
+    'day': None,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+# Longest range one request may cover, which bounds the rows read per request
+MAX_RANGE_DAYS = 731
+DEFAULT_RANGE_DAYS = 30
+
+
+def _decimal(value):
+    # SQLite can hand sums of decimal columns back as floats
+    return value if isinstance(value, Decimal) else Decimal(str(value or 0))
+
+
+def _money(value):
+    return str(_decimal(value).quantize(Decimal('0.01')))
+
+
+def _average_basket(revenue, orders):
+    return _money(_decimal(revenue) / orders) if orders else None
+
+
+def sales_report(restaurant_id, start, end, period='day', top=10):
+    """Revenue, order counts, average basket and top dishes between two dates (inclusive).
+
+    Reads only the daily rollup rows in range: two aggregate queries whatever
+    the order volume.
+    """
+    days = RestaurantDailySales.objects.filter(restaurant_id=restaurant_id, day__range=(start, end))
+    if PERIODS[period] is not None:
+        days = days.annotate(bucket=PERIODS[period]('day'))
+    else:
+        days = days.annotate(bucket=F('day'))
+    rows = days.values('bucket').annotate(
+        revenue=Sum('revenue'), orders=Sum('order_count'), items=Sum('item_count'),
+    ).order_by('bucket')
+    series = [
+        {
+            'period_start': row['bucket'],
+            'revenue': _money(row['revenue']),
+            'orders': row['orders'],
+            'items': row['items'],
+            'average_basket': _average_basket(row['revenue'], row['orders']),
+        }
+        for row in rows
+    ]
+
+    revenue = sum((_decimal(row['revenue']) for row in series), Decimal('0'))
+    orders = sum(row['orders'] for row in series)
+    top_dishes = (
+        DishDailySales.objects.filter(restaurant_id=restaurant_id, day__range=(start, end))
+        .values('dish_id', 'dish__name')
+        .annotate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+        .filter(quantity__gt=0)
+        .order_by('-revenue', 'dish_id')[:top]
+    )
+    return {
+        'period': period,
+        'start': start,
+        'end': end,
+        'totals': {
+            'revenue': _money(revenue),
+            'orders': orders,
+            'average_basket': _average_basket(revenue, orders),
+        },
+        'series': series,
+        'top_dishes': [
+            {'dish_id': dish['dish_id'], 'name': dish['dish__name'], 'quantity': dish['quantity'], 'revenue': _money(dish['revenue'])}
+            for dish in top_dishes
+        ],
+    }
+
+
+def default_range(today=None):
+    end = today or timezone.localdate()
+    return end - timedelta(days=DEFAULT_RANGE_DAYS - 1), end
+
+
+def _midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rebuild_sales_rollups(start, end, restaurant_id=None):
+    """Recompute the rollups for [start, end) from delivered orders, in one transaction.
+
+    Each pass is three GROUP BY queries (restaurant totals, item counts, dish
+    lines) over the orders in range, so the work happens in the database
+    rather than row by row in Python.
+    """
+    # Local-midnight bounds, so the range is an index scan on created_at and matches TruncDate's days
+    orders = Order.objects.filter(status='delivered', created_at__gte=_midnight(start), created_at__lt=_midnight(end))
+    items = OrderItem.objects.filter(order__in=orders)
+    rollup_filter = {'day__gte': start, 'day__lt': end}
+    if restaurant_id is not None:
+        orders = orders.filter(restaurant_id=restaurant_id)
+        items = items.filter(order__restaurant_id=restaurant_id)
+        rollup_filter['restaurant_id'] = restaurant_id
+
+    with transaction.atomic():
+        totals = {
+            (row['restaurant_id'], row['day']): row
+            for row in orders.annotate(day=TruncDate('created_at')).values('restaurant_id', 'day').annotate(
+                revenue=Sum('total_price'), orders=Count('id'),
+            ).order_by()
+        }
+        item_counts = {
+            (row['order__restaurant_id'], row['day']): row['items']
+            for row in items.annotate(day=TruncDate('order__created_at')).values('order__restaurant_id', 'day').annotate(
+                items=Sum('quantity'),
+            ).order_by()
+        }
+        dish_lines = items.annotate(day=TruncDate('order__created_at')).values('order__restaurant_id', 'dish_id', 'day').annotate(
+            # Aliased, since naming it 'quantity' would shadow the column in the revenue sum
+            units=Sum('quantity'),
+            revenue=Sum(F('quantity') * F('dish__price'), output_field=DecimalField(max_digits=14, decimal_places=2)),
+        ).order_by()
+
+        RestaurantDailySales.objects.filter(**rollup_filter).delete()
+        DishDailySales.objects.filter(**rollup_filter).delete()
+        RestaurantDailySales.objects.bulk_create([
+            RestaurantDailySales(
+                restaurant_id=restaurant, day=day, revenue=_decimal(row['revenue']), order_count=row['orders'],
+                item_count=item_counts.get((restaurant, day)) or 0,
+            )
+            for (restaurant, day), row in totals.items()
+        ], batch_size=1000)
+        DishDailySales.objects.bulk_create([
+            DishDailySales(
+                restaurant_id=row['order__restaurant_id'], dish_id=row['dish_id'], day=row['day'],
+                quantity=row['units'], revenue=_decimal(row['revenue']),
+            )
+            for row in dish_lines
+        ], batch_size=1000)
+        return len(totals)
@@ -0,0 +1,175 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import router, transaction
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+# What a token resolves to: only ids and the active flag, never profile data that can go stale
+# customer_id and restaurant_id are None when the user has no such profile
+TokenIdentity = namedtuple('TokenIdentity', ['user_id', 'customer_id', 'restaurant_id', 'is_active'])
+
+IDENTITY_FIELDS = ('user_id', 'user__customer__id', 'user__restaurant__id', 'user__is_active')
+
+
+# Per-process LRU of token key -> TokenIdentity with a time-to-live.
+# Entries are dropped when the user or a profile is saved or deleted, or the token is deleted;
+# other worker processes only see those changes once their own entry expires, which the TTL bounds.
+class TokenCache:
+    def __init__(self, timeout=60, max_entries=10_000):
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, identity)
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, identity):
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + self.timeout, identity)
+            self._keys_by_user.setdefault(identity.user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._keys_by_user.get(entry[1].user_id)
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[entry[1].user_id]
+
+
+token_cache = TokenCache(**getattr(settings, 'TOKEN_AUTH_CACHE', {}))
+
+
+def forget_user(user_id):
+    token_cache.delete_user(user_id)
+    # Again after commit, in case a concurrent request re-cached the old rows meanwhile
+    transaction.on_commit(lambda: token_cache.delete_user(user_id))
+
+
+def load_identity(key):
+    # One query on the token joined to its user and both reverse one-to-one profiles
+    row = Token.objects.filter(key=key).values_list(*IDENTITY_FIELDS).first()
+    return TokenIdentity(*row) if row is not None else None
+
+
+async def aload_identity(key):
+    row = await Token.objects.filter(key=key).values_list(*IDENTITY_FIELDS).afirst()
+    return TokenIdentity(*row) if row is not None else None
+
+
+def resolve_token(key):
+    identity = token_cache.get(key)
+    if identity is None:
+        identity = load_identity(key)
+        if identity is None:
+            return None
+        token_cache.set(key, identity)
+    return _request_user(identity)
+
+
+async def aresolve_token(key):
+    # The cache is in memory, so a hit never leaves the event loop
+    identity = token_cache.get(key)
+    if identity is None:
+        identity = await aload_identity(key)
+        if identity is None:
+            return None
+        token_cache.set(key, identity)
+    return _request_user(identity)
+
+
+def _deferred(model, **values):
+    # An instance with only these fields loaded; any other field is read from the database on access,
+    # and save() writes back only the loaded fields, so a request never saves stale columns
+    return model.from_db(router.db_for_read(model), list(values), list(values.values()))
+
+
+def _request_user(identity):
+    # New instances per request, so a view mutating request.user can't leak into the cache
+    user = _deferred(User, id=identity.user_id, is_active=identity.is_active)
+    for accessor, pk in (('customer', identity.customer_id), ('restaurant', identity.restaurant_id)):
+        related = getattr(User, accessor).related
+        profile = None
+        if pk is not None:
+            profile = _deferred(related.related_model, id=pk, user_id=identity.user_id)
+            profile._meta.get_field('user').set_cached_value(profile, user)
+        # Caching None too makes user.customer raise DoesNotExist without a query
+        related.set_cached_value(user, profile)
+    return user
+
+
+def load_profile(user, accessor):
+    # The whole customer or restaurant row (and its user) in one query, for views that read or save its fields
+    profile = getattr(user, accessor)
+    return type(profile)._default_manager.select_related('user').get(pk=profile.pk)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that answers from token_cache instead of the database.
+
+    On a hit, request.user, request.user.customer and request.user.restaurant
+    are served without a query, as instances holding only their ids; views
+    that read or save profile fields load the row (see load_profile).
+    """
+
+    def authenticate_credentials(self, key):
+        return self._credentials(key, resolve_token(key))
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views: (user, token), or None without a token header."""
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        # The same header checks and messages as TokenAuthentication.authenticate
+        if len(auth) == 1:
+            raise exceptions.AuthenticationFailed('Invalid token header. No credentials provided.')
+        if len(auth) > 2:
+            raise exceptions.AuthenticationFailed('Invalid token header. Token string should not contain spaces.')
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('Invalid token header. Token string should not contain invalid characters.')
+        return self._credentials(key, await aresolve_token(key))
+
+    def _credentials(self, key, user):
+        if user is None:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        # Only key and user are needed by the views (logout deletes by key)
+        return user, Token(key=key, user=user)
@@ -0,0 +1,132 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, connections, transaction
+from django.db.models import DecimalField, F, Sum
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from restaurants.models import Dish
+from .models import CartItem
+from .serializers import CartCustomerSerializer, CartLineSerializer
+
+# Most changes accepted by one batch request
+MAX_CART_CHANGES = 100
+
+
+def parse_cart_changes(data):
+    """Validate a batch of {dish_id, quantity} changes into {dish_id: quantity delta}.
+
+    Accepts a bare list or {"items": [...]}. A missing quantity means 1, a
+    negative one takes that many off, and repeated dishes are summed.
+    """
+    changes = data.get('items') if hasattr(data, 'get') else data
+    if not isinstance(changes, list) or not changes:
+        raise ValidationError({'items': 'Expected a non-empty list of {dish_id, quantity} changes.'})
+    if len(changes) > MAX_CART_CHANGES:
+        raise ValidationError({'items': f'At most {MAX_CART_CHANGES} changes per request.'})
+    deltas = defaultdict(int)
+    for change in changes:
+        try:
+            deltas[int(change['dish_id'])] += int(change.get('quantity', 1))
+        except (TypeError, KeyError, ValueError, AttributeError):
+            raise ValidationError({'items': 'Every change needs an integer dish_id and quantity.'})
+    return dict(deltas)
+
+
+def apply_cart_changes(customer, deltas):
+    """Merge quantity deltas into the customer's 'placing' cart in one transaction.
+
+    All dishes are validated with one in_bulk query. Existing rows are locked
+    and rewritten with a single bulk_update, new dishes are bulk-inserted, and
+    rows that drop to zero or below are deleted. Returns {dish_id: CartItem}
+    for the rows that remain, and the set of dish ids whose rows were inserted.
+    """
+    dishes = Dish.objects.only('id', 'restaurant_id').in_bulk(list(deltas))
+    unknown = sorted(set(deltas) - set(dishes))
+    if unknown:
+        raise ValidationError({'items': f'Unknown dish: {", ".join(map(str, unknown))}'})
+
+    try:
+        return _merge(customer, deltas, dishes)
+    except IntegrityError:
+        # A concurrent request inserted one of our dishes first; it's an update now
+        return _merge(customer, deltas, dishes)
+
+
+def lock_cart_rows(cart_items):
+    # Call first thing in an atomic block and read the rows through the returned queryset.
+    # select_for_update() where the database has row locks; SQLite has none (select_for_update()
+    # does nothing there), so a no-op UPDATE takes its write lock up front instead: a transaction
+    # that reads first can't upgrade to writing while another writer waits, and fails
+    if connections[cart_items.db].features.has_select_for_update:
+        return cart_items.select_for_update()
+    cart_items.update(state=F('state'))
+    return cart_items
+
+
+def _merge(customer, deltas, dishes):
+    now = timezone.now()
+    with transaction.atomic():
+        cart_items = lock_cart_rows(CartItem.objects.filter(customer=customer, state='placing', dish_id__in=list(deltas)))
+        existing = {item.dish_id: item for item in cart_items}
+        to_update, to_create, to_delete = [], [], []
+        for dish_id, delta in deltas.items():
+            item = existing.get(dish_id)
+            quantity = (item.quantity if item else 0) + delta
+            if item and quantity <= 0:
+                to_delete.append(item.id)
+            elif item:
+                # bulk_update() skips auto_now, so stamp updated_at ourselves
+                item.quantity, item.updated_at = quantity, now
+                to_update.append(item)
+            elif quantity > 0:
+                to_create.append(CartItem(
+                    customer=customer, dish_id=dish_id, restaurant_id=dishes[dish_id].restaurant_id,
+                    quantity=quantity, updated_at=now,
+                ))
+        if to_update:
+            CartItem.objects.bulk_update(to_update, ['quantity', 'updated_at'])
+        if to_create:
+            CartItem.objects.bulk_create(to_create)
+        if to_delete:
+            CartItem.objects.filter(id__in=to_delete).delete()
+    return {item.dish_id: item for item in to_update + to_create}, {item.dish_id for item in to_create}
+
+
+def cart_total(cart_items):
+    return cart_items.aggregate(
+        total=Sum(F('dish__price') * F('quantity'), output_field=DecimalField(max_digits=10, decimal_places=2))
+    )['total']
+
+
+def _format_money(value):
+    # Same string form the serializers use for prices
+    return str(value.quantize(Decimal('0.01')))
+
+
+def cart_summary(customer):
+    """Compact cart: a customer header, then lines grouped by restaurant with subtotals.
+
+    One query for the lines, however many the cart has; pass a customer
+    loaded with its user, as the header reads both.
+    """
+    cart_items = list(CartLineSerializer.setup_eager_loading(
+        CartItem.objects.filter(customer=customer, state='placing').order_by('id')
+    ))
+    restaurants = {}
+    total = Decimal('0')
+    for item, line in zip(cart_items, CartLineSerializer(cart_items, many=True).data):
+        restaurant = item.dish.restaurant
+        group = restaurants.setdefault(restaurant.id, {'id': restaurant.id, 'name': restaurant.name, 'subtotal': Decimal('0'), 'lines': []})
+        group['lines'].append(line)
+        group['subtotal'] += item.dish.price * item.quantity
+        total += item.dish.price * item.quantity
+    for group in restaurants.values():
+        group['subtotal'] = _format_money(group['subtotal'])
+    return {
+        'customer': CartCustomerSerializer(customer).data,
+        'restaurants': list(restaurants.values()),
+        'item_count': sum(len(group['lines']) for group in restaurants.values()),
+        'total_price': _format_money(total),
+    }
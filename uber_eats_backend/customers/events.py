@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+# Channel names order events are fanned out on
+def customer_channel(customer_id):
+    return f'customer:{customer_id}'
+
+
+def restaurant_channel(restaurant_id):
+    return f'restaurant:{restaurant_id}'
+
+
+class Subscription:
+    # One listener's mailbox, bound to the event loop it was created on. Events are handed over
+    # with call_soon_threadsafe, so publishers can be ordinary sync Django views running in worker
+    # threads. A slow listener loses its oldest events rather than growing without bound.
+
+    def __init__(self, broker, channels, maxsize=100):
+        self.broker = broker
+        self.channels = list(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.closed = False
+
+    async def get(self):
+        # Returns the next event, or None once the subscription is closed
+        return await self.queue.get()
+
+    def deliver(self, message):
+        if self.closed and message is not None:
+            return
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.broker.unsubscribe(self)
+        try:
+            self.loop.call_soon_threadsafe(self.deliver, None)
+        except RuntimeError:
+            pass  # Loop already closed, nobody is waiting
+
+
+class OrderEventBroker(ABC):
+    # Fans order events out to subscribers. LocalBroker covers a single process; a broker backed
+    # by Redis pub/sub or Postgres LISTEN/NOTIFY only has to implement these three methods.
+
+    @abstractmethod
+    def subscribe(self, channels):
+        # Must be called from the event loop the subscriber will read on
+        pass
+
+    @abstractmethod
+    def unsubscribe(self, subscription):
+        pass
+
+    @abstractmethod
+    def publish(self, channel, message):
+        pass
+
+
+class LocalBroker(OrderEventBroker):
+    # In-process pub/sub: publishing costs one dict lookup plus one callback per listener
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels, self.maxsize)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                listeners = self._subscribers.get(channel)
+                if listeners is not None:
+                    listeners.discard(subscription)
+                    if not listeners:
+                        del self._subscribers[channel]
+
+    def publish(self, channel, message):
+        with self._lock:
+            listeners = list(self._subscribers.get(channel, ()))
+        for subscription in listeners:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # The listener's event loop is gone
+                subscription.close()
+        return len(listeners)
+
+
+def publish_order_event(order):
+    # Compact status event, sent to the ordering customer and the restaurant
+    message = {
+        'order_id': order.id,
+        'status': order.status,
+        'customer_id': order.customer_id,
+        'restaurant_id': order.restaurant_id,
+        'updated_at': order.updated_at.isoformat() if order.updated_at else None,
+    }
+    broker.publish(customer_channel(order.customer_id), message)
+    broker.publish(restaurant_channel(order.restaurant_id), message)
+
+
+broker = import_string(getattr(settings, 'ORDER_EVENT_BROKER', 'customers.events.LocalBroker'))()
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0014_orderitem'),
+        ('restaurants', '0006_remove_restaurant_rating_dish_category_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(fields=('customer', 'idempotency_key'), name='unique_order_idempotency_key'),
+        ),
+    ]
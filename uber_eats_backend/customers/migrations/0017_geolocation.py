@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0016_cartitem_updated_at_customer_updated_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryaddress',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='deliveryaddress',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:15
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+# Fold duplicate open cart rows for the same dish into the oldest one before the constraint goes on
+def merge_duplicate_cart_items(apps, schema_editor):
+    CartItem = apps.get_model('customers', 'CartItem')
+    duplicates = (
+        CartItem.objects.filter(state='placing')
+        .values('customer_id', 'dish_id')
+        .annotate(rows=Count('id'), keep=Min('id'), quantity=Sum('quantity'))
+        .filter(rows__gt=1)
+    )
+    for group in duplicates:
+        CartItem.objects.filter(id=group['keep']).update(quantity=group['quantity'])
+        CartItem.objects.filter(
+            state='placing', customer_id=group['customer_id'], dish_id=group['dish_id'],
+        ).exclude(id=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0017_geolocation'),
+        ('restaurants', '0011_geolocation'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('state', 'placing')), fields=('customer', 'dish'), name='unique_placing_cart_item'),
+        ),
+    ]
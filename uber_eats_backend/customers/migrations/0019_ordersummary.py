@@ -0,0 +1,55 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.utils import timezone
+
+
+def backfill_order_summaries(apps, schema_editor):
+    Order = apps.get_model('customers', 'Order')
+    OrderSummary = apps.get_model('customers', 'OrderSummary')
+    now = timezone.now()
+    orders = Order.objects.select_related('customer__user').annotate(item_count=Sum('items__quantity')).order_by('id')
+    OrderSummary.objects.bulk_create((
+        OrderSummary(
+            order_id=order.id,
+            restaurant_id=order.restaurant_id,
+            status=order.status,
+            total_price=order.total_price,
+            created_at=order.created_at,
+            customer_name=order.customer.name or order.customer.user.username,
+            item_count=order.item_count or 0,
+            updated_at=now,
+        )
+        for order in orders.iterator(chunk_size=1000)
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0018_cart_item_unique_dish'),
+        ('restaurants', '0011_geolocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('new', 'New'), ('preparing', 'Preparing'), ('on_the_way', 'On the Way'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled'), ('pickup_ready', 'Pick up Ready'), ('picked_up', 'Picked Up')], max_length=20)),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField()),
+                ('customer_name', models.CharField(max_length=150)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='summary', to='customers.order')),
+                ('restaurant', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='restaurants.restaurant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['restaurant', 'status', '-created_at'], name='order_summary_status_idx'), models.Index(fields=['restaurant', '-created_at'], name='order_summary_recent_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_order_summaries, migrations.RunPython.noop),
+    ]
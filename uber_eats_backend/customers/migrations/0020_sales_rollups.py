@@ -0,0 +1,44 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0019_ordersummary'),
+        ('restaurants', '0011_geolocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DishDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('dish', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='restaurants.dish')),
+                ('restaurant', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='restaurants.restaurant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['restaurant', 'day'], name='dish_daily_sales_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('dish', 'day'), name='unique_dish_daily_sales')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RestaurantDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('restaurant', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='restaurants.restaurant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('restaurant', 'day'), name='unique_restaurant_daily_sales')],
+            },
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+# Keep the oldest of any duplicate favorites before the unique constraint goes on
+def drop_duplicate_favorites(apps, schema_editor):
+    FavoriteRestaurant = apps.get_model('customers', 'FavoriteRestaurant')
+    duplicates = (
+        FavoriteRestaurant.objects.values('customer_id', 'restaurant_id')
+        .annotate(rows=Count('id'), keep=Min('id'))
+        .filter(rows__gt=1)
+    )
+    for group in duplicates:
+        FavoriteRestaurant.objects.filter(
+            customer_id=group['customer_id'], restaurant_id=group['restaurant_id'],
+        ).exclude(id=group['keep']).delete()
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0020_sales_rollups'),
+        ('restaurants', '0011_geolocation'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_favorites, migrations.RunPython.noop),
+        # The composite indexes go on before the single-column foreign key indexes they replace come off
+        migrations.AddIndex(
+            model_name='cartitem',
+            index=models.Index(fields=['customer', 'state', 'restaurant'], name='cart_item_checkout_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deliveryaddress',
+            index=models.Index(fields=['customer', 'is_default'], name='delivery_address_default_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', '-created_at', '-id'], name='order_customer_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['restaurant', 'status'], name='order_restaurant_status_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='favoriterestaurant',
+            constraint=models.UniqueConstraint(fields=('customer', 'restaurant'), name='unique_favorite_restaurant'),
+        ),
+        migrations.AlterField(
+            model_name='cartitem',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='customers.customer'),
+        ),
+        migrations.AlterField(
+            model_name='deliveryaddress',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='customers.customer'),
+        ),
+        migrations.AlterField(
+            model_name='favoriterestaurant',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='customers.customer'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='customers.customer'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='restaurant',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='restaurants.restaurant'),
+        ),
+    ]
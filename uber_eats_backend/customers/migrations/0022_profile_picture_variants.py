@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0021_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='profile_picture_variants',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0022_profile_picture_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryaddress',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -1,9 +1,15 @@
 # Importing necessary modules from Django
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete, pre_save, post_save, post_delete
 from django.dispatch import receiver
 from restaurants.models import Restaurant, Dish
+from restaurants.geo import get_geocoder
+from rest_framework.authtoken.models import Token
+from .authentication import forget_user, token_cache
+from . import events
+from uber_eats_backend.images import track_image
 
 # Defining the Customer model, extending Django's User model
 class Customer(models.Model):
@@ -12,6 +18,7 @@ class Customer(models.Model):
     
     # Fields for the customer profile
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True)
+    profile_picture_variants = models.JSONField(null=True, blank=True)  # Resized copies, see uber_eats_backend.images
     date_of_birth = models.DateField(null=True, blank=True)
     city = models.CharField(max_length=100, blank=True)
     state = models.CharField(max_length=100, blank=True)
@@ -20,11 +27,16 @@ class Customer(models.Model):
     phone_number = models.CharField(max_length=20, blank=True)
     name = models.CharField(max_length=100, blank=True)
     email = models.CharField(max_length=100, blank=True)
+    # Version stamp for conditional GETs
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         # Returns the username of the associated User
         return self.user.username
 
+# Render thumbnails of new profile pictures in the background
+track_image(Customer, 'profile_picture', 'profile_picture_variants')
+
 # Signal to create a Customer instance when a User is created
 @receiver(post_save, sender=User)
 def create_customer(sender, instance, created, **kwargs):
@@ -36,25 +48,59 @@ def create_customer(sender, instance, created, **kwargs):
 def save_customer(sender, instance, **kwargs):
     instance.customer.save()
 
+# Drop cached token identities when the user or their customer profile changes
+@receiver([post_save, post_delete], sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+@receiver([post_save, post_delete], sender=Customer)
+def forget_cached_customer(sender, instance, **kwargs):
+    forget_user(instance.user_id)
+
+@receiver(post_delete, sender=Token)
+def forget_cached_token(sender, instance, **kwargs):
+    token_cache.delete(instance.key)
+
 # Defining the DeliveryAddress model for storing customer addresses
 class DeliveryAddress(models.Model):
-    customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, db_index=False)  # Leads delivery_address_default_idx
     address_line1 = models.CharField(max_length=255)
     city = models.CharField(max_length=100)
     state = models.CharField(max_length=100)
     postal_code = models.CharField(max_length=20)
     country = models.CharField(max_length=100)
     is_default = models.BooleanField(default=False)
+    latitude = models.FloatField(null=True, blank=True)  # Geocoded from the postal code
+    longitude = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Version stamp for the orders it is nested in
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'is_default'], name='delivery_address_default_idx'),
+        ]
 
     def __str__(self):
         # Returns a string representation of the address
         return f"{self.address_line1}, {self.city}, {self.state}"
 
+# Signal to geocode a delivery address before it is saved
+@receiver(pre_save, sender=DeliveryAddress)
+def locate_delivery_address(sender, instance, **kwargs):
+    coordinates = get_geocoder().geocode(instance.address_line1, instance.postal_code, instance.country)
+    if coordinates:
+        instance.latitude, instance.longitude = coordinates
+
 # Defining the FavoriteRestaurant model for storing a customer's favorite restaurants
 class FavoriteRestaurant(models.Model):
-    customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, db_index=False)  # Leads unique_favorite_restaurant
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            # A restaurant is either a favorite or not; toggle_favorite's get_or_create relies on this under races
+            models.UniqueConstraint(fields=['customer', 'restaurant'], name='unique_favorite_restaurant'),
+        ]
+
 # Defining the Order model for storing customer orders
 class Order(models.Model):
     # Choices for the order status
@@ -67,12 +113,43 @@ class Order(models.Model):
         ('pickup_ready', 'Pick up Ready'),
         ('picked_up', 'Picked Up'),
     ]
-    customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
-    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE)
+    # Both foreign keys lead a composite index below, which also serves their plain lookups
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, db_index=False)
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, db_index=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='new')
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Version stamp for conditional GETs
     delivery_address = models.ForeignKey(DeliveryAddress, on_delete=models.SET_NULL, null=True)
+    # Client-supplied Idempotency-Key header, so retried checkouts return the original order
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'idempotency_key'], name='unique_order_idempotency_key'),
+        ]
+        indexes = [
+            # Order history: one customer's orders newest first, in the cursor pagination's order
+            models.Index(fields=['customer', '-created_at', '-id'], name='order_customer_recent_idx'),
+            # Restaurant order lists, optionally narrowed to a status
+            models.Index(fields=['restaurant', 'status'], name='order_restaurant_status_idx'),
+        ]
+
+    # The status as last read from the database (None if unknown), see claim_sales_transition
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._loaded_status = self.__dict__.get('status')
+
+# Signal to push the order's status to listening customers and restaurants once the change is committed
+@receiver(post_save, sender=Order)
+def publish_order_status(sender, instance, **kwargs):
+    transaction.on_commit(lambda: events.publish_order_event(instance))
 
 # Defining the OrderItem model for items in an order
 class OrderItem(models.Model):  
@@ -84,9 +161,174 @@ class OrderItem(models.Model):
         # Returns a string representation of the order item
         return f"{self.dish.name} (x{self.quantity})"
 
+# Denormalized copy of what restaurant dashboards list, so they read one narrow table
+class OrderSummary(models.Model):
+    order = models.OneToOneField(Order, related_name='summary', on_delete=models.CASCADE)
+    # The dashboard indexes below lead with restaurant, so no separate FK index
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, db_index=False)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()
+    customer_name = models.CharField(max_length=150)
+    item_count = models.PositiveIntegerField(default=0)  # Sum of item quantities
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['restaurant', 'status', '-created_at'], name='order_summary_status_idx'),
+            models.Index(fields=['restaurant', '-created_at'], name='order_summary_recent_idx'),
+        ]
+
+
+def customer_display_name(customer):
+    return customer.name or customer.user.username
+
+
+def sync_order_summary(order):
+    # One upsert with everything recomputed from the order, its customer and items
+    item_count = order.items.aggregate(count=models.Sum('quantity'))['count'] or 0
+    OrderSummary.objects.bulk_create([OrderSummary(
+        order=order,
+        restaurant_id=order.restaurant_id,
+        status=order.status,
+        total_price=order.total_price,
+        created_at=order.created_at,
+        customer_name=customer_display_name(order.customer),
+        item_count=item_count,
+        updated_at=timezone.now(),
+    )], update_conflicts=True, unique_fields=['order'], update_fields=[
+        'restaurant', 'status', 'total_price', 'created_at', 'customer_name', 'item_count', 'updated_at',
+    ])
+
+# Keep the summary in step with its order. A status change only touches the
+# status and total; new (or not yet summarized) orders get the full upsert
+@receiver(post_save, sender=Order)
+def update_order_summary(sender, instance, created, **kwargs):
+    if not created and OrderSummary.objects.filter(order=instance).update(
+        status=instance.status, total_price=instance.total_price, updated_at=timezone.now(),
+    ):
+        return
+    sync_order_summary(instance)
+
+# Item counts follow single item saves; bulk_create skips signals, so place_order syncs itself
+@receiver(post_save, sender=OrderItem)
+def update_order_summary_items(sender, instance, **kwargs):
+    sync_order_summary(instance.order)
+
+# Deletes may be cascading from the order itself, so resync after commit and only if the order survived
+@receiver(post_delete, sender=OrderItem)
+def update_order_summary_removed_item(sender, instance, **kwargs):
+    def resync():
+        order = Order.objects.filter(pk=instance.order_id).first()
+        if order is not None:
+            sync_order_summary(order)
+    transaction.on_commit(resync)
+
+# A renamed customer shows up under the new name on their past orders too
+@receiver(post_save, sender=Customer)
+def rename_order_summaries(sender, instance, created, **kwargs):
+    if not created:
+        name = customer_display_name(instance)
+        OrderSummary.objects.filter(order__customer=instance).exclude(customer_name=name).update(customer_name=name)
+
+# Pre-aggregated sales per restaurant and day (of the order), counting delivered orders only.
+# Weekly and monthly figures are summed from these rows, so analytics cost depends on the
+# date range asked for, never on the number of orders
+class RestaurantDailySales(models.Model):
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, db_index=False)
+    day = models.DateField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.PositiveIntegerField(default=0)
+    item_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['restaurant', 'day'], name='unique_restaurant_daily_sales'),
+        ]
+
+class DishDailySales(models.Model):
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, db_index=False)
+    dish = models.ForeignKey(Dish, on_delete=models.CASCADE, db_index=False)
+    day = models.DateField()
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # At the dish's price when recorded
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dish', 'day'], name='unique_dish_daily_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['restaurant', 'day'], name='dish_daily_sales_day_idx'),
+        ]
+
+
+def _add_to_rollup(model, keys, deltas, **create_fields):
+    # row += deltas, creating the row on first use; a racing insert turns into the update
+    increments = {field: models.F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**keys).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **deltas, **create_fields)
+    except IntegrityError:
+        model.objects.filter(**keys).update(**increments)
+
+
+def record_sales(order, sign=1):
+    """Add a delivered order to the daily rollups (sign=-1 takes it back out)."""
+    day = timezone.localdate(order.created_at)
+    items = list(order.items.values_list('dish_id', 'quantity', 'dish__price'))
+    _add_to_rollup(RestaurantDailySales, {'restaurant_id': order.restaurant_id, 'day': day}, {
+        'revenue': sign * order.total_price,
+        'order_count': sign,
+        'item_count': sign * sum(quantity for _, quantity, _ in items),
+    })
+    for dish_id, quantity, price in items:
+        _add_to_rollup(
+            DishDailySales, {'dish_id': dish_id, 'day': day},
+            {'quantity': sign * quantity, 'revenue': sign * quantity * price},
+            restaurant_id=order.restaurant_id,
+        )
+
+# Whether this save makes the order delivered (+1) or takes it back out (-1). Saves that leave the
+# status alone, or keep it on the same side of 'delivered' as loaded, skip straight past; otherwise the
+# database decides rather than the loaded status: of several saves racing on one order, only one
+# conditional UPDATE matches, so a delivery is counted once
+@receiver(pre_save, sender=Order)
+def claim_sales_transition(sender, instance, update_fields=None, **kwargs):
+    instance._sales_delta = 0
+    if instance._state.adding:
+        instance._sales_delta = 1 if instance.status == 'delivered' else 0
+        return
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    loaded = getattr(instance, '_loaded_status', None)
+    if loaded is not None and (loaded == 'delivered') == (instance.status == 'delivered'):
+        return
+    rows = Order.objects.filter(pk=instance.pk)
+    if instance.status == 'delivered':
+        instance._sales_delta = rows.exclude(status='delivered').update(status='delivered')
+    else:
+        instance._sales_delta = -rows.filter(status='delivered').update(status=instance.status)
+
+@receiver(post_save, sender=Order)
+def update_sales_rollups(sender, instance, created, update_fields=None, **kwargs):
+    delta = getattr(instance, '_sales_delta', 0)
+    if delta:
+        record_sales(instance, sign=delta)
+    instance._sales_delta = 0
+    if update_fields is None or 'status' in update_fields:
+        instance._loaded_status = instance.status
+
+# Before the delete cascades, so the items can be taken back out along with the totals
+@receiver(pre_delete, sender=Order)
+def remove_deleted_order_sales(sender, instance, **kwargs):
+    if Order.objects.filter(pk=instance.pk, status='delivered').exists():
+        record_sales(instance, sign=-1)
+
 # Defining the CartItem model for items in a customer's cart
 class CartItem(models.Model):
-    customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, db_index=False)  # Leads cart_item_checkout_idx
     dish = models.ForeignKey(Dish, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, null=True) 
@@ -94,6 +336,20 @@ class CartItem(models.Model):
     STATE = [ ('placing', "Placing"), ('placed', 'Placed')]
     state = models.CharField(max_length=20, choices=STATE, default='placing')
     order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Version stamp for conditional GETs
+
+    class Meta:
+        constraints = [
+            # One open cart row per dish; adding the same dish again merges quantities
+            models.UniqueConstraint(
+                fields=['customer', 'dish'], condition=models.Q(state='placing'), name='unique_placing_cart_item',
+            ),
+        ]
+        indexes = [
+            # State before restaurant, so the cart listing (customer, state) and checkout
+            # (customer, state, restaurant) both seek on the same index
+            models.Index(fields=['customer', 'state', 'restaurant'], name='cart_item_checkout_idx'),
+        ]
 
     def __str__(self):
         # Returns a string representation of the cart item
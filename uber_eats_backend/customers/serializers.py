@@ -1,9 +1,11 @@
 # Importing necessary modules from Django REST Framework
 from rest_framework import serializers
+from django.db.models import Prefetch
 from django.contrib.auth.models import User
-from .models import Customer, Order, FavoriteRestaurant, CartItem, DeliveryAddress, OrderItem
+from .models import Customer, Order, FavoriteRestaurant, CartItem, DeliveryAddress, OrderItem, OrderSummary
 from restaurants.serializers import RestaurantSerializer, DishSerializer
 from .models import Restaurant, Dish
+from uber_eats_backend.images import ImageVariantsField
 
 # Serializer for the User model
 class UserSerializer(serializers.ModelSerializer):
@@ -21,6 +23,7 @@ class UserSerializer(serializers.ModelSerializer):
 # Serializer for the Customer model
 class CustomerSerializer(serializers.ModelSerializer):
     user = UserSerializer()  # Nested serializer for User
+    profile_picture_variants = ImageVariantsField()  # Thumbnail URLs, filled in after upload
 
     class Meta:
         model = Customer
@@ -65,6 +68,11 @@ class OrderItemSerializer(serializers.ModelSerializer):
         model = OrderItem
         fields = ['id', 'dish', 'quantity']  # Fields to include in the serialized representation
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # Load the nested dish in the same query as the items
+        return queryset.select_related('dish')
+
 # Serializer for the Order model
 class OrderSerializer(serializers.ModelSerializer):
     delivery_address = DeliveryAddressSerializer(read_only=True)  # Nested read-only delivery address serializer
@@ -77,6 +85,16 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = '__all__'  # Include all fields from the Order model
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # Join the single-valued relations and prefetch the items with their dishes,
+        # so a list of orders is serialized in a fixed number of queries
+        return queryset.select_related(
+            'customer__user', 'restaurant', 'delivery_address'
+        ).prefetch_related(
+            Prefetch('items', queryset=OrderItemSerializer.setup_eager_loading(OrderItem.objects.all()))
+        )
+
 # Serializer for the CartItem model
 class CartItemSerializer(serializers.ModelSerializer):
     customer = CustomerSerializer(read_only=True)  # Nested read-only customer serializer
@@ -87,8 +105,47 @@ class CartItemSerializer(serializers.ModelSerializer):
         model = CartItem
         fields = ['id', 'dish', 'quantity', 'restaurant', 'customer', 'order']  # Fields to include
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # One query for the lines with their customer and dish; open cart rows have no order
+        return queryset.select_related('customer__user', 'dish', 'order')
+
+# Compact cart: the customer once, then lines carrying only what the cart shows
+class CartCustomerSerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source='user.username', read_only=True)
+
+    class Meta:
+        model = Customer
+        fields = ['id', 'username', 'name']
+
+class CartLineSerializer(serializers.ModelSerializer):
+    dish_id = serializers.IntegerField(read_only=True)
+    name = serializers.CharField(source='dish.name', read_only=True)
+    price = serializers.DecimalField(source='dish.price', max_digits=10, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = CartItem
+        fields = ['id', 'dish_id', 'name', 'price', 'quantity']
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # The lines, their dishes and restaurant names in one query, reading only the columns shown
+        return queryset.select_related('dish__restaurant').only(
+            'id', 'quantity', 'dish__name', 'dish__price', 'dish__restaurant__name',
+        )
+
 # Serializer for the Dish model
 class DishSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Dish
-        fields = ['id', 'name', 'description', 'price', 'image', 'is_vegetarian', 'is_vegan', 'is_gluten_free']  # Fields to include
+        fields = ['id', 'name', 'description', 'price', 'image', 'image_variants', 'is_vegetarian', 'is_vegan', 'is_gluten_free']  # Fields to include
+
+# Serializer for the OrderSummary read model behind the restaurant dashboard
+class OrderSummarySerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='order_id', read_only=True)  # The order's id, not the summary row's
+
+    class Meta:
+        model = OrderSummary
+        fields = ['id', 'status', 'total_price', 'created_at', 'customer_name', 'item_count']
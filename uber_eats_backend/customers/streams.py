@@ -0,0 +1,85 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+
+from . import events
+from .authentication import resolve_token
+
+# Seconds between keep-alive comments, so proxies don't close idle streams
+HEARTBEAT_INTERVAL = 15
+
+
+def _token_key(scope):
+    # EventSource can't set headers, so the token may also come as ?token=
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            keyword, _, key = value.decode('latin-1').partition(' ')
+            if keyword == 'Token' and key:
+                return key.strip()
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    return query.get('token', [None])[0]
+
+
+@sync_to_async
+def _channels_for_token(key):
+    # Same token cache as the REST API, so reconnects don't hit the database
+    user = resolve_token(key)
+    if user is None or not user.is_active:
+        return None
+    channels = []
+    if getattr(user, 'customer', None) is not None:
+        channels.append(events.customer_channel(user.customer.pk))
+    if getattr(user, 'restaurant', None) is not None:
+        channels.append(events.restaurant_channel(user.restaurant.pk))
+    return channels
+
+
+async def _send_json(send, status, payload):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': json.dumps(payload).encode()})
+
+
+async def order_stream(scope, receive, send):
+    """ASGI app streaming order status events as Server-Sent Events.
+
+    Customers get events for their own orders, restaurant owners for orders
+    placed with their restaurant. An idle connection is one coroutine parked
+    on a queue, with a heartbeat comment every HEARTBEAT_INTERVAL seconds.
+    """
+    key = _token_key(scope)
+    channels = await _channels_for_token(key) if key else None
+    if channels is None:
+        await _send_json(send, 401, {'detail': 'Authentication credentials were not provided.'})
+        return
+
+    subscription = events.broker.subscribe(channels)
+
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        subscription.close()
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),  # Stop nginx from buffering the stream
+        ]})
+        await send({'type': 'http.response.body', 'body': b': connected\n\n', 'more_body': True})
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.get(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                await send({'type': 'http.response.body', 'body': b': heartbeat\n\n', 'more_body': True})
+                continue
+            if message is None:
+                break
+            body = f'event: order_status\ndata: {json.dumps(message)}\n\n'.encode()
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        subscription.close()
+        watcher.cancel()
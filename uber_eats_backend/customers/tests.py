@@ -1,3 +1,769 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_login_failed
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from restaurants.models import Restaurant, Dish
+from uber_eats_backend import passwords
+from uber_eats_backend.log import AsyncQueueHandler, SamplingFilter, StructuredFormatter, field_names, lazy, parse_levels
+from . import events
+from .authentication import TokenCache, TokenIdentity, resolve_token, token_cache
+from .cart import lock_cart_rows
+from .events import LocalBroker
+from .models import CartItem, Customer, Order, OrderItem, DeliveryAddress
+from .streams import order_stream
+
+
+# Builds a customer, a restaurant with a couple of dishes and a delivery address
+def create_catalogue(username='alice'):
+    user = User.objects.create_user(username=username, password='secret', email=f'{username}@example.com')
+    owner = User.objects.create_user(username=f'{username}_owner', password='secret')
+    restaurant = Restaurant.objects.create(user=owner, name='Pizza Palace', description='Best pizza in town')
+    dishes = [
+        Dish.objects.create(restaurant=restaurant, name='Margherita Pizza', description='Classic', price=Decimal('10.99')),
+        Dish.objects.create(restaurant=restaurant, name='Caesar Salad', description='Fresh', price=Decimal('8.99')),
+    ]
+    address = DeliveryAddress.objects.create(
+        customer=user.customer, address_line1='1 Main St', city='San Jose',
+        state='CA', postal_code='95112', country='USA', is_default=True,
+    )
+    return user, restaurant, dishes, address
+
+
+# Bulk inserts `count` orders (two items each) so large fixtures stay cheap to build
+def create_orders(customer, restaurant, dishes, address, count):
+    orders = Order.objects.bulk_create([
+        Order(customer=customer, restaurant=restaurant, total_price=Decimal('19.98'), delivery_address=address)
+        for _ in range(count)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, dish=dish, quantity=1) for order in orders for dish in dishes
+    ])
+    return orders
+
+
+class OrderQueryCountTests(TestCase):
+    def setUp(self):
+        self.user, self.restaurant, self.dishes, self.address = create_catalogue()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    # Grows the order table through `sizes` and checks the query count never moves
+    def assertConstantQueries(self, url, sizes=(10, 1_000)):
+        counts = []
+        created = 0
+        for size in sizes:
+            create_orders(self.user.customer, self.restaurant, self.dishes, self.address, size - created)
+            created = size
+            counts.append(self.count_queries(url))
+        self.assertEqual(len(set(counts)), 1, f'Query count grew with the number of orders: {counts}')
+
+    def test_restaurant_orders_constant_queries(self):
+        self.assertConstantQueries(f'/api/restaurants/{self.restaurant.id}/orders/', sizes=(10, 100, 10_000))
+
+    def test_order_list_constant_queries(self):
+        self.assertConstantQueries('/api/orders/')
+
+    def test_order_history_constant_queries(self):
+        self.assertConstantQueries('/api/orders/order_history/')
+
+    def test_order_detail_constant_queries(self):
+        order = create_orders(self.user.customer, self.restaurant, self.dishes, self.address, 1)[0]
+        self.assertLessEqual(self.count_queries(f'/api/orders/getOrderDetail/?orderId={order.id}'), 3)
+
+
+class OrderHistoryPaginationTests(TestCase):
+    def setUp(self):
+        self.user, self.restaurant, self.dishes, self.address = create_catalogue()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def walk_pages(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(order['id'] for order in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_pages_cover_history_newest_first(self):
+        orders = create_orders(self.user.customer, self.restaurant, self.dishes, self.address, 45)
+        # Give a block of orders the same timestamp so the id tie-breaker is exercised
+        Order.objects.filter(id__in=[order.id for order in orders[10:30]]).update(created_at=orders[10].created_at)
+
+        ids = self.walk_pages('/api/orders/order_history/?page_size=10')
+
+        expected = list(Order.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_page_includes_items(self):
+        create_orders(self.user.customer, self.restaurant, self.dishes, self.address, 3)
+        response = self.client.get('/api/orders/order_history/')
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(len(response.data['results'][0]['items']), 2)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/orders/order_history/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class PlaceOrderTests(TestCase):
+    def setUp(self):
+        self.user, self.restaurant, self.dishes, self.address = create_catalogue()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        for quantity, dish in enumerate(self.dishes, start=1):
+            CartItem.objects.create(customer=self.user.customer, dish=dish, quantity=quantity, restaurant=self.restaurant)
+
+    def place_order(self, **headers):
+        return self.client.post('/api/orders/place_order/', {
+            'restaurant_id': self.restaurant.id,
+            'delivery_address_id': self.address.id,
+        }, format='json', headers=headers)
+
+    def test_place_order_totals_and_claims_cart(self):
+        response = self.place_order()
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual(order.total_price, Decimal('10.99') + Decimal('8.99') * 2)
+        self.assertEqual(order.items.count(), 2)
+        self.assertFalse(CartItem.objects.filter(state='placing').exists())
+        self.assertEqual(CartItem.objects.filter(order=order).count(), 2)
+
+    def test_empty_cart(self):
+        self.place_order()
+        response = self.place_order()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_idempotency_key_replays_original_order(self):
+        first = self.place_order(**{'Idempotency-Key': 'checkout-1'})
+        retry = self.place_order(**{'Idempotency-Key': 'checkout-1'})
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_other_customers_address_rejected(self):
+        other, _, _, other_address = create_catalogue('bob')
+        response = self.client.post('/api/orders/place_order/', {
+            'restaurant_id': self.restaurant.id,
+            'delivery_address_id': other_address.id,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.count(), 0)
+
+
+class ConcurrentPlaceOrderTests(TransactionTestCase):
+    workers = 8
+
+    def setUp(self):
+        self.user, self.restaurant, self.dishes, self.address = create_catalogue()
+        for dish in self.dishes:
+            CartItem.objects.create(customer=self.user.customer, dish=dish, quantity=1, restaurant=self.restaurant)
+
+    # Fires `workers` checkouts of the same cart at once and returns their status codes
+    def stress(self, headers_for):
+        barrier = threading.Barrier(self.workers)
+        results = []
+
+        def checkout(index):
+            client = APIClient()
+            client.force_authenticate(user=self.user)
+            barrier.wait()
+            try:
+                response = client.post('/api/orders/place_order/', {
+                    'restaurant_id': self.restaurant.id,
+                    'delivery_address_id': self.address.id,
+                }, format='json', headers=headers_for(index))
+                results.append((response.status_code, response.data.get('id')))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(index,)) for index in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def assertPlacedOnce(self):
+        order = Order.objects.get()
+        self.assertEqual(order.items.count(), len(self.dishes))
+        self.assertEqual(CartItem.objects.filter(order=order, state='placed').count(), len(self.dishes))
+        return order
+
+    def test_parallel_checkouts_place_cart_once(self):
+        results = self.stress(lambda index: {})
+        order = self.assertPlacedOnce()
+        created = [order_id for code, order_id in results if code == 201]
+        self.assertEqual(created, [order.id])
+        # Every other checkout found the cart already claimed
+        self.assertTrue(all(code in (400, 409) for code, _ in results if code != 201))
+
+    def test_parallel_retries_share_idempotency_key(self):
+        results = self.stress(lambda index: {'Idempotency-Key': 'same-checkout'})
+        order = self.assertPlacedOnce()
+        for code, order_id in results:
+            if code in (200, 201):
+                self.assertEqual(order_id, order.id)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user, self.restaurant, self.dishes, self.address = create_catalogue()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def revalidate(self, url, response):
+        return self.client.get(url, headers={'If-None-Match': response['ETag']})
+
+    def test_order_detail(self):
+        order = create_orders(self.user.customer, self.restaurant, self.dishes, self.address, 1)[0]
+        url = f'/api/orders/getOrderDetail/?orderId={order.id}'
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        order.status = 'preparing'
+        order.save()
+        response = self.revalidate(url, first)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'preparing')
+
+    def test_order_detail_follows_nested_rows(self):
+        order = create_orders(self.user.customer, self.restaurant, self.dishes, self.address, 1)[0]
+        url = f'/api/orders/getOrderDetail/?orderId={order.id}'
+        first = self.client.get(url)
+
+        self.address.city = 'Oakland'
+        self.address.save()
+        second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['delivery_address']['city'], 'Oakland')
+
+        # The nested customer shows the user's email, which has no timestamp of its own
+        self.user.email = 'alice@new.example.com'
+        self.user.save()
+        third = self.revalidate(url, second)
+        self.assertEqual(third.status_code, 200)
+        self.assertEqual(third.data['customer']['user']['email'], 'alice@new.example.com')
+
+    def test_customer_follows_user(self):
+        url = f'/api/customers/{self.user.customer.pk}/'
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        self.user.email = 'alice@new.example.com'
+        self.user.save()
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_cart_items(self):
+        CartItem.objects.create(customer=self.user.customer, dish=self.dishes[0], restaurant=self.restaurant)
+        first = self.client.get('/api/cart-items/')
+        self.assertEqual(self.revalidate('/api/cart-items/', first).status_code, 304)
+
+        # A price change on a dish in the cart is a new version of the cart
+        self.dishes[0].price = Decimal('11.99')
+        self.dishes[0].save()
+        self.assertEqual(self.revalidate('/api/cart-items/', first).status_code, 200)
+
+    def test_cart_items_follow_customer(self):
+        CartItem.objects.create(customer=self.user.customer, dish=self.dishes[0], restaurant=self.restaurant)
+        first = self.client.get('/api/cart-items/')
+        customer = Customer.objects.get(user=self.user)
+        customer.name = 'Alice Renamed'
+        customer.save()
+        self.assertEqual(self.revalidate('/api/cart-items/', first).status_code, 200)
+
+    def test_etag_is_per_user(self):
+        CartItem.objects.create(customer=self.user.customer, dish=self.dishes[0], restaurant=self.restaurant)
+        first = self.client.get('/api/cart-items/')
+        other, _, _, _ = create_catalogue('bob')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.revalidate('/api/cart-items/', first).status_code, 200)
+
+
+class RecordingBroker(LocalBroker):
+    def __init__(self):
+        super().__init__()
+        self.published = []
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+
+
+class OrderEventBrokerTests(SimpleTestCase):
+    def test_local_broker_fans_out_by_channel(self):
+        async def scenario():
+            broker = LocalBroker()
+            customer = broker.subscribe(['customer:1'])
+            restaurant = broker.subscribe(['restaurant:1'])
+            broker.publish('customer:1', {'order_id': 1})
+            self.assertEqual(await customer.get(), {'order_id': 1})
+            self.assertTrue(restaurant.queue.empty())
+            customer.close()
+            self.assertEqual(broker.publish('customer:1', {'order_id': 2}), 0)
+            restaurant.close()
+        async_to_sync(scenario)()
+
+    def test_slow_listener_drops_oldest(self):
+        async def scenario():
+            broker = LocalBroker(maxsize=2)
+            subscription = broker.subscribe(['customer:1'])
+            for order_id in range(3):
+                broker.publish('customer:1', {'order_id': order_id})
+            await asyncio.sleep(0)
+            self.assertEqual([(await subscription.get())['order_id'] for _ in range(2)], [1, 2])
+            subscription.close()
+        async_to_sync(scenario)()
+
+
+class OrderStreamTests(TestCase):
+    def setUp(self):
+        self.user, self.restaurant, self.dishes, self.address = create_catalogue()
+        self.token = Token.objects.create(user=self.user)
+        self.order = create_orders(self.user.customer, self.restaurant, self.dishes, self.address, 1)[0]
+
+    def test_status_change_is_published_on_commit(self):
+        recorder = RecordingBroker()
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        with mock.patch.object(events, 'broker', recorder), self.captureOnCommitCallbacks(execute=True):
+            client.post('/api/orders/updateOrderStatus/', {'orderId': self.order.id, 'status': 'preparing'})
+        channels = [channel for channel, _ in recorder.published]
+        self.assertEqual(channels, [f'customer:{self.user.customer.id}', f'restaurant:{self.restaurant.id}'])
+        self.assertEqual(recorder.published[0][1]['status'], 'preparing')
+
+    def stream(self, query_string, after_connect=None):
+        sent = []
+
+        async def scenario():
+            disconnected = asyncio.Event()
+
+            async def receive():
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+                if message.get('body') == b': connected\n\n':
+                    if after_connect:
+                        await sync_to_async(after_connect)()
+                    await asyncio.sleep(0)
+                elif message.get('more_body'):
+                    disconnected.set()
+
+            scope = {'type': 'http', 'path': '/api/stream/orders/', 'headers': [], 'query_string': query_string}
+            await asyncio.wait_for(order_stream(scope, receive, send), 5)
+        async_to_sync(scenario)()
+        return sent
+
+    def test_stream_pushes_order_events(self):
+        sent = self.stream(f'token={self.token.key}'.encode(), lambda: events.publish_order_event(self.order))
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        event = sent[2]['body'].decode()
+        self.assertTrue(event.startswith('event: order_status\n'))
+        self.assertIn(f'"order_id": {self.order.id}', event)
+
+    def test_stream_requires_token(self):
+        sent = self.stream(b'token=bogus')
+        self.assertEqual(sent[0]['status'], 401)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user, self.restaurant, self.dishes, self.address = create_catalogue()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def auth_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # Lookups of the token, the user or their profiles (joins from the data queries don't count)
+        return [q['sql'] for q in queries if any(
+            f' FROM "{table}"' in q['sql'] for table in ('authtoken_token', 'auth_user', 'customers_customer', 'restaurants_restaurant')
+        )]
+
+    def test_cached_token_needs_no_auth_queries(self):
+        self.assertEqual(len(self.auth_queries('/api/favorite-restaurants/')), 1)
+        self.assertEqual(self.auth_queries('/api/favorite-restaurants/'), [])
+        # The profile view reads its row, but never the token again
+        queries = self.auth_queries('/api/customers/profile/')
+        self.assertEqual(len(queries), 1)
+        self.assertIn('FROM "customers_customer"', queries[0])
+
+    def test_writes_log_without_loading_the_user(self):
+        self.client.get('/api/favorite-restaurants/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/delivery-addresses/', {
+                'address_line1': '1 Market St', 'city': 'San Jose', 'state': 'CA', 'postal_code': '95113', 'country': 'US',
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(any(' FROM "auth_user"' in q['sql'] for q in queries))
+
+    def test_restaurant_owner_is_cached_too(self):
+        token = Token.objects.create(user=self.restaurant.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.client.get('/api/restaurants/dashboard/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/restaurants/dashboard/')
+        self.assertEqual(response.data['name'], 'Pizza Palace')
+        self.assertFalse(any('authtoken_token' in q['sql'] for q in queries))
+
+    def test_logout_invalidates_token(self):
+        self.client.get('/api/customers/profile/')
+        self.assertEqual(self.client.post('/api/customers/logout/').status_code, 200)
+        self.assertEqual(self.client.get('/api/customers/profile/').status_code, 401)
+
+    def test_profile_save_invalidates_entry(self):
+        self.client.get('/api/customers/profile/')
+        customer = Customer.objects.get(user=self.user)
+        customer.nickname = 'Ally'
+        customer.save()
+        self.assertEqual(self.client.get('/api/customers/profile/').data['customer']['nickname'], 'Ally')
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get('/api/customers/profile/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/customers/profile/').status_code, 401)
+
+    def test_changes_from_other_processes_are_not_hidden(self):
+        # A queryset update sends no signals, like a save in another worker: the cached entry stays
+        self.client.get('/api/customers/profile/')
+        Customer.objects.filter(user=self.user).update(name='Alice Renamed')
+        User.objects.filter(pk=self.user.pk).update(email='new@example.com')
+        data = self.client.get('/api/customers/profile/').data
+        self.assertEqual(data['customer']['name'], 'Alice Renamed')
+        self.assertEqual(data['email'], 'new@example.com')
+
+    def test_update_profile_keeps_other_columns(self):
+        self.client.get('/api/customers/profile/')
+        Customer.objects.filter(user=self.user).update(name='Alice Renamed')
+        response = self.client.patch('/api/customers/update_profile/', {'nickname': 'Ally'}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        customer = Customer.objects.get(user=self.user)
+        self.assertEqual((customer.name, customer.nickname), ('Alice Renamed', 'Ally'))
+
+    def test_view_mutations_do_not_leak_into_cache(self):
+        user = resolve_token(self.token.key)
+        user.customer.nickname = 'changed in a view'
+        self.assertEqual(resolve_token(self.token.key).customer.nickname, '')
+
+    def test_entries_expire(self):
+        cache = TokenCache(timeout=60, max_entries=2)
+        identity = TokenIdentity(self.user.pk, None, None, True)
+        with mock.patch('customers.authentication.time.monotonic', return_value=1000.0):
+            cache.set('a', identity)
+        with mock.patch('customers.authentication.time.monotonic', return_value=1059.0):
+            self.assertIs(cache.get('a'), identity)
+        with mock.patch('customers.authentication.time.monotonic', return_value=1061.0):
+            self.assertIsNone(cache.get('a'))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TokenCache(timeout=60, max_entries=2)
+        for key in 'abc':
+            cache.set(key, TokenIdentity(self.user.pk, None, None, True))
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 2)
+        cache.delete_user(self.user.pk)
+        self.assertEqual(len(cache), 0)
+
+
+class LoginSignupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_signup_then_login(self):
+        response = self.client.post('/api/customers/signup/', {
+            'username': 'carol', 'password': 'pa55word', 'email': 'carol@example.com',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        user = User.objects.get(username='carol')
+        self.assertTrue(user.check_password('pa55word'))
+        self.assertEqual(Token.objects.get(user=user).key, response.json()['token'])
+
+        response = self.client.post('/api/customers/login/', {'username': 'carol', 'password': 'pa55word'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['user']['username'], 'carol')
+
+    def test_form_encoded_login(self):
+        User.objects.create_user(username='dave', password='secret')
+        response = self.client.post('/api/customers/login/', {'username': 'dave', 'password': 'secret'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_bad_credentials(self):
+        User.objects.create_user(username='dave', password='secret')
+        for username, password in (('dave', 'wrong'), ('nobody', 'secret')):
+            response = self.client.post('/api/customers/login/', {'username': username, 'password': password}, format='json')
+            self.assertEqual(response.status_code, 400)
+
+    def test_outdated_hash_is_upgraded_on_login(self):
+        user = User.objects.create_user(username='dave')
+        user.password = make_password('secret', hasher='pbkdf2_sha1')
+        user.save()
+        response = self.client.post('/api/customers/login/', {'username': 'dave', 'password': 'secret'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(user.check_password('secret'))
+
+    def test_failures_send_user_login_failed(self):
+        User.objects.create_user(username='dave', password='secret')
+        failures = []
+
+        def record(sender, credentials, request, **kwargs):
+            failures.append((credentials, request.path))
+
+        user_login_failed.connect(record)
+        self.addCleanup(user_login_failed.disconnect, record)
+        for username, password in (('dave', 'wrong'), ('nobody', 'secret'), ('dave', 'secret')):
+            self.client.post('/api/customers/login/', {'username': username, 'password': password}, format='json')
+        self.assertEqual([credentials['username'] for credentials, _ in failures], ['dave', 'nobody'])
+        self.assertNotIn('wrong', str(failures))
+        self.assertEqual(failures[0][1], '/api/customers/login/')
+
+    def test_duplicate_username(self):
+        User.objects.create_user(username='dave', password='secret')
+        response = self.client.post('/api/customers/signup/', {
+            'username': 'dave', 'password': 'x', 'email': 'dave@example.com',
+        }, format='json')
+        self.assertEqual(response.json(), {'error': 'Username already exists'})
+
+    def test_saturated_pool_answers_429(self):
+        User.objects.create_user(username='dave', password='secret')
+        with mock.patch.object(passwords.hashing_pool, 'max_pending', 0):
+            response = self.client.post('/api/customers/login/', {'username': 'dave', 'password': 'secret'}, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(passwords.hashing_pool.pending, 0)
+
+    def test_cancelled_caller_keeps_its_slot_until_the_job_ends(self):
+        pool = passwords.HashingPool(workers=1, max_pending=4)
+        pool._executor = ThreadPoolExecutor(1)  # A thread stands in for the worker process
+        started, release = threading.Event(), threading.Event()
+
+        def slow_hash():
+            started.set()
+            release.wait(5)
+
+        async def scenario():
+            task = asyncio.ensure_future(pool.run(slow_hash))
+            await asyncio.to_thread(started.wait, 5)
+            task.cancel()  # The client disconnected mid-hash
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return pool.pending
+
+        self.assertEqual(asyncio.run(scenario()), 1)
+        release.set()
+        pool._executor.shutdown(wait=True)
+        self.assertEqual(pool.pending, 0)
+
+    def test_malformed_body(self):
+        response = self.client.post('/api/customers/login/', '[1, 2]', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/api/customers/login/').status_code, 405)
+
+
+class CartBatchTests(TestCase):
+    def setUp(self):
+        self.user, self.restaurant, self.dishes, self.address = create_catalogue()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def batch(self, changes):
+        return self.client.post('/api/cart-items/batch/', {'items': changes}, format='json')
+
+    def quantities(self):
+        return dict(CartItem.objects.filter(state='placing').values_list('dish_id', 'quantity'))
+
+    def test_batch_merges_into_existing_rows(self):
+        margherita, salad = self.dishes
+        CartItem.objects.create(customer=self.user.customer, dish=margherita, quantity=2, restaurant=self.restaurant)
+        response = self.batch([
+            {'dish_id': margherita.id, 'quantity': 1},
+            {'dish_id': salad.id, 'quantity': 3},
+            {'dish_id': salad.id},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {margherita.id: 3, salad.id: 4})
+        self.assertEqual(response.data['total_price'], '68.93')
+        self.assertEqual([line['quantity'] for line in response.data['restaurants'][0]['lines']], [3, 4])
+
+    def test_dropping_to_zero_removes_the_row(self):
+        margherita, salad = self.dishes
+        self.batch([{'dish_id': margherita.id, 'quantity': 2}, {'dish_id': salad.id, 'quantity': 1}])
+        self.batch([{'dish_id': margherita.id, 'quantity': -2}])
+        self.assertEqual(self.quantities(), {salad.id: 1})
+
+    def test_unknown_dish_rejects_whole_batch(self):
+        response = self.batch([{'dish_id': self.dishes[0].id, 'quantity': 1}, {'dish_id': 999999, 'quantity': 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantities(), {})
+
+    def test_batch_query_count(self):
+        changes = [{'dish_id': dish.id, 'quantity': 1} for dish in self.dishes]
+        self.batch(changes)
+        with CaptureQueriesContext(connection) as queries:
+            self.batch(changes)
+        # in_bulk, SQLite write lock, read, bulk_update, customer header, cart lines (+ savepoint bookkeeping)
+        self.assertLessEqual(len([q for q in queries if 'SAVEPOINT' not in q['sql']]), 6)
+
+    def test_cart_rows_are_locked_with_select_for_update_where_supported(self):
+        cart_items = CartItem.objects.filter(customer=self.user.customer)
+        with mock.patch.object(connection.features, 'has_select_for_update', True):
+            self.assertTrue(lock_cart_rows(cart_items).query.select_for_update)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(lock_cart_rows(cart_items).query.select_for_update)
+        self.assertTrue(queries[0]['sql'].startswith('UPDATE "customers_cartitem"'))
+
+    def test_add_to_cart_creates_a_new_line(self):
+        response = self.client.post('/api/cart-items/add_to_cart/', {'dish_id': self.dishes[0].id, 'quantity': 2})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['quantity'], 2)
+
+    def test_add_to_cart_merges_same_dish(self):
+        dish = self.dishes[0]
+        self.client.post('/api/cart-items/add_to_cart/', {'dish_id': dish.id, 'quantity': 2})
+        response = self.client.post('/api/cart-items/add_to_cart/', {'dish_id': dish.id, 'quantity': 2})
+        self.assertEqual(response.status_code, 200)  # Updated the existing line, created nothing
+        self.assertEqual(response.data['quantity'], 4)
+        self.assertEqual(self.quantities(), {dish.id: 4})
+
+    def test_placed_rows_do_not_block_new_cart(self):
+        dish = self.dishes[0]
+        self.batch([{'dish_id': dish.id, 'quantity': 1}])
+        CartItem.objects.update(state='placed')
+        self.assertEqual(self.batch([{'dish_id': dish.id, 'quantity': 1}]).status_code, 200)
+        self.assertEqual(CartItem.objects.filter(dish=dish).count(), 2)
+
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        self.user, self.restaurant, self.dishes, self.address = create_catalogue()
+        other = Restaurant.objects.create(name='Taco Town', description='Tacos')
+        self.dishes += [
+            Dish.objects.create(restaurant=other, name=f'Taco {i}', description='Corn tortilla', price=Decimal('3.50'))
+            for i in range(8)
+        ]
+        for dish in self.dishes:
+            CartItem.objects.create(customer=self.user.customer, dish=dish, quantity=2, restaurant=dish.restaurant)
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        token_cache.clear()
+
+    def test_grouped_with_subtotals(self):
+        data = self.client.get('/api/cart-items/summary/').data
+        self.assertEqual(data['customer']['username'], 'alice')
+        self.assertEqual(data['item_count'], 10)
+        self.assertEqual([group['name'] for group in data['restaurants']], ['Pizza Palace', 'Taco Town'])
+        self.assertEqual([group['subtotal'] for group in data['restaurants']], ['39.96', '56.00'])
+        self.assertEqual(data['total_price'], '95.96')
+        self.assertEqual(set(data['restaurants'][0]['lines'][0]), {'id', 'dish_id', 'name', 'price', 'quantity'})
+
+    def test_summary_queries(self):
+        self.client.get('/api/cart-items/summary/')  # Warm the token cache
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/cart-items/summary/')
+        # Version stamp for the conditional GET, the customer with its user, then the lines; no token lookup
+        self.assertEqual(len(queries), 3)
+        self.assertFalse(any('authtoken_token' in q['sql'] for q in queries))
+
+    def test_an_order_of_magnitude_smaller_than_the_list(self):
+        full = self.client.get('/api/cart-items/').content
+        compact = self.client.get('/api/cart-items/summary/').content
+        self.assertLess(len(compact) * 5, len(full))
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/cart-items/')
+        return len(queries)
+
+    def test_list_has_no_per_line_queries(self):
+        self.client.get('/api/cart-items/')  # Warm the token cache
+        with_ten_lines = self.count_list_queries()
+        CartItem.objects.exclude(dish=self.dishes[0]).delete()
+        self.assertEqual(self.count_list_queries(), with_ten_lines)
+        # The version stamp and the list itself; logging adds nothing
+        self.assertEqual(with_ten_lines, 2)
+
+
+class StructuredLoggingTests(SimpleTestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.handler = AsyncQueueHandler(stream=self.stream)
+        self.handler.setFormatter(StructuredFormatter())
+        self.logger = logging.getLogger('customers.tests.structured')
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+        self.addCleanup(self.logger.removeHandler, self.handler)
+        self.addCleanup(self.handler.close)
+
+    def lines(self):
+        self.handler.stop()  # Drains the queue
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_records_are_written_as_json_by_the_listener(self):
+        payload = {'password': 'hunter2', 'username': 'alice'}
+        self.logger.warning('Placing order %s', 7, extra={'customer_id': 3, 'fields': lazy(field_names, payload)})
+        payload['address'] = 'changed after logging'
+        [line] = self.lines()
+        self.assertEqual((line['level'], line['message'], line['customer_id']), ('WARNING', 'Placing order 7', 3))
+        # Lazy values are resolved when the record is queued, and carry no payload values
+        self.assertEqual(line['fields'], "['password', 'username']")
+
+    def test_lazy_arguments_skip_work_below_the_level(self):
+        expensive = mock.Mock(return_value='x')
+        self.logger.setLevel(logging.WARNING)
+        self.addCleanup(self.logger.setLevel, logging.NOTSET)
+        self.logger.info('Cart %s', lazy(expensive))
+        self.assertEqual(self.lines(), [])
+        expensive.assert_not_called()
+
+    def test_sampling_keeps_warnings(self):
+        self.handler.addFilter(SamplingFilter(rate=0))
+        self.logger.info('dropped')
+        self.logger.warning('kept')
+        self.assertEqual([line['message'] for line in self.lines()], ['kept'])
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        self.handler.stop()
+        handler = AsyncQueueHandler(stream=self.stream, queue_size=1)
+        handler.stop()  # Nothing drains the queue now
+        self.addCleanup(handler.close)
+        for _ in range(3):
+            handler.handle(logging.makeLogRecord({'msg': 'x', 'levelno': logging.INFO}))
+        self.assertEqual(handler.dropped, 2)
+
+    def test_per_module_levels_from_environment(self):
+        self.assertEqual(parse_levels('customers=debug, django.db.backends=WARNING,'), {
+            'customers': 'DEBUG', 'django.db.backends': 'WARNING',
+        })
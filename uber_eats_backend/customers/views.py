@@ -3,183 +3,180 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
-from django.contrib.auth import authenticate
-from .models import Customer, Order, FavoriteRestaurant, CartItem, DeliveryAddress, Dish ,Restaurant,OrderItem
-from .serializers import CustomerSerializer, OrderSerializer, FavoriteRestaurantSerializer, CartItemSerializer, DeliveryAddressSerializer,OrderItemSerializer
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.http import HttpResponseNotModified, JsonResponse
+from .models import Customer, Order, FavoriteRestaurant, CartItem, DeliveryAddress, Dish ,OrderItem, sync_order_summary
+from .serializers import CustomerSerializer, OrderSerializer, FavoriteRestaurantSerializer, CartItemSerializer, DeliveryAddressSerializer
 from django.contrib.auth.models import User
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import AllowAny
+from .pagination import OrderHistoryCursorPagination
+from .accounts import create_account
+from .authentication import load_profile, token_cache
+from .cart import apply_cart_changes, cart_summary, cart_total, lock_cart_rows, parse_cart_changes
+from uber_eats_backend import passwords
+from uber_eats_backend.async_views import async_read_view, render_json
+from uber_eats_backend.conditional import ConditionalGetMixin, aversion_for, is_not_modified, with_validators
+from uber_eats_backend.log import field_names, lazy
+from uber_eats_backend.passwords import async_auth_view
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-class CustomAuthToken(ObtainAuthToken):
-    def post(self, request, *args, **kwargs):
-         # Validate the provided data and authenticate the user
-        serializer = self.serializer_class(data=request.data, context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        user = serializer.validated_data['user']
-         # Create or retrieve the authentication token for the user
-        token, created = Token.objects.get_or_create(user=user)
-        return Response({
-            'token': token.key, # Return the token
-            'user': {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email
-            }
-        })
-
-class CustomerViewSet(viewsets.ModelViewSet):
-    queryset = Customer.objects.all()
-    serializer_class = CustomerSerializer
-
-    @action(detail=False, methods=['post'])
-    def login(self, request):
-        username = request.data.get('username')
-        password = request.data.get('password')
-        logger.info(f"Login attempt for user: {username}")
-        user = authenticate(username=username, password=password)
-        if user:
-            token, _ = Token.objects.get_or_create(user=user)
-            serializer = self.get_serializer(user.customer)
-            logger.info(f"Login successful for user: {username}")
-            return Response({
-                'token': token.key,
-                'user': serializer.data
-            })
-        else:
-            logger.warning(f"Login failed for user: {username}")
-            return Response({'error': 'Invalid credentials'}, status=status.HTTP_400_BAD_REQUEST)
 
-    @action(detail=False, methods=['post'])
-    def signup(self, request):
-        username = request.data.get('username')
-        password = request.data.get('password')
-        email = request.data.get('email')
-        if not username:
-            return Response({'error': 'Username is required'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if not password:
-            return Response({'error': 'Password is required'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if not email:
-            return Response({'error': 'Email is required'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if User.objects.filter(username=username).exists():
-            return Response({'error': 'Username already exists'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if User.objects.filter(email=email).exists():
-            return Response({'error': 'Email already exists'}, status=status.HTTP_400_BAD_REQUEST)
+# Raised inside place_order to roll back when the cart rows were claimed by another checkout
+class CartAlreadyPlaced(Exception):
+    pass
 
-        try:
-            user = User.objects.create_user(username=username, password=password, email=email)
-            customer = Customer.objects.update_or_create(user=user)
-            token, _ = Token.objects.get_or_create(user=user)
-            return Response({
-            'token': token.key,
-            'user_id': user.id,
-        }, status=status.HTTP_201_CREATED)
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+class CustomerViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Customer.objects.all()
+    serializer_class = CustomerSerializer
+    # The nested user has no timestamp; save_customer re-saves the customer on every user save,
+    # so the customer's updated_at moves with username and email too
+    version_fields = ['updated_at']
 
     @action(detail=False, methods=['get'])
     @permission_classes([IsAuthenticated])
     def profile(self, request):
-        serializer = self.get_serializer(request.user.customer)
+        serializer = self.get_serializer(load_profile(request.user, 'customer'))
         return Response(serializer.data)
 
     @action(detail=False, methods=['post'])
     @permission_classes([IsAuthenticated])
     def logout(self, request):
         request.auth.delete()
+        token_cache.delete(request.auth.key)
         return Response({"message": "Successfully logged out."}, status=status.HTTP_200_OK)
     
     #UserProfile
     @action(detail=False, methods=['get'])
     @permission_classes([IsAuthenticated])
     def profile(self, request):
-        logger.info(f"Fetching profile for user: {request.user.username}")
         try:
-            serializer = self.get_serializer(request.user.customer)
-            logger.info(f"Profile fetched successfully for user: {request.user.username}")
-            return Response({"customer": serializer.data, "email" : request.user.email})
-        except Exception as e:
-            logger.error(f"Error fetching profile for user {request.user.username}: {str(e)}")
+            customer = load_profile(request.user, 'customer')
+            serializer = self.get_serializer(customer)
+            return Response({"customer": serializer.data, "email" : customer.user.email})
+        except Exception:
+            logger.exception('Error fetching profile for user %s', request.user.pk)
             return Response({'error': 'Failed to fetch profile'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
     ##Update Profile
     @action(detail=False, methods=['patch'], parser_classes=[MultiPartParser, FormParser])
     @permission_classes([IsAuthenticated])
     def update_profile(self, request):
-        customer = request.user.customer
-        logger.info(request.data)
-        logger.info(customer)
+        customer = load_profile(request.user, 'customer')
+        logger.info('Updating customer profile', extra={'customer_id': customer.id, 'fields': lazy(field_names, request.data)})
         serializer = self.get_serializer(customer, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
+    version_fields = ['updated_at', 'customer__updated_at', 'restaurant__updated_at', 'delivery_address__updated_at', 'items__dish__updated_at']
     #permission_classes = [IsAuthenticated]
     permission_classes = [AllowAny] 
 
     def get_queryset(self): 
         user = self.request.user
         if hasattr(user, 'customer'):
-            return Order.objects.filter(customer=user.customer)
+            orders = Order.objects.filter(customer=user.customer)
         elif hasattr(user, 'restaurant'):
-            return Order.objects.filter(restaurant=user.restaurant)
-        return Order.objects.none()
+            orders = Order.objects.filter(restaurant=user.restaurant)
+        else:
+            return Order.objects.none()
+        return OrderSerializer.setup_eager_loading(orders)
 
     @action(detail=False, methods=['post'], url_path='place_order')
     def place_order(self, request):
-        customer = Customer.objects.get(user=request.user)
+        customer = request.user.customer
         restaurant_id = request.data.get('restaurant_id')
-        cart_items = CartItem.objects.filter(customer=customer, restaurant_id=restaurant_id, state='placing')
-
-        if not cart_items:
-            return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
-        logger.info(request.data)
-
-        deliveryAddr = DeliveryAddress.objects.get(id=request.data.get('delivery_address_id'))
-
-
-        total_price = sum(item.dish.price * item.quantity for item in cart_items)
-        order = Order.objects.create(
-            customer=customer,
-            restaurant_id=restaurant_id,
-            total_price=total_price,
-            delivery_address=deliveryAddr
-        )
+        idempotency_key = request.headers.get('Idempotency-Key')
 
-        # Create OrderItem instances from CartItem
-        order_items = []
-        for item in cart_items:
-            order_item = OrderItem(
-                order=order,
-                dish=item.dish,
-                quantity=item.quantity
-            )
-            order_items.append(order_item)
-        OrderItem.objects.bulk_create(order_items)  # Bulk insert for efficiency
+        if idempotency_key and len(idempotency_key) > 64:
+            return Response({'error': 'Idempotency-Key must be at most 64 characters'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Link Cart Items to Order and update state
-        cart_items.update(order=order, state='placed')
+        # A retried request returns the order its first attempt created
+        if idempotency_key:
+            replay = self._replay_order(customer, idempotency_key)
+            if replay:
+                return replay
+        logger.info('Placing order', extra={'customer_id': customer.id, 'restaurant_id': restaurant_id})
 
+        try:
+            with transaction.atomic():
+                # Lock the cart rows so a concurrent checkout of the same cart waits for us
+                cart_items = lock_cart_rows(
+                    CartItem.objects.filter(customer=customer, restaurant_id=restaurant_id, state='placing')
+                )
+                lines = list(cart_items.values_list('id', 'dish_id', 'quantity'))
+                if not lines:
+                    return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
+
+                deliveryAddr = DeliveryAddress.objects.filter(
+                    id=request.data.get('delivery_address_id'), customer=customer
+                ).first()
+                if deliveryAddr is None:
+                    return Response({'error': 'Delivery address not found'}, status=status.HTTP_400_BAD_REQUEST)
+
+                cart_item_ids = [item_id for item_id, _, _ in lines]
+                total_price = cart_total(CartItem.objects.filter(id__in=cart_item_ids))
+                order = Order.objects.create(
+                    customer=customer,
+                    restaurant_id=restaurant_id,
+                    total_price=total_price,
+                    delivery_address=deliveryAddr,
+                    idempotency_key=idempotency_key,
+                )
+
+                # Create OrderItem instances from CartItem
+                OrderItem.objects.bulk_create([
+                    OrderItem(order=order, dish_id=dish_id, quantity=quantity)
+                    for _, dish_id, quantity in lines
+                ])
+
+                # Link Cart Items to Order and update state; only rows still in 'placing' are claimed,
+                # so if another checkout got there first the whole order is rolled back
+                claimed = CartItem.objects.filter(id__in=cart_item_ids, state='placing').update(order=order, state='placed')
+                if claimed != len(lines):
+                    raise CartAlreadyPlaced()
+                # The items were bulk-created without signals, so count them into the dashboard summary here
+                sync_order_summary(order)
+        except CartAlreadyPlaced:
+            return Response({'error': 'Cart has already been placed'}, status=status.HTTP_409_CONFLICT)
+        except IntegrityError:
+            # A concurrent request with the same idempotency key committed first
+            replay = self._replay_order(customer, idempotency_key) if idempotency_key else None
+            if replay:
+                return replay
+            raise
+
+        # Reload the order with its graph so serialization doesn't query per item
+        order = OrderSerializer.setup_eager_loading(Order.objects.filter(id=order.id)).get()
         serializer = OrderSerializer(order)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    def _replay_order(self, customer, idempotency_key):
+        order = OrderSerializer.setup_eager_loading(
+            Order.objects.filter(customer=customer, idempotency_key=idempotency_key)
+        ).first()
+        if order is None:
+            return None
+        serializer = OrderSerializer(order)
+        return Response(serializer.data, status=status.HTTP_200_OK, headers={'Idempotent-Replayed': 'true'})
+
+    def get_getOrderDetail_version(self):
+        return self.version_for(Order.objects.filter(id=self.request.GET.get('orderId')))
+
     @action(detail=False, methods=['get'])
     def getOrderDetail(self, request):
         order_id = request.GET.get('orderId')
-        order = Order.objects.filter(id=order_id).first()
+        order = OrderSerializer.setup_eager_loading(Order.objects.filter(id=order_id)).first()
         if order:
             serializer = OrderSerializer(order)
             return Response(serializer.data, status=status.HTTP_200_OK)
@@ -192,7 +189,8 @@ class OrderViewSet(viewsets.ModelViewSet):
         status = request.data.get('status')
         if status in dict(Order.STATUS_CHOICES):
             order.status = status
-            order.save()
+            with transaction.atomic():  # The status change and its sales rollup commit together
+                order.save()
             return Response({'status': 'Order status updated'})
         return Response({'error': 'Invalid status'}, status=status.HTTP_400_BAD_REQUEST)
     
@@ -200,20 +198,18 @@ class OrderViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated], url_path='order_history')
     def order_history(self, request):
             customer = request.user.customer
-            orders = Order.objects.filter(customer=customer).prefetch_related('orderitem_set')
-            
-            order_history_data = []
-            for order in orders:
-                order_data = OrderSerializer(order).data
-                order_items = OrderItem.objects.filter(order=order)
-                order_data['items'] = OrderItemSerializer(order_items, many=True).data
-                order_history_data.append(order_data)
-
-            return Response(order_history_data, status=status.HTTP_200_OK)
-
-class FavoriteRestaurantViewSet(viewsets.ModelViewSet):
+            orders = OrderSerializer.setup_eager_loading(Order.objects.filter(customer=customer))
+
+            # Keyset pagination on (created_at, id): one page of orders plus one prefetch for items and dishes
+            paginator = OrderHistoryCursorPagination()
+            page = paginator.paginate_queryset(orders, request, view=self)
+            serializer = OrderSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+
+class FavoriteRestaurantViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = FavoriteRestaurant.objects.all()
     serializer_class = FavoriteRestaurantSerializer
+    version_fields = ['restaurant__updated_at']
     permission_classes = [AllowAny]  # Make sure the user is authenticated
 
     def get_queryset(self):
@@ -233,15 +229,16 @@ class FavoriteRestaurantViewSet(viewsets.ModelViewSet):
         return Response({'status': 'added'})
       
 
-class CartItemViewSet(viewsets.ModelViewSet):
+class CartItemViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = CartItem.objects.all()
     serializer_class = CartItemSerializer
+    version_fields = ['updated_at', 'customer__updated_at', 'dish__updated_at']
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        cart_items = CartItem.objects.filter(customer=self.request.user.customer, state='placing')
-        logger.info(f"Cart items: {cart_items.values()}")
-        return cart_items
+        return CartItemSerializer.setup_eager_loading(
+            CartItem.objects.filter(customer=self.request.user.customer, state='placing')
+        )
         
     @action(detail=False, methods=['post'])
     def add_to_cart(self, request):
@@ -250,50 +247,104 @@ class CartItemViewSet(viewsets.ModelViewSet):
         restaurant_id = request.data.get('restaurant_id')
         quantity = request.data.get('quantity', 1)
 
-        try:
-            dish = Dish.objects.get(id=dish_id)  # Fetch the dish
-            restaurant = dish.restaurant
-            
-            # Check if the restaurant is associated with the dish
-            if dish.restaurant.id != restaurant.id:
-                return Response({'error': 'Restaurant ID does not match the dish.'}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Create a new cart item with the restaurant reference
-            cart_item = CartItem.objects.create(
-                customer=customer,
-                dish=dish,
-                quantity=quantity,
-                restaurant=restaurant  # Include restaurant reference
-            )
-
-            serializer = self.get_serializer(cart_item)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-        except Dish.DoesNotExist:
+        dish = Dish.objects.filter(id=dish_id).only('id', 'restaurant_id').first() if str(dish_id).isdigit() else None
+        if dish is None:
             return Response({'error': 'Dish not found'}, status=status.HTTP_404_NOT_FOUND)
-        except Restaurant.DoesNotExist:
-            return Response({'error': 'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
-        except Exception as e:
-            logger.error(f"Error adding to cart: {str(e)}")
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
+        # Check if the restaurant is associated with the dish
+        if restaurant_id and str(dish.restaurant_id) != str(restaurant_id):
+            return Response({'error': 'Restaurant ID does not match the dish.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        deltas = parse_cart_changes([{'dish_id': dish.id, 'quantity': quantity}])
+        if deltas[dish.id] < 1:
+            return Response({'error': 'Quantity must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+        # Adding a dish that's already in the cart bumps its quantity: 200 for that, 201 for a new line
+        items, created = apply_cart_changes(customer, deltas)
+        cart_item = self.get_queryset().get(id=items[dish.id].id)
+        serializer = self.get_serializer(cart_item)
+        return Response(serializer.data, status=status.HTTP_201_CREATED if dish.id in created else status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        # [{dish_id, quantity}, ...] applied in one transaction; returns the whole cart afterwards
+        customer = request.user.customer
+        apply_cart_changes(customer, parse_cart_changes(request.data))
+        return Response(cart_summary(load_profile(request.user, 'customer')))
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        # Compact cart grouped by restaurant, with server-computed subtotals (see customers.cart)
+        return Response(cart_summary(load_profile(request.user, 'customer')))
+
+    def get_summary_version(self):
+        return self.version_for(CartItem.objects.filter(customer=self.request.user.customer, state='placing'), many=True)
+
 
 #Order Details to view in order history
     @action(detail=False, methods=['get'])
     def order_details(self, request):
         order_id = request.data.get('order_id')
-        logger.info(request.data)
         order_items = CartItem.objects.filter(order__id=order_id)
-        for item in order_items:
-            logger.info(f"CartItem: {item}, Restaurant: {item.restaurant}")  # Log restaurant info for each item
         serializer = self.get_serializer(order_items)
         return Response(serializer.data, status=status.HTTP_200_OK)
         
 
+# Login and signup are async so the password hash runs in the hashing pool
+# without holding a request thread (see uber_eats_backend.passwords)
+@async_auth_view
+async def customer_login(request, data):
+    username = data.get('username')
+    password = data.get('password')
+    user = await passwords.authenticate(request, username, password)
+    if user is None:
+        logger.warning('Login failed for user: %s', username)
+        return JsonResponse({'error': 'Invalid credentials'}, status=status.HTTP_400_BAD_REQUEST)
+    customer = await Customer.objects.select_related('user').filter(user=user).afirst()
+    if customer is None:
+        logger.warning('User %s does not have an associated customer.', username)
+        return JsonResponse({'error': 'User does not have an associated customer'}, status=status.HTTP_400_BAD_REQUEST)
+    token, _ = await Token.objects.aget_or_create(user=user)
+    logger.info('Login successful for user: %s', username)
+    return JsonResponse({
+        'token': token.key,
+        'user': CustomerSerializer(customer, context={'request': request}).data,
+    })
+
+
+@async_auth_view
+async def customer_signup(request, data):
+    username = data.get('username')
+    password = data.get('password')
+    email = data.get('email')
+    if not username:
+        return JsonResponse({'error': 'Username is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not password:
+        return JsonResponse({'error': 'Password is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not email:
+        return JsonResponse({'error': 'Email is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if await User.objects.filter(username=username).aexists():
+        return JsonResponse({'error': 'Username already exists'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if await User.objects.filter(email=email).aexists():
+        return JsonResponse({'error': 'Email already exists'}, status=status.HTTP_400_BAD_REQUEST)
+
+    encoded = await passwords.make_password(password)
+    try:
+        user, token = await sync_to_async(create_account)(username, email, encoded)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return JsonResponse({
+        'token': token.key,
+        'user_id': user.id,
+    }, status=status.HTTP_201_CREATED)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def me(request):
-    serializer = CustomerSerializer(request.user.customer)
+    serializer = CustomerSerializer(load_profile(request.user, 'customer'))
     return Response(serializer.data)
 
 
@@ -305,20 +356,46 @@ class DeliveryAddressViewSet(viewsets.ModelViewSet):
         return DeliveryAddress.objects.filter(customer=self.request.user.customer)
 
     def perform_create(self, serializer):
-        logger.info(f"Creating new delivery address for user: {self.request.user.username}")
         serializer.save(customer=self.request.user.customer)
 
     def create(self, request, *args, **kwargs):
-        logger.info(f"Received data for new delivery address: {request.data}")
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             self.perform_create(serializer)
             headers = self.get_success_headers(serializer.data)
-            logger.info(f"Successfully created new delivery address: {serializer.data}")
+            logger.info('Created delivery address', extra={'address_id': serializer.data['id'], 'user_id': request.user.pk})
             return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
         else:
-            logger.error(f"Failed to create delivery address. Errors: {serializer.errors}")
+            logger.warning('Failed to create delivery address', extra={'errors': serializer.errors})
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     
 
+
+
+# Async versions of the cart and order detail reads, served on the event loop under
+# ASGI (see restaurants.views for the restaurant ones); writes go to the viewsets
+
+@async_read_view(CartItemViewSet.as_view({'get': 'list', 'post': 'create'}), login_required=True)
+async def cart_items(request):
+    items = CartItemSerializer.setup_eager_loading(
+        CartItem.objects.filter(customer=request.user.customer, state='placing')
+    )
+    stamp = await aversion_for(request, items, CartItemViewSet.version_fields, many=True)
+    if is_not_modified(request, *stamp):
+        return with_validators(HttpResponseNotModified(), stamp)
+    data = CartItemSerializer([item async for item in items], many=True, context={'request': request}).data
+    return with_validators(render_json(data), stamp)
+
+
+@async_read_view(OrderViewSet.as_view({'get': 'getOrderDetail'}))
+async def order_detail(request):
+    order_id = request.GET.get('orderId')
+    orders = Order.objects.filter(id=order_id) if str(order_id).isdigit() else Order.objects.none()
+    stamp = await aversion_for(request, orders, OrderViewSet.version_fields)
+    if stamp is None:
+        return render_json({'error': 'Order not found'}, status.HTTP_404_NOT_FOUND)
+    if is_not_modified(request, *stamp):
+        return with_validators(HttpResponseNotModified(), stamp)
+    order = await OrderSerializer.setup_eager_loading(orders).afirst()
+    return with_validators(render_json(OrderSerializer(order).data), stamp)
@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# A cached, already-rendered menu: the JSON bytes plus the validators sent with them
+MenuEntry = namedtuple('MenuEntry', ['body', 'etag', 'last_modified'])
+
+
+class MenuCache(ABC):
+    # Read-through cache of serialized menus keyed by restaurant id. Subclasses only implement
+    # get/set/delete/clear; the hit and miss counters and the read-through logic live here.
+
+    # get/set do disk or network I/O, so async views call them in a thread
+    blocking = False
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    @abstractmethod
+    def get(self, restaurant_id):
+        pass
+
+    @abstractmethod
+    def set(self, restaurant_id, entry):
+        pass
+
+    @abstractmethod
+    def delete(self, restaurant_id):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+    def get_or_build(self, restaurant_id, build):
+        # `build` returns the rendered JSON bytes for the menu and is only called on a miss
+        entry = self._count(self.get(restaurant_id))
+        if entry is not None:
+            return entry
+        entry = self._entry(build())
+        self.set(restaurant_id, entry)
+        return entry
+
+    async def aget_or_build(self, restaurant_id, build):
+        # The same for async views: `build` is a coroutine function, and a hit on an
+        # in-memory cache is answered without leaving the event loop
+        if self.blocking:
+            entry = self._count(await asyncio.to_thread(self.get, restaurant_id))
+        else:
+            entry = self._count(self.get(restaurant_id))
+        if entry is not None:
+            return entry
+        entry = self._entry(await build())
+        if self.blocking:
+            await asyncio.to_thread(self.set, restaurant_id, entry)
+        else:
+            self.set(restaurant_id, entry)
+        return entry
+
+    def _count(self, entry):
+        with self._stats_lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def _entry(self, body):
+        return MenuEntry(body, '"%s"' % hashlib.md5(body, usedforsecurity=False).hexdigest(), time.time())
+
+    def stats(self):
+        return {'backend': type(self).__name__, 'hits': self.hits, 'misses': self.misses}
+
+
+class LocMemMenuCache(MenuCache):
+    # Per-process LRU bounded by the total size of the cached bodies
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, restaurant_id):
+        with self._lock:
+            entry = self._entries.get(restaurant_id)
+            if entry is not None:
+                self._entries.move_to_end(restaurant_id)
+            return entry
+
+    def set(self, restaurant_id, entry):
+        if len(entry.body) > self.max_bytes:
+            return  # Larger than the whole cache, not worth evicting everything for
+        with self._lock:
+            self._discard(restaurant_id)
+            self._entries[restaurant_id] = entry
+            self.size += len(entry.body)
+            # Evict least recently used menus until we fit again
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted.body)
+
+    def delete(self, restaurant_id):
+        with self._lock:
+            self._discard(restaurant_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _discard(self, restaurant_id):
+        entry = self._entries.pop(restaurant_id, None)
+        if entry is not None:
+            self.size -= len(entry.body)
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({'entries': len(self._entries), 'bytes': self.size, 'max_bytes': self.max_bytes})
+        return stats
+
+
+class FileMenuCache(MenuCache):
+    # One file per restaurant, so every worker process shares the cache and its invalidations
+    blocking = True
+
+    def __init__(self, location=None):
+        super().__init__()
+        self.location = str(location or os.path.join(tempfile.gettempdir(), 'uber_eats_menu_cache'))
+        os.makedirs(self.location, exist_ok=True)
+
+    def _path(self, restaurant_id):
+        return os.path.join(self.location, f'{int(restaurant_id)}.menu')
+
+    def get(self, restaurant_id):
+        try:
+            with open(self._path(restaurant_id), 'rb') as f:
+                header = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        return MenuEntry(body, header['etag'], header['last_modified'])
+
+    def set(self, restaurant_id, entry):
+        header = json.dumps({'etag': entry.etag, 'last_modified': entry.last_modified}).encode()
+        # Write to a temp file and rename so readers never see a partial menu
+        fd, tmp_path = tempfile.mkstemp(dir=self.location, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(header + b'\n' + entry.body)
+            os.replace(tmp_path, self._path(restaurant_id))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def delete(self, restaurant_id):
+        try:
+            os.remove(self._path(restaurant_id))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.location):
+            if name.endswith('.menu'):
+                os.remove(os.path.join(self.location, name))
+
+
+def create_menu_cache():
+    config = getattr(settings, 'MENU_CACHE', {})
+    backend = import_string(config.get('BACKEND', 'restaurants.cache.LocMemMenuCache'))
+    return backend(**config.get('OPTIONS', {}))
+
+
+menu_cache = create_menu_cache()
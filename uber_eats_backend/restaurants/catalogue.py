@@ -0,0 +1,250 @@
+import copy
+import csv
+import gzip
+import json
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .hours import opening_intervals
+from .models import Dish, OpeningInterval, Restaurant, invalidate_menu, locate_restaurant
+
+# Model fields a catalogue record carries, besides its type, id and ref
+RESTAURANT_FIELDS = ['name', 'description', 'address', 'phone_number', 'opening_time', 'closing_time', 'image']
+DISH_FIELDS = ['name', 'ingredients', 'description', 'price', 'category', 'is_vegetarian', 'is_vegan', 'is_gluten_free', 'image']
+# One CSV header for both record types; each row leaves the other type's columns empty
+CSV_COLUMNS = ['type', 'id', 'ref', 'restaurant_ref', 'restaurant_id', *dict.fromkeys(RESTAURANT_FIELDS + DISH_FIELDS)]
+
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+FALSE_VALUES = {'', '0', 'false', 'f', 'no', 'n'}
+
+# A record that was skipped: its 1-based position in the file and why
+RecordError = namedtuple('RecordError', ['number', 'message'])
+
+
+def file_format(path):
+    # 'csv' or 'jsonl' from the extension, looking through a trailing .gz
+    name = str(path).lower().removesuffix('.gz')
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    raise ValueError(f'Cannot tell the format of {path}; use .csv or .jsonl (optionally .gz)')
+
+
+def open_text(path, mode):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', newline='')
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def read_records(file, fmt):
+    """(number, record) pairs, one line at a time; empty CSV cells become None."""
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(file), start=1):
+            yield number, {key: (value if value != '' else None) for key, value in row.items() if key}
+        return
+    number = 0
+    for line in file:
+        if line.strip():
+            number += 1
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                record = {'type': None, 'error': f'Invalid JSON: {e}'}
+            yield number, record if isinstance(record, dict) else {'type': None, 'error': 'Not a JSON object'}
+
+
+def write_records(file, fmt, records):
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(file, CSV_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        for count, record in enumerate(records, start=1):
+            writer.writerow({key: '' if value is None else value for key, value in record.items()})
+        return count
+    for count, record in enumerate(records, start=1):
+        file.write(json.dumps(record, default=str) + '\n')
+    return count
+
+
+def export_records(chunk_size=2000):
+    """Every restaurant, then every dish, streamed from the database in id order."""
+    # Restaurants first, so importing the file never meets a dish before its restaurant
+    for row in Restaurant.objects.order_by('id').values('id', 'external_ref', *RESTAURANT_FIELDS).iterator(chunk_size=chunk_size):
+        yield {'type': 'restaurant', 'id': row.pop('id'), 'ref': row.pop('external_ref'), **row}
+    dishes = Dish.objects.order_by('id').values('id', 'external_ref', 'restaurant_id', 'restaurant__external_ref', *DISH_FIELDS)
+    for row in dishes.iterator(chunk_size=chunk_size):
+        yield {
+            'type': 'dish', 'id': row.pop('id'), 'ref': row.pop('external_ref'),
+            'restaurant_ref': row.pop('restaurant__external_ref'), 'restaurant_id': row.pop('restaurant_id'), **row,
+        }
+
+
+def _convert(field, value):
+    # CSV gives every value as text (or None for an empty cell), JSON gives native types
+    if field.get_internal_type() == 'BooleanField':
+        text = '' if value is None else str(value).strip().lower()
+        if text in TRUE_VALUES:
+            return True
+        if text in FALSE_VALUES:
+            return False
+        raise ValidationError(f'"{value}" is not true or false')
+    if value is None or value == '':
+        if field.null:
+            return None
+        return field.get_default() if field.has_default() else ''
+    return field.to_python(value)
+
+
+def _app_empty(field, value):
+    # Empty values the app itself saves, which model validation would reject:
+    # NULL in nullable columns (ingredients), '' where it is the model default (category)
+    return value in (None, '') and (field.null or (field.has_default() and field.get_default() == value))
+
+
+class CatalogueImporter:
+    """Upserts catalogue records one chunk per transaction, with bulk queries.
+
+    A record matches an existing row by `ref` (the chain's own id, stored as
+    external_ref); records without a ref match by `id` when match_ids is set
+    and are created otherwise. Dishes name their restaurant by `restaurant_ref`
+    or `restaurant_id`. Invalid records are reported and skipped; the rest of
+    the chunk is still written.
+    """
+
+    def __init__(self, match_ids=True):
+        self.match_ids = match_ids
+
+    def import_chunk(self, records):
+        """Write one chunk of (number, record) pairs; returns (created, updated, errors)."""
+        errors = []
+        by_type = {'restaurant': [], 'dish': []}
+        for number, record in records:
+            if record.get('type') in by_type:
+                by_type[record['type']].append((number, record))
+            else:
+                errors.append(RecordError(number, record.get('error') or f'Unknown record type {record.get("type")!r}'))
+        with transaction.atomic():
+            restaurants_created, restaurants_updated = self.import_restaurants(by_type['restaurant'], errors)
+            dishes_created, dishes_updated = self.import_dishes(by_type['dish'], errors)
+        return restaurants_created + dishes_created, restaurants_updated + dishes_updated, errors
+
+    def import_restaurants(self, records, errors):
+        if not records:
+            return 0, 0
+        refs = {record['ref'] for _, record in records if record.get('ref')}
+        existing = {('ref', r.external_ref): r for r in Restaurant.objects.filter(external_ref__in=refs)}
+        existing.update(self.existing_by_id(Restaurant.objects.all(), records))
+
+        rows = self.build(Restaurant, RESTAURANT_FIELDS, records, existing, errors)
+        for restaurant in rows.values():
+            locate_restaurant(Restaurant, restaurant)  # bulk_create skips the pre_save geocoding
+        created, updated = self.save(Restaurant, RESTAURANT_FIELDS + ['latitude', 'longitude', 'grid_cell'], rows.values())
+
+        # ...and the post_save opening intervals
+        OpeningInterval.objects.filter(restaurant__in=updated).delete()
+        OpeningInterval.objects.bulk_create([
+            OpeningInterval(restaurant=restaurant, start_minute=start, end_minute=end)
+            for restaurant in rows.values()
+            for start, end in opening_intervals(restaurant.opening_time, restaurant.closing_time)
+        ])
+        for restaurant in updated:
+            invalidate_menu(restaurant.pk)
+        return len(created), len(updated)
+
+    def import_dishes(self, records, errors):
+        if not records:
+            return 0, 0
+        # Resolve the restaurants with one query per kind of reference
+        restaurant_refs = {record['restaurant_ref'] for _, record in records if record.get('restaurant_ref')}
+        by_ref = dict(Restaurant.objects.filter(external_ref__in=restaurant_refs).values_list('external_ref', 'id'))
+        restaurant_ids = {str(record['restaurant_id']) for _, record in records if record.get('restaurant_id')}
+        known_ids = {str(pk) for pk in Restaurant.objects.filter(id__in=[i for i in restaurant_ids if i.isdigit()])
+                     .values_list('id', flat=True)}
+        resolved = []
+        for number, record in records:
+            if record.get('restaurant_ref'):
+                restaurant_id = by_ref.get(record['restaurant_ref'])
+            else:
+                restaurant_id = int(record['restaurant_id']) if str(record.get('restaurant_id')) in known_ids else None
+            if restaurant_id is None:
+                errors.append(RecordError(number, 'Unknown restaurant'))
+                continue
+            resolved.append((number, {**record, 'restaurant_id': restaurant_id}))
+
+        refs = {record['ref'] for _, record in resolved if record.get('ref')}
+        existing = {
+            ('ref', (dish.restaurant_id, dish.external_ref)): dish
+            for dish in Dish.objects.filter(restaurant_id__in={r['restaurant_id'] for _, r in resolved}, external_ref__in=refs)
+        }
+        existing.update(self.existing_by_id(Dish.objects.all(), resolved))
+
+        rows = self.build(Dish, DISH_FIELDS, resolved, existing, errors)
+        created, updated = self.save(Dish, DISH_FIELDS, rows.values())
+        # bulk_create and bulk_update don't send post_save, so drop the touched menus here
+        for restaurant_id in {dish.restaurant_id for dish in rows.values()}:
+            invalidate_menu(restaurant_id)
+        return len(created), len(updated)
+
+    def existing_by_id(self, queryset, records):
+        # Rows named by id, for records without a ref
+        if not self.match_ids:
+            return {}
+        ids = {str(record['id']) for _, record in records if not record.get('ref') and record.get('id') is not None}
+        return {('id', str(pk)): row for pk, row in queryset.in_bulk([i for i in ids if i.isdigit()]).items()}
+
+    def build(self, model, fields, records, existing, errors):
+        """Validated, unsaved-or-changed instances keyed by identity; a later duplicate record wins."""
+        rows = {}
+        converted = [model._meta.get_field(name) for name in fields]
+        validated = [*converted, model._meta.get_field('external_ref')]
+        for number, record in records:
+            ref = record.get('ref') or None
+            if ref is not None:
+                key = ('ref', (record['restaurant_id'], ref) if model is Dish else ref)
+            elif self.match_ids and record.get('id') is not None and ('id', str(record['id'])) in existing:
+                key = ('id', str(record['id']))
+            else:
+                key = ('new', number)
+            # A copy, so a rejected record leaves nothing behind on a row a later record updates
+            base = rows.get(key) or existing.get(key)
+            instance = copy.copy(base) if base is not None else model(external_ref=ref)
+            if model is Dish:
+                instance.restaurant_id = record['restaurant_id']
+            try:
+                invalid = {}
+                for field in converted:
+                    if field.name in record:
+                        try:
+                            setattr(instance, field.attname, _convert(field, record[field.name]))
+                        except ValidationError as e:
+                            invalid[field.name] = e.messages
+                if invalid:
+                    raise ValidationError(invalid)
+                # What Model.clean_fields() does, for just these fields
+                for field in validated:
+                    value = getattr(instance, field.attname)
+                    if not _app_empty(field, value):
+                        try:
+                            setattr(instance, field.attname, field.clean(value, instance))
+                        except ValidationError as e:
+                            invalid[field.name] = e.messages
+                if invalid:
+                    raise ValidationError(invalid)
+            except ValidationError as e:
+                errors.append(RecordError(number, '; '.join(f'{name}: {" ".join(messages)}' for name, messages in e.message_dict.items())))
+                continue
+            rows[key] = instance
+        return rows
+
+    def save(self, model, fields, instances):
+        created = [instance for instance in instances if instance.pk is None]
+        updated = [instance for instance in instances if instance.pk is not None]
+        model.objects.bulk_create(created)
+        # Updates go in as an upsert on the primary key: one INSERT ... ON CONFLICT (id) DO UPDATE
+        # per batch instead of bulk_update's CASE WHEN per column, which is many times slower to
+        # build and run. The rows exist, so every one takes the update path (and its triggers).
+        model.objects.bulk_create(updated, update_conflicts=True, unique_fields=['id'], update_fields=fields + ['updated_at'])
+        return created, updated
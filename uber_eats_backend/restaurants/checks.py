@@ -0,0 +1,19 @@
+from django.core.checks import Error, Tags, register
+from django.db import DEFAULT_DB_ALIAS
+
+from .search import fts_available, missing_search_triggers
+
+
+# Database check (run by migrate, or check --database default): search serves stale results without its triggers
+@register(Tags.database)
+def check_search_triggers(app_configs, databases=None, **kwargs):
+    if not databases or DEFAULT_DB_ALIAS not in databases or not fts_available():
+        return []
+    return [
+        Error(
+            f'Search index trigger {name} is missing, so the full-text index no longer follows writes.',
+            hint='A table rebuild by a migration drops it on SQLite; run manage.py rebuild_search_index.',
+            id='restaurants.E001',
+        )
+        for name in missing_search_triggers()
+    ]
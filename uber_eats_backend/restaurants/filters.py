@@ -0,0 +1,76 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, Max, Min, Q
+from rest_framework.exceptions import ValidationError
+
+from .models import Dish
+
+# Query parameters understood by filter_dishes
+DISH_FLAGS = ['is_vegetarian', 'is_vegan', 'is_gluten_free']
+DISH_FILTER_PARAMS = ['category', 'min_price', 'max_price'] + DISH_FLAGS
+
+
+def wants_facets(params):
+    return params.get('facets', '').lower() in ('1', 'true', 'yes')
+
+
+def has_dish_filters(params):
+    return any(name in params for name in DISH_FILTER_PARAMS) or wants_facets(params)
+
+
+def _parse_bool(name, value):
+    value = value.lower()
+    if value in ('1', 'true', 'yes'):
+        return True
+    if value in ('0', 'false', 'no'):
+        return False
+    raise ValidationError({name: 'Must be true or false.'})
+
+
+def _parse_price(name, value):
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: 'Must be a number.'})
+
+
+def _format_price(value):
+    # Same string form DishSerializer uses for prices (SQLite hands aggregates back as floats)
+    return None if value is None else str(Decimal(value).quantize(Decimal('0.01')))
+
+
+def filter_dishes(queryset, params):
+    # ?category= may be repeated or comma-separated; flags take true/false; prices are inclusive
+    categories = [c for value in params.getlist('category') for c in value.split(',') if c]
+    if categories:
+        valid = dict(Dish.categories)
+        unknown = [c for c in categories if c not in valid]
+        if unknown:
+            raise ValidationError({'category': f'Unknown category: {", ".join(unknown)}'})
+        queryset = queryset.filter(category__in=categories)
+    for flag in DISH_FLAGS:
+        if flag in params:
+            queryset = queryset.filter(**{flag: _parse_bool(flag, params[flag])})
+    if 'min_price' in params:
+        queryset = queryset.filter(price__gte=_parse_price('min_price', params['min_price']))
+    if 'max_price' in params:
+        queryset = queryset.filter(price__lte=_parse_price('max_price', params['max_price']))
+    return queryset
+
+
+def dish_facets(queryset):
+    # Two queries, both answerable from the (…, category, flags, price) indexes alone
+    queryset = queryset.order_by()
+    categories = queryset.values('category').annotate(count=Count('id')).order_by('category')
+    totals = queryset.aggregate(
+        total=Count('id'),
+        min_price=Min('price'),
+        max_price=Max('price'),
+        **{flag: Count('id', filter=Q(**{flag: True})) for flag in DISH_FLAGS}
+    )
+    return {
+        'total': totals['total'],
+        'category': {row['category']: row['count'] for row in categories},
+        **{flag: totals[flag] for flag in DISH_FLAGS},
+        'price': {'min': _format_price(totals['min_price']), 'max': _format_price(totals['max_price'])},
+    }
@@ -0,0 +1,149 @@
+import csv
+import math
+import re
+import threading
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.db.models import ExpressionWrapper, F, IntegerField, Q
+from django.db.models.lookups import Range
+from django.utils.module_loading import import_string
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Size of a spatial grid cell in degrees (~1.1 km north-south)
+GRID_CELL_DEGREES = 0.01
+GRID_COLUMNS = int(round(360 / GRID_CELL_DEGREES))
+GRID_ROWS = int(round(180 / GRID_CELL_DEGREES))
+# Largest square nearest() widens to, ~570 km north-south; past it the search stops
+MAX_GRID_RADIUS = 512
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def grid_row_col(latitude, longitude):
+    row = int(math.floor((latitude + 90) / GRID_CELL_DEGREES))
+    col = int(math.floor((longitude + 180) / GRID_CELL_DEGREES)) % GRID_COLUMNS
+    return row, col
+
+
+def grid_cell(latitude, longitude):
+    # Single integer key for the cell containing the point, indexed on Restaurant
+    if latitude is None or longitude is None:
+        return None
+    row, col = grid_row_col(latitude, longitude)
+    return row * GRID_COLUMNS + col
+
+
+def grid_square(latitude, longitude, radius):
+    # Q selecting every cell within `radius` rows and columns of the point's cell.
+    # Rows are consecutive blocks of cells, so the rows are one indexed range;
+    # the columns are then at most two spans of grid_cell modulo the row width.
+    row, col = grid_row_col(latitude, longitude)
+    first_row, last_row = max(row - radius, 0), min(row + radius, GRID_ROWS - 1)
+    condition = Q(grid_cell__range=(first_row * GRID_COLUMNS, (last_row + 1) * GRID_COLUMNS - 1))
+    if 2 * radius + 1 >= GRID_COLUMNS:
+        return condition
+    if col - radius < 0:
+        column_spans = [(0, col + radius), (GRID_COLUMNS + col - radius, GRID_COLUMNS - 1)]
+    elif col + radius >= GRID_COLUMNS:
+        column_spans = [(col - radius, GRID_COLUMNS - 1), (0, col + radius - GRID_COLUMNS)]
+    else:
+        column_spans = [(col - radius, col + radius)]
+    column = ExpressionWrapper(F('grid_cell') % GRID_COLUMNS, output_field=IntegerField())
+    columns = Q()
+    for first, last in column_spans:
+        columns |= Q(Range(column, (first, last)))
+    return condition & columns
+
+
+def ring_clearance_km(latitude, radius):
+    # Lower bound on the distance from a point to any cell outside its grid_square(radius).
+    # East-west cells shrink with latitude, so use the narrowest row in range.
+    worst_latitude = min(90.0, abs(latitude) + (radius + 1) * GRID_CELL_DEGREES)
+    cell_km = math.radians(GRID_CELL_DEGREES) * EARTH_RADIUS_KM
+    return radius * cell_km * max(math.cos(math.radians(worst_latitude)), 0.0)
+
+
+class Geocoder(ABC):
+    # Turns an address into (latitude, longitude), or None when it can't
+    @abstractmethod
+    def geocode(self, address='', postal_code=None, country=None):
+        pass
+
+
+class PostalCodeGeocoder(Geocoder):
+    # Offline geocoder resolving addresses to their postal-code centroid. Reads a CSV with
+    # postal_code,latitude,longitude columns; addresses without an explicit postal code use
+    # the last ZIP-like number in the text.
+
+    postal_code_pattern = re.compile(r'\b(\d{5})(?:-\d{4})?\b')
+
+    def __init__(self, path=None):
+        self.path = path or settings.BASE_DIR / 'restaurants' / 'data' / 'postal_codes.csv'
+        self._table = None
+        self._lock = threading.Lock()
+
+    def table(self):
+        if self._table is None:
+            with self._lock:
+                if self._table is None:
+                    with open(self.path, newline='') as f:
+                        self._table = {
+                            row['postal_code'].strip(): (float(row['latitude']), float(row['longitude']))
+                            for row in csv.DictReader(f)
+                        }
+        return self._table
+
+    def geocode(self, address='', postal_code=None, country=None):
+        if not postal_code:
+            matches = self.postal_code_pattern.findall(address or '')
+            postal_code = matches[-1] if matches else None
+        if not postal_code:
+            return None
+        return self.table().get(postal_code.strip()[:5])
+
+
+_geocoder = None
+
+
+def get_geocoder():
+    global _geocoder
+    if _geocoder is None:
+        config = getattr(settings, 'GEOCODER', {})
+        backend = import_string(config.get('BACKEND', 'restaurants.geo.PostalCodeGeocoder'))
+        _geocoder = backend(**config.get('OPTIONS', {}))
+    return _geocoder
+
+
+def nearest(queryset, latitude, longitude, k=10, max_km=50.0):
+    """The k rows of `queryset` closest to the point, as (distance_km, obj) pairs.
+
+    Scans squares of grid cells around the point, doubling the square each
+    time, with one indexed query for coordinates only. It stops once k
+    candidates are closer than anything outside the square, or the square
+    reaches past max_km or MAX_GRID_RADIUS; then the k winners are loaded in
+    one more query.
+    """
+    if not math.isfinite(max_km) or max_km <= 0:
+        raise ValueError('max_km must be a positive number')
+    radius = 1
+    while True:
+        rows = queryset.filter(grid_square(latitude, longitude, radius)).values_list('pk', 'latitude', 'longitude')
+        ranked = sorted(
+            (distance, pk) for distance, pk in
+            ((haversine_km(latitude, longitude, lat, lon), pk) for pk, lat, lon in rows)
+            if distance <= max_km
+        )[:k]
+        # Everything outside the square is at least this far away
+        clearance = ring_clearance_km(latitude, radius)
+        if (len(ranked) == k and ranked[-1][0] <= clearance) or clearance > max_km \
+                or 2 * radius + 1 >= GRID_COLUMNS or radius >= MAX_GRID_RADIUS:
+            break
+        radius = min(radius * 2, MAX_GRID_RADIUS)
+    objects = queryset.in_bulk([pk for _, pk in ranked])
+    return [(distance, objects[pk]) for distance, pk in ranked if pk in objects]
@@ -0,0 +1,63 @@
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_time
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+def minute_of_week(moment):
+    # Monday 00:00 is minute 0, in the server's local time zone
+    if timezone.is_aware(moment):
+        moment = timezone.localtime(moment)
+    return moment.weekday() * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+
+
+def _as_time(value):
+    # update_profile assigns the raw request strings, so accept "HH:MM" too
+    if isinstance(value, str):
+        return parse_time(value)
+    return value
+
+
+def opening_intervals(opening_time, closing_time):
+    """Half-open [start, end) minute-of-week intervals for daily opening hours.
+
+    Hours that wrap past midnight (18:00-02:00) are split at midnight, and
+    the Sunday-night part carries over to Monday morning, so every interval
+    satisfies start < end and a single range check answers "open at m?".
+    Equal opening and closing times mean open around the clock.
+    """
+    opening_time, closing_time = _as_time(opening_time), _as_time(closing_time)
+    if opening_time is None or closing_time is None:
+        return []
+    opens = opening_time.hour * 60 + opening_time.minute
+    closes = closing_time.hour * 60 + closing_time.minute
+    if opens == closes:
+        return [(0, MINUTES_PER_WEEK)]
+
+    intervals = []
+    for day in range(7):
+        start = day * MINUTES_PER_DAY + opens
+        end = day * MINUTES_PER_DAY + closes
+        if closes < opens:
+            end += MINUTES_PER_DAY  # Closes the next day
+        if end <= MINUTES_PER_WEEK:
+            intervals.append((start, end))
+        else:
+            intervals.append((start, MINUTES_PER_WEEK))
+            intervals.append((0, end - MINUTES_PER_WEEK))
+    return sorted(interval for interval in intervals if interval[0] < interval[1])
+
+
+def parse_open_at(value):
+    # ISO 8601 datetime; naive values are in the server's local time zone
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(value)
+    return moment
+
+
+def open_at_lookup(moment, prefix='opening_intervals__'):
+    # Filter kwargs selecting restaurants open at `moment`; one range scan on the interval index
+    minute = minute_of_week(moment)
+    return {f'{prefix}start_minute__lte': minute, f'{prefix}end_minute__gt': minute}
@@ -0,0 +1,46 @@
+# restaurants/management/commands/backfill_sales_rollups.py
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from customers.analytics import rebuild_sales_rollups
+from customers.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the daily sales rollups from delivered orders, one chunk of days per transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat, help='First day to rebuild (default: the oldest delivered order)')
+        parser.add_argument('--until', type=date.fromisoformat, help='Last day to rebuild (default: today)')
+        parser.add_argument('--chunk-days', type=int, default=31, help='Days recomputed per transaction')
+        parser.add_argument('--restaurant', type=int, help='Only rebuild this restaurant')
+
+    def handle(self, *args, **options):
+        if options['chunk_days'] < 1:
+            raise CommandError('--chunk-days must be at least 1')
+        orders = Order.objects.filter(status='delivered')
+        if options['restaurant'] is not None:
+            orders = orders.filter(restaurant_id=options['restaurant'])
+
+        since = options['since']
+        if since is None:
+            oldest = orders.aggregate(oldest=Min('created_at'))['oldest']
+            if oldest is None:
+                self.stdout.write('No delivered orders, nothing to rebuild')
+                return
+            since = timezone.localdate(oldest)
+        until = options['until'] or timezone.localdate()
+
+        # Short transactions, so the incremental updates from live orders only ever wait on one chunk
+        step = timedelta(days=options['chunk_days'])
+        chunk_start, rows = since, 0
+        while chunk_start <= until:
+            chunk_end = min(chunk_start + step, until + timedelta(days=1))
+            written = rebuild_sales_rollups(chunk_start, chunk_end, restaurant_id=options['restaurant'])
+            rows += written
+            self.stdout.write(f'{chunk_start} .. {chunk_end - timedelta(days=1)}: {written} restaurant-days')
+            chunk_start = chunk_end
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} restaurant-days from {since} to {until}'))
@@ -0,0 +1,126 @@
+# restaurants/management/commands/benchmark_async_views.py
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from customers.models import CartItem, Customer, Order
+from restaurants.models import Restaurant
+from uber_eats_backend.async_views import AsyncReadViewsHandler
+from uber_eats_backend.benchmarks import allow_test_host, asgi_request, environment, summarize
+
+
+class Command(BaseCommand):
+    help = ('Compares the hot read endpoints served by the viewsets under WSGI and ASGI with the async views '
+            '(ASYNC_READ_VIEWS) under ASGI, at increasing numbers of concurrent connections, on a '
+            'generate_load_data data set')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='load', help='The --prefix the data set was generated with')
+        parser.add_argument('--requests', type=int, default=300, help='Timed requests per endpoint, server and concurrency')
+        parser.add_argument('--warmup', type=int, default=10, help='Untimed requests before each run')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32], help='Connections in flight')
+        parser.add_argument('--users', type=int, default=20, help='Customers the requests are spread over')
+        parser.add_argument('--endpoint', action='append', help='Only run this endpoint (repeatable)')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        # Customers with an open cart and an order, so the cart and order detail aren't empty answers
+        customers = list(
+            Customer.objects.filter(user__username__startswith=f'{prefix}-customer-', cartitem__state='placing', order__isnull=False)
+            .distinct().select_related('user').order_by('id')[:options['users']]
+        )
+        restaurant_ids = list(
+            Restaurant.objects.filter(user__username__startswith=f'{prefix}-owner-').order_by('id').values_list('id', flat=True)
+        )
+        if not customers or not restaurant_ids:
+            raise CommandError(f'No data set with prefix "{prefix}" (with open carts); run generate_load_data first')
+        tokens = [Token.objects.get_or_create(user=customer.user)[0].key for customer in customers]
+        orders = dict(Order.objects.filter(customer__in=customers).order_by('customer_id', 'id').values_list('customer_id', 'id'))
+        order_ids = [orders[customer.id] for customer in customers]
+
+        endpoints = {
+            'restaurant_list': lambda i: '/api/restaurants/?page_size=50',
+            'restaurant_detail': lambda i: f'/api/restaurants/{restaurant_ids[i * 7 % len(restaurant_ids)]}/',
+            'menu': lambda i: f'/api/restaurants/{restaurant_ids[i * 7 % len(restaurant_ids)]}/dishes/',
+            'cart': lambda i: '/api/cart-items/',
+            # Request i goes out as customer i % users, so this is always that customer's own order
+            'order_detail': lambda i: f'/api/orders/getOrderDetail/?orderId={order_ids[i % len(order_ids)]}',
+        }
+        if options['endpoint']:
+            unknown = set(options['endpoint']) - set(endpoints)
+            if unknown:
+                raise CommandError(f'Unknown endpoint: {", ".join(sorted(unknown))}')
+            endpoints = {name: path for name, path in endpoints.items() if name in options['endpoint']}
+
+        results = {'meta': {
+            **environment(),
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'dataset': {
+                'prefix': prefix,
+                'restaurants': len(restaurant_ids),
+                'cart_lines': CartItem.objects.filter(customer__in=customers).count(),
+            },
+        }, 'scenarios': {}}
+        servers = [('wsgi', None), ('asgi', ASGIHandler()), ('asgi_async', AsyncReadViewsHandler())]
+        with allow_test_host():
+            for name, path in endpoints.items():
+                for concurrency in options['concurrency']:
+                    line = f'{name:<17} c={concurrency:<3}'
+                    for server, application in servers:
+                        if application is None:
+                            summary = self.run_wsgi(path, tokens, options['requests'], concurrency, options['warmup'])
+                        else:
+                            summary = asyncio.run(self.run_asgi(application, path, tokens, options['requests'], concurrency, options['warmup']))
+                        results['scenarios'][f'{name}/{server}/c{concurrency}'] = summary
+                        errors = f' ({summary["errors"]} errors)' if summary['errors'] else ''
+                        line += (f'  {server} {summary["throughput_rps"]:7.1f} req/s p50 {summary["p50_ms"]:7.2f} '
+                                 f'p95 {summary["p95_ms"]:7.2f} ms{errors}')
+                    self.stdout.write(line)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+    def run_wsgi(self, path, tokens, requests, concurrency, warmup):
+        """Requests through Django's sync handler, one thread (and DB connection) per connection, like a threaded WSGI server."""
+        local = threading.local()
+
+        def send(i):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            start = time.perf_counter()
+            response = local.client.get(path(i), HTTP_AUTHORIZATION=f'Token {tokens[i % len(tokens)]}')
+            return (time.perf_counter() - start) * 1000, response.status_code
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(send, range(warmup)))
+            started = time.perf_counter()
+            sent = list(pool.map(send, range(warmup, warmup + requests)))
+            wall = time.perf_counter() - started
+        return summarize([elapsed for elapsed, _ in sent], sum(status >= 400 for _, status in sent), wall)
+
+    async def run_asgi(self, application, path, tokens, requests, concurrency, warmup):
+        """Requests through an ASGI handler, `concurrency` of them in flight on one event loop."""
+        slots = asyncio.Semaphore(concurrency)
+
+        async def send(i):
+            async with slots:
+                start = time.perf_counter()
+                status = await asgi_request(application, 'GET', path(i), [(b'authorization', f'Token {tokens[i % len(tokens)]}'.encode())])
+                return (time.perf_counter() - start) * 1000, status
+
+        await asyncio.gather(*(send(i) for i in range(warmup)))
+        started = time.perf_counter()
+        sent = await asyncio.gather(*(send(i) for i in range(warmup, warmup + requests)))
+        wall = time.perf_counter() - started
+        return summarize([elapsed for elapsed, _ in sent], sum(status >= 400 for _, status in sent), wall)
@@ -0,0 +1,92 @@
+# restaurants/management/commands/benchmark_cart_logging.py
+import contextlib
+import logging
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from customers.models import CartItem
+from customers.views import CartItemViewSet
+from restaurants.models import Dish
+from uber_eats_backend.benchmarks import allow_test_host, percentile
+
+USERNAME = 'benchmark-cart'
+
+
+class Command(BaseCommand):
+    help = 'Measures cart endpoint latency with the old eager, synchronous logging and with the queued logging'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=20, help='Lines in the benchmark cart')
+        parser.add_argument('--requests', type=int, default=300, help='Requests per endpoint and phase')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=USERNAME).first() or User.objects.create_user(username=USERNAME, password='benchmark')
+        dishes = list(Dish.objects.order_by('id')[:options['lines']])
+        if len(dishes) < options['lines']:
+            self.stdout.write(self.style.ERROR('Not enough dishes; seed a catalogue first (benchmark_dish_filters --seed)'))
+            return
+        CartItem.objects.filter(customer=user.customer, state='placing').delete()
+        CartItem.objects.bulk_create([
+            CartItem(customer=user.customer, dish=dish, restaurant_id=dish.restaurant_id, quantity=1) for dish in dishes
+        ])
+        token, _ = Token.objects.get_or_create(user=user)
+
+        endpoints = [
+            ('GET  /api/cart-items/', lambda client: client.get('/api/cart-items/')),
+            ('GET  /api/cart-items/summary/', lambda client: client.get('/api/cart-items/summary/')),
+            ('POST /api/cart-items/batch/', lambda client: client.post(
+                '/api/cart-items/batch/', [{'dish_id': dishes[0].id, 'quantity': 1}], content_type='application/json',
+            )),
+        ]
+        with tempfile.TemporaryFile('w') as log_file:
+            for phase, legacy in (('eager, synchronous (old)', True), ('lazy, queued (current)', False)):
+                self.stdout.write(phase)
+                with self.legacy_logging(log_file) if legacy else contextlib.nullcontext():
+                    for name, run in endpoints:
+                        self.measure(name, run, token.key, options['requests'])
+
+    @contextlib.contextmanager
+    def legacy_logging(self, log_file):
+        # What the cart list used to do: format every row into an INFO line, written from the request thread
+        original = CartItemViewSet.get_queryset
+        logger = logging.getLogger('customers.views')
+
+        def get_queryset(view):
+            cart_items = original(view)
+            logger.info(f"Cart items: {cart_items.values()}")
+            return cart_items
+
+        root = logging.getLogger()
+        handlers, level = root.handlers[:], root.level
+        root.handlers = [logging.StreamHandler(log_file)]
+        root.setLevel(logging.INFO)
+        try:
+            with mock.patch.object(CartItemViewSet, 'get_queryset', get_queryset):
+                yield
+        finally:
+            root.handlers = handlers
+            root.setLevel(level)
+
+    def measure(self, name, run, token, requests):
+        with allow_test_host():
+            client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+            run(client)  # Warm the token cache
+            timings = []
+            with CaptureQueriesContext(connection) as queries:
+                for _ in range(requests):
+                    start = time.perf_counter()
+                    run(client)
+                    timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        self.stdout.write(
+            f'  {name:<30} p50 {percentile(timings, 50):7.2f} ms   p95 {percentile(timings, 95):7.2f} ms   '
+            f'{len(queries) / requests:4.1f} queries/request'
+        )
@@ -0,0 +1,104 @@
+# restaurants/management/commands/benchmark_dish_filters.py
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from rest_framework.test import APIRequestFactory
+
+from restaurants.models import Restaurant, Dish
+from restaurants.views import DishViewSet, RestaurantViewSet
+from uber_eats_backend.benchmarks import percentile
+
+
+class Command(BaseCommand):
+    help = 'Measures latency of faceted dish filtering, optionally seeding a synthetic catalogue first'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true',
+                            help='Insert synthetic restaurants and dishes into the configured database first')
+        parser.add_argument('--restaurants', type=int, default=100_000)
+        parser.add_argument('--dishes', type=int, default=5_000_000)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--requests', type=int, default=500, help='Requests per scenario')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['restaurants'], options['dishes'], options['batch_size'])
+
+        bounds = Restaurant.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            self.stdout.write(self.style.ERROR('No restaurants found. Run with --seed first.'))
+            return
+        self.stdout.write(f'Catalogue: {Restaurant.objects.count()} restaurants, {Dish.objects.count()} dishes')
+
+        factory = APIRequestFactory()
+        dish_list = DishViewSet.as_view({'get': 'list'})
+        menu = RestaurantViewSet.as_view({'get': 'list_dishes'})
+        scenarios = [
+            ('catalogue-wide facets', lambda: dish_list(factory.get('/api/dishes/', self.random_filters(page_size=20)))),
+            ('per-restaurant facets', lambda: menu(
+                factory.get('/api/restaurants/0/dishes/', self.random_filters()),
+                pk=random.randint(bounds['low'], bounds['high']),
+            )),
+        ]
+        for name, run in scenarios:
+            timings = []
+            for _ in range(options['requests']):
+                start = time.perf_counter()
+                response = run()
+                response.render()
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f'{name:<24} p50 {percentile(timings, 50):8.2f} ms   '
+                f'p95 {percentile(timings, 95):8.2f} ms   p99 {percentile(timings, 99):8.2f} ms'
+            )
+
+    def random_filters(self, **extra):
+        params = {'facets': 'true', **extra}
+        if random.random() < 0.7:
+            params['category'] = random.choice(Dish.categories)[0]
+        for flag in ('is_vegetarian', 'is_vegan', 'is_gluten_free'):
+            if random.random() < 0.3:
+                params[flag] = 'true'
+        if random.random() < 0.5:
+            low = random.randint(2, 20)
+            params['min_price'], params['max_price'] = low, low + random.randint(1, 15)
+        return params
+
+    def seed(self, restaurant_count, dish_count, batch_size):
+        self.stdout.write(f'Seeding {restaurant_count} restaurants and {dish_count} dishes...')
+        with transaction.atomic():
+            Restaurant.objects.bulk_create(
+                (Restaurant(name=f'Benchmark Restaurant {i}', description='Synthetic') for i in range(restaurant_count)),
+                batch_size=batch_size,
+            )
+        restaurant_ids = list(Restaurant.objects.values_list('id', flat=True))
+        categories = [value for value, _ in Dish.categories]
+        created = 0
+        while created < dish_count:
+            size = min(batch_size, dish_count - created)
+            with transaction.atomic():
+                Dish.objects.bulk_create([
+                    Dish(
+                        restaurant_id=random.choice(restaurant_ids),
+                        name=f'Dish {created + i}',
+                        description='Synthetic',
+                        price=Decimal(random.randint(199, 3999)) / 100,
+                        category=random.choice(categories),
+                        is_vegetarian=random.random() < 0.3,
+                        is_vegan=random.random() < 0.1,
+                        is_gluten_free=random.random() < 0.2,
+                    )
+                    for i in range(size)
+                ])
+            created += size
+            self.stdout.write(f'  {created} dishes', ending='\r')
+        self.stdout.write('')
+        if connection.vendor == 'sqlite':
+            # Give the planner fresh statistics for the new composite indexes
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
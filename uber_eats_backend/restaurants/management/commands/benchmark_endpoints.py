@@ -0,0 +1,133 @@
+# restaurants/management/commands/benchmark_endpoints.py
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from customers.models import Customer, DeliveryAddress, Order
+from restaurants.models import Dish, Restaurant
+from uber_eats_backend.benchmarks import (
+    ClientTransport, HttpTransport, Scenario, compare_results, environment, run_scenario,
+)
+
+
+class Command(BaseCommand):
+    help = ('Drives the main API endpoints against a generate_load_data data set and reports throughput, '
+            'p50/p95/p99 latency and queries per request; --output and --compare track regressions across commits')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='load', help='The --prefix the data set was generated with')
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=10, help='Untimed requests per scenario before timing')
+        parser.add_argument('--users', type=int, default=20, help='Customers the requests are spread over')
+        parser.add_argument('--scenario', action='append', help='Only run this scenario (repeatable)')
+        parser.add_argument('--base-url', help='Benchmark a running server (e.g. http://127.0.0.1:8000) instead of the test client')
+        parser.add_argument('--concurrency', type=int, default=1, help='Requests in flight; needs --base-url')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='Results JSON of a baseline run; fail on regressions')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative latency/throughput change')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] > 1 and not options['base_url']:
+            raise CommandError('--concurrency needs --base-url; the test client runs one request at a time')
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+
+        prefix = options['prefix']
+        customers = list(
+            Customer.objects.filter(user__username__startswith=f'{prefix}-customer-', deliveryaddress__is_default=True)
+            .select_related('user').order_by('id')[:options['users']]
+        )
+        restaurants = list(Restaurant.objects.filter(user__username__startswith=f'{prefix}-owner-').order_by('id'))
+        if not customers or not restaurants:
+            raise CommandError(f'No data set with prefix "{prefix}"; run generate_load_data first')
+
+        def transports(users):
+            tokens = [Token.objects.get_or_create(user=user)[0].key for user in users]
+            if options['base_url']:
+                return [HttpTransport(token, options['base_url']) for token in tokens]
+            return [ClientTransport(token) for token in tokens]
+
+        scenarios = self.scenarios(customers, restaurants, random.Random(options['seed']))
+        if options['scenario']:
+            unknown = set(options['scenario']) - {scenario.name for scenario, _ in scenarios}
+            if unknown:
+                raise CommandError(f'Unknown scenario: {", ".join(sorted(unknown))}')
+            scenarios = [(scenario, users) for scenario, users in scenarios if scenario.name in options['scenario']]
+
+        results = {'meta': {
+            **environment(),
+            'transport': options['base_url'] or 'test-client',
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'dataset': {
+                'prefix': prefix,
+                'restaurants': len(restaurants),
+                'dishes': Dish.objects.filter(restaurant__in=restaurants).count(),
+                'orders': Order.objects.filter(restaurant__in=restaurants).count(),
+            },
+        }, 'scenarios': {}}
+        for scenario, users in scenarios:
+            summary = run_scenario(scenario, transports(users), options['requests'], options['concurrency'], options['warmup'])
+            results['scenarios'][scenario.name] = summary
+            queries = summary['queries_per_request']
+            self.stdout.write(
+                f'{scenario.name:<17} {summary["throughput_rps"]:8.1f} req/s   p50 {summary["p50_ms"]:8.2f} ms   '
+                f'p95 {summary["p95_ms"]:8.2f} ms   p99 {summary["p99_ms"]:8.2f} ms   '
+                f'{"-" if queries is None else f"{queries:5.1f}"} q/request   {summary["errors"]} errors'
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+        if baseline is not None:
+            regressions = compare_results(baseline, results, options['tolerance'])
+            for line in regressions:
+                self.stdout.write(self.style.ERROR(f'  {line}'))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regressions against {baseline["meta"].get("revision") or options["compare"]}')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {baseline["meta"].get("revision") or options["compare"]}'))
+
+    def scenarios(self, customers, restaurants, rng):
+        """(Scenario, users) for every benchmarked endpoint, with the users that send it."""
+        menus = {}
+        for dish_id, restaurant_id in Dish.objects.filter(restaurant__in=restaurants).values_list('id', 'restaurant_id'):
+            menus.setdefault(restaurant_id, []).append(dish_id)
+        restaurant_ids = [r.id for r in restaurants if r.id in menus]
+        addresses = dict(DeliveryAddress.objects.filter(customer__in=customers, is_default=True).values_list('customer_id', 'id'))
+        # Fixed picks per request index, so every run sends the same requests
+        picks = [rng.choice(restaurant_ids) for _ in range(10000)]
+        dishes = [rng.choice(menus[restaurant_id]) for restaurant_id in picks]
+        users = [customer.user for customer in customers]
+        owned = restaurants[0]
+
+        def cart_line(i):
+            # Each request is a different (customer, restaurant) pair, so place_order always finds its own cart
+            restaurant_id = restaurant_ids[(i // len(customers)) % len(restaurant_ids)]
+            return restaurant_id, menus[restaurant_id][i % len(menus[restaurant_id])]
+
+        def place_order(i):
+            restaurant_id, _ = cart_line(i)
+            return 'POST', '/api/orders/place_order/', {
+                'restaurant_id': restaurant_id, 'delivery_address_id': addresses[customers[i % len(customers)].id],
+            }
+
+        return [
+            # The first cursor page; the bare list returns every restaurant, unbounded as the catalogue grows
+            (Scenario('restaurant_list', lambda i: ('GET', '/api/restaurants/?page_size=50', None)), users),
+            (Scenario('menu', lambda i: ('GET', f'/api/restaurants/{picks[i % len(picks)]}/dishes/', None)), users),
+            (Scenario('add_to_cart', lambda i: ('POST', '/api/cart-items/add_to_cart/', {
+                'dish_id': dishes[i % len(dishes)], 'restaurant_id': picks[i % len(picks)], 'quantity': 1,
+            })), users),
+            (Scenario('place_order', place_order, prepare=lambda i: [
+                ('POST', '/api/cart-items/add_to_cart/', {'dish_id': cart_line(i)[1], 'restaurant_id': cart_line(i)[0]}),
+            ]), users),
+            (Scenario('order_history', lambda i: ('GET', '/api/orders/order_history/', None)), users),
+            # getOrders: the restaurant's whole order list, as its owner sees it
+            (Scenario('restaurant_orders', lambda i: ('GET', f'/api/restaurants/{owned.id}/orders/', None)), [owned.user]),
+        ]
@@ -0,0 +1,75 @@
+# restaurants/management/commands/benchmark_login_storm.py
+import asyncio
+import contextlib
+import time
+from collections import Counter
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient
+
+from uber_eats_backend import passwords
+from uber_eats_backend.benchmarks import allow_test_host, percentile
+
+USERNAME = 'benchmark-login'
+PASSWORD = 'benchmark-password'
+
+
+class Command(BaseCommand):
+    help = 'Measures latency of an ordinary endpoint while the login endpoint is hammered, through the ASGI handler'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=10.0, help='Length of each phase')
+        parser.add_argument('--logins', type=int, default=32, help='Concurrent clients hammering /api/customers/login/')
+        parser.add_argument('--probe', default='/api/restaurants/?page_size=20', help='Endpoint whose latency is measured')
+        parser.add_argument('--inline', action='store_true',
+                            help='Also run a phase hashing on the event loop, as a synchronous login would')
+
+    def handle(self, *args, **options):
+        if not User.objects.filter(username=USERNAME).exists():
+            User.objects.create_user(username=USERNAME, password=PASSWORD)
+
+        phases = [('baseline (no logins)', 0, False), ('login storm, pool', options['logins'], False)]
+        if options['inline']:
+            phases.append(('login storm, inline', options['logins'], True))
+        for name, logins, inline in phases:
+            with allow_test_host():
+                probes, statuses = asyncio.run(self.phase(options['probe'], logins, options['seconds'], inline))
+            probes.sort()
+            logins_summary = ', '.join(f'{count}x{status}' for status, count in sorted(statuses.items())) or '-'
+            self.stdout.write(
+                f'{name:<22} probe p50 {percentile(probes, 50):8.2f} ms   p95 {percentile(probes, 95):8.2f} ms   '
+                f'p99 {percentile(probes, 99):8.2f} ms   logins {logins_summary}'
+            )
+        passwords.hashing_pool.shutdown()
+
+    async def phase(self, probe_url, logins, seconds, inline):
+        client = AsyncClient()
+        deadline = time.monotonic() + seconds
+        probes, statuses = [], Counter()
+
+        async def hammer():
+            while time.monotonic() < deadline:
+                response = await client.post(
+                    '/api/customers/login/', {'username': USERNAME, 'password': PASSWORD}, content_type='application/json',
+                )
+                statuses[response.status_code] += 1
+                if response.status_code == 429:
+                    await asyncio.sleep(int(response['Retry-After']))  # Well-behaved clients back off
+
+        async def measure():
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                await client.get(probe_url)
+                probes.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.01)
+
+        async def run_inline(fn, *args):
+            return fn(*args)
+
+        # Warm the pool up so worker start-up isn't counted against the first probes
+        await passwords.make_password('warm-up')
+        with mock.patch.object(passwords.hashing_pool, 'run', run_inline) if inline else contextlib.nullcontext():
+            await asyncio.gather(measure(), *(hammer() for _ in range(logins)))
+        return probes, statuses
@@ -0,0 +1,75 @@
+# restaurants/management/commands/benchmark_nearby.py
+import random
+import time
+from datetime import time as clock
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from restaurants.geo import grid_cell, haversine_km, nearest
+from restaurants.hours import open_at_lookup, opening_intervals
+from restaurants.models import OpeningInterval, Restaurant
+from uber_eats_backend.benchmarks import percentile
+
+# Roughly the South Bay, where the sample postal codes are
+BOUNDS = {'lat': (37.20, 37.55), 'lon': (-122.20, -121.80)}
+
+
+class Command(BaseCommand):
+    help = 'Compares the grid-indexed nearest-restaurant search against a naive full scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Insert this many synthetic restaurants into the configured database first')
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--max-km', type=float, default=25.0)
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['seed'])
+
+        now = timezone.now()
+        open_restaurants = Restaurant.objects.filter(**open_at_lookup(now))
+        self.stdout.write(f'{Restaurant.objects.count()} restaurants, {open_restaurants.count()} open now')
+        points = [(random.uniform(*BOUNDS['lat']), random.uniform(*BOUNDS['lon'])) for _ in range(options['queries'])]
+        k, max_km = options['k'], options['max_km']
+
+        def grid(lat, lon):
+            return [r.pk for _, r in nearest(open_restaurants, lat, lon, k, max_km)]
+
+        def naive(lat, lon):
+            rows = open_restaurants.filter(latitude__isnull=False).values_list('id', 'latitude', 'longitude')
+            ranked = sorted((haversine_km(lat, lon, rlat, rlon), pk) for pk, rlat, rlon in rows)
+            return [pk for distance, pk in ranked[:k] if distance <= max_km]
+
+        for name, search in (('grid index', grid), ('naive scan', naive)):
+            timings = []
+            for lat, lon in points:
+                start = time.perf_counter()
+                search(lat, lon)
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            self.stdout.write(f'{name:<12} p50 {percentile(timings, 50):8.2f} ms   p95 {percentile(timings, 95):8.2f} ms')
+
+        mismatches = sum(grid(lat, lon) != naive(lat, lon) for lat, lon in points[:20])
+        self.stdout.write(f'Result mismatches on 20 spot checks: {mismatches}')
+
+    def seed(self, count):
+        self.stdout.write(f'Seeding {count} restaurants...')
+        restaurants = []
+        for i in range(count):
+            lat, lon = random.uniform(*BOUNDS['lat']), random.uniform(*BOUNDS['lon'])
+            opens = random.choice([6, 8, 10, 11, 17])
+            restaurants.append(Restaurant(
+                name=f'Nearby Restaurant {i}', description='Synthetic', latitude=lat, longitude=lon,
+                grid_cell=grid_cell(lat, lon), opening_time=clock(opens), closing_time=clock((opens + 12) % 24),
+            ))
+        with transaction.atomic():
+            # bulk_create skips the signals, so build the opening intervals ourselves
+            created = Restaurant.objects.bulk_create(restaurants, batch_size=5000)
+            OpeningInterval.objects.bulk_create([
+                OpeningInterval(restaurant=r, start_minute=start, end_minute=end)
+                for r in created for start, end in opening_intervals(r.opening_time, r.closing_time)
+            ], batch_size=5000)
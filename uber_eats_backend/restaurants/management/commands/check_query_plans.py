@@ -0,0 +1,29 @@
+# restaurants/management/commands/check_query_plans.py
+from django.core.management.base import BaseCommand, CommandError
+
+from uber_eats_backend.query_plans import ALLOWED_FULL_SCANS, check_query_plans
+
+
+class Command(BaseCommand):
+    help = "Runs EXPLAIN on every viewset's queryset and the hot action queries; fails if any reads a whole table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not only the failing ones')
+
+    def handle(self, *args, **options):
+        results = check_query_plans()
+        for result in results:
+            if result.full_scans:
+                self.stdout.write(self.style.ERROR(f'FULL SCAN  {result.name}'))
+            elif result.name in ALLOWED_FULL_SCANS:
+                self.stdout.write(f'allowed    {result.name} ({ALLOWED_FULL_SCANS[result.name]})')
+            else:
+                self.stdout.write(f'ok         {result.name}')
+            if result.full_scans or options['verbose_plans']:
+                for line in result.plan.splitlines():
+                    self.stdout.write(f'           {line}')
+
+        failing = [result.name for result in results if result.full_scans]
+        if failing:
+            raise CommandError(f'{len(failing)} queries read a whole table: {", ".join(failing)}')
+        self.stdout.write(self.style.SUCCESS(f'Checked {len(results)} query plans, no full table scans'))
@@ -0,0 +1,21 @@
+# restaurants/management/commands/export_catalogue.py
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurants.catalogue import export_records, file_format, open_text, write_records
+
+
+class Command(BaseCommand):
+    help = 'Writes every restaurant and dish to a CSV or JSON Lines file (optionally .gz), streaming from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Output file: .csv, .jsonl, .csv.gz or .jsonl.gz')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched from the database at a time')
+
+    def handle(self, *args, **options):
+        try:
+            fmt = file_format(options['path'])
+        except ValueError as e:
+            raise CommandError(e)
+        with open_text(options['path'], 'w') as file:
+            count = write_records(file, fmt, export_records(chunk_size=options['chunk_size']))
+        self.stdout.write(self.style.SUCCESS(f'Exported {count} records to {options["path"]}'))
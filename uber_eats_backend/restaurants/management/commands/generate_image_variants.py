@@ -0,0 +1,37 @@
+# restaurants/management/commands/generate_image_variants.py
+from django.core.management.base import BaseCommand
+
+from customers.models import Customer
+from restaurants.models import Dish, Restaurant
+from uber_eats_backend.images import apply_variants, render_variants
+
+# (model, image field, variants field) for every image that gets variants
+TRACKED_IMAGES = [
+    (Restaurant, 'image', 'image_variants'),
+    (Dish, 'image', 'image_variants'),
+    (Customer, 'profile_picture', 'profile_picture_variants'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Renders thumbnails and responsive sizes for images uploaded before variants existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-render images that already have variants')
+
+    def handle(self, *args, **options):
+        for model, field_name, variants_field in TRACKED_IMAGES:
+            rows = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            if not options['force']:
+                rows = rows.filter(**{f'{variants_field}__isnull': True})
+            rendered = failed = 0
+            for pk, name in rows.values_list('pk', field_name).iterator():
+                try:
+                    variants = render_variants(name)
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'{model.__name__} {pk}: {name}: {e}')
+                    continue
+                apply_variants(model, pk, field_name, variants_field, name, variants)
+                rendered += 1
+            self.stdout.write(f'{model.__name__}: {rendered} rendered, {failed} failed')
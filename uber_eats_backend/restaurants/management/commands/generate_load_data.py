@@ -0,0 +1,221 @@
+# restaurants/management/commands/generate_load_data.py
+import io
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from customers.models import CartItem, Customer, DeliveryAddress, Order, OrderItem, OrderSummary
+from restaurants.geo import PostalCodeGeocoder, grid_cell
+from restaurants.hours import opening_intervals
+from restaurants.models import Dish, OpeningInterval, Restaurant
+
+# Every generated user can sign in with this password
+PASSWORD = 'load-data'
+
+CUISINES = ['Pizza', 'Burger', 'Taco', 'Sushi', 'Curry', 'Noodle', 'Salad', 'Grill', 'Bakery', 'Pho']
+SUFFIXES = ['Palace', 'Corner', 'House', 'Kitchen', 'Express', 'Bar', 'Garden', 'Spot']
+STREETS = ['Main St', 'Oak Ave', 'Pine St', 'Elm St', 'Market St', 'Broadway', 'Mission St', 'Castro St']
+FIRST_NAMES = ['Ana', 'Ben', 'Chen', 'Dara', 'Eli', 'Fatima', 'Gus', 'Hana', 'Ivan', 'Jo', 'Kai', 'Lena', 'Mo', 'Nia']
+LAST_NAMES = ['Garcia', 'Smith', 'Nguyen', 'Patel', 'Kim', 'Lopez', 'Brown', 'Singh', 'Chen', 'Okafor']
+ADJECTIVES = ['Classic', 'Spicy', 'Smoky', 'Crispy', 'Garden', 'Double', 'Truffle', 'House', 'Lemon', 'Sweet']
+DISHES = {
+    'Appetizer': ['Wings', 'Spring Rolls', 'Nachos', 'Dumplings', 'Fries'],
+    'Salad': ['Caesar Salad', 'Greek Salad', 'Cobb Salad', 'Noodle Salad'],
+    'Main Course': ['Margherita Pizza', 'Cheeseburger', 'Ramen', 'Burrito', 'Tikka Masala', 'Poke Bowl', 'Pad Thai'],
+    'Dessert': ['Brownie', 'Cheesecake', 'Mochi', 'Churros'],
+    'Beverage': ['Lemonade', 'Iced Tea', 'Mango Lassi', 'Cold Brew'],
+}
+# How historic orders end up; the most recent ones may still be in progress
+FINAL_STATUSES = [('delivered', 90), ('cancelled', 6), ('picked_up', 4)]
+OPEN_STATUSES = ['new', 'preparing', 'on_the_way', 'pickup_ready']
+
+
+class Command(BaseCommand):
+    help = ('Generates a realistic synthetic data set (restaurants, menus, customers, addresses, open carts '
+            'and historic orders) with bulk inserts, for load tests and benchmark_endpoints')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, default=200)
+        parser.add_argument('--dishes-per-restaurant', type=int, default=25)
+        parser.add_argument('--customers', type=int, default=2000)
+        parser.add_argument('--orders-per-customer', type=int, default=10, help='Average; each customer gets 0 to twice this')
+        parser.add_argument('--cart-fraction', type=float, default=0.3, help='Share of customers with an open cart')
+        parser.add_argument('--days', type=int, default=180, help='Historic orders are spread over this many days')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='load', help='Username prefix, so several data sets can coexist')
+        parser.add_argument('--seed', type=int, default=42, help='Same seed, same data set')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(f'Users named {prefix}-* already exist; pick another --prefix')
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.postal_codes = sorted(PostalCodeGeocoder().table().items())
+
+        with transaction.atomic():
+            owners = self.create_users(f'{prefix}-owner', options['restaurants'])
+            customer_users = self.create_users(f'{prefix}-customer', options['customers'])
+            customers = self.create_customers(owners + customer_users)[len(owners):]
+            restaurants = self.create_restaurants(owners)
+            menus = self.create_dishes(restaurants, options['dishes_per_restaurant'])
+            addresses = self.create_addresses(customers)
+        # Orders commit batch by batch; a large history doesn't need one giant transaction
+        orders = self.create_orders(customers, addresses, menus, options['orders_per_customer'], options['days'])
+        carts = self.create_carts(customers, menus, options['cart_fraction'])
+        # bulk_create skipped the incremental rollup updates too
+        call_command('backfill_sales_rollups', stdout=io.StringIO())
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(restaurants)} restaurants, {sum(len(menu) for menu in menus.values())} dishes, '
+            f'{len(customers)} customers, {len(addresses)} addresses, {orders} orders and {carts} cart lines '
+            f'(password "{PASSWORD}")'
+        ))
+
+    def create_users(self, name, count):
+        # One hash shared by every user; hashing per user would dominate the run
+        password = make_password(PASSWORD)
+        return User.objects.bulk_create(
+            [User(username=f'{name}-{i}', password=password) for i in range(count)], batch_size=self.batch_size,
+        )
+
+    def create_customers(self, users):
+        # bulk_create skips the post_save signal that normally creates these
+        return Customer.objects.bulk_create([
+            Customer(user=user, name=f'{self.random.choice(FIRST_NAMES)} {self.random.choice(LAST_NAMES)}',
+                     email=f'{user.username}@example.com')
+            for user in users
+        ], batch_size=self.batch_size)
+
+    def address(self):
+        postal_code, coordinates = self.random.choice(self.postal_codes)
+        line = f'{self.random.randint(1, 9999)} {self.random.choice(STREETS)}'
+        return line, postal_code, coordinates
+
+    def create_restaurants(self, owners):
+        restaurants = []
+        for owner in owners:
+            line, postal_code, (latitude, longitude) = self.address()
+            opens = self.random.choice([6, 7, 8, 10, 11, 16])
+            restaurants.append(Restaurant(
+                user=owner,
+                name=f'{self.random.choice(CUISINES)} {self.random.choice(SUFFIXES)}',
+                description=f'Neighbourhood favourite since {self.random.randint(1975, 2023)}',
+                address=f'{line}, CA {postal_code}',
+                phone_number=self.random.randint(2_000_000_000, 9_999_999_999),
+                opening_time=f'{opens:02d}:00',
+                closing_time=f'{(opens + self.random.choice([8, 10, 12, 14])) % 24:02d}:00',
+                # Set here because bulk_create skips the geocoding pre_save signal
+                latitude=latitude, longitude=longitude, grid_cell=grid_cell(latitude, longitude),
+            ))
+        restaurants = Restaurant.objects.bulk_create(restaurants, batch_size=self.batch_size)
+        OpeningInterval.objects.bulk_create([
+            OpeningInterval(restaurant=restaurant, start_minute=start, end_minute=end)
+            for restaurant in restaurants
+            for start, end in opening_intervals(restaurant.opening_time, restaurant.closing_time)
+        ], batch_size=self.batch_size)
+        return restaurants
+
+    def create_dishes(self, restaurants, per_restaurant):
+        dishes = []
+        for restaurant in restaurants:
+            for _ in range(per_restaurant):
+                category = self.random.choice(list(DISHES))
+                vegan = self.random.random() < 0.15
+                dishes.append(Dish(
+                    restaurant=restaurant,
+                    name=f'{self.random.choice(ADJECTIVES)} {self.random.choice(DISHES[category])}',
+                    description='Made to order',
+                    price=Decimal(self.random.randint(299, 2999)) / 100,
+                    category=category,
+                    is_vegan=vegan,
+                    is_vegetarian=vegan or self.random.random() < 0.25,
+                    is_gluten_free=self.random.random() < 0.2,
+                ))
+        menus = {}
+        for dish in Dish.objects.bulk_create(dishes, batch_size=self.batch_size):
+            menus.setdefault(dish.restaurant_id, []).append((dish.id, dish.price))
+        return menus
+
+    def create_addresses(self, customers):
+        addresses = []
+        for customer in customers:
+            for number in range(self.random.choice([1, 1, 2])):
+                line, postal_code, (latitude, longitude) = self.address()
+                addresses.append(DeliveryAddress(
+                    customer=customer, address_line1=line, city='San Francisco', state='CA',
+                    postal_code=postal_code, country='US', is_default=number == 0,
+                    latitude=latitude, longitude=longitude,
+                ))
+        return DeliveryAddress.objects.bulk_create(addresses, batch_size=self.batch_size)
+
+    def create_orders(self, customers, addresses, menus, per_customer, days):
+        default_address = {address.customer_id: address.id for address in addresses if address.is_default}
+        restaurant_ids = list(menus)
+        now = timezone.now()
+        batch, created = [], 0
+        for customer in customers:
+            for _ in range(self.random.randint(0, 2 * per_customer)):
+                restaurant_id = self.random.choice(restaurant_ids)
+                lines = [(dish_id, price, self.random.choice([1, 1, 1, 2, 3]))
+                         for dish_id, price in self.random.sample(menus[restaurant_id], min(len(menus[restaurant_id]), self.random.randint(1, 4)))]
+                age = timedelta(seconds=self.random.randint(0, days * 86400))
+                status = self.random.choice(OPEN_STATUSES) if age < timedelta(hours=1) else \
+                    self.random.choices([s for s, _ in FINAL_STATUSES], [w for _, w in FINAL_STATUSES])[0]
+                batch.append((customer, restaurant_id, default_address[customer.id], now - age, status, lines))
+                if len(batch) >= self.batch_size:
+                    created += self.write_orders(batch)
+                    batch = []
+                    self.stdout.write(f'  {created} orders', ending='\r')
+        if batch:
+            created += self.write_orders(batch)
+        self.stdout.write('')
+        return created
+
+    @transaction.atomic
+    def write_orders(self, batch):
+        orders = Order.objects.bulk_create([
+            Order(customer=customer, restaurant_id=restaurant_id, delivery_address_id=address_id, status=status,
+                  total_price=sum(price * quantity for _, price, quantity in lines))
+            for customer, restaurant_id, address_id, _, status, lines in batch
+        ])
+        # created_at is auto_now_add, which bulk_create fills with now; backdate in one executemany
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'UPDATE {Order._meta.db_table} SET created_at = %s, updated_at = %s WHERE id = %s',
+                [(connection.ops.adapt_datetimefield_value(created_at),) * 2 + (order.id,)
+                 for order, (_, _, _, created_at, _, _) in zip(orders, batch)],
+            )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, dish_id=dish_id, quantity=quantity)
+            for order, (_, _, _, _, _, lines) in zip(orders, batch)
+            for dish_id, _, quantity in lines
+        ])
+        # The read model the signals would have written
+        OrderSummary.objects.bulk_create([
+            OrderSummary(order=order, restaurant_id=order.restaurant_id, status=order.status,
+                         total_price=order.total_price, created_at=created_at, customer_name=customer.name,
+                         item_count=sum(quantity for _, _, quantity in lines))
+            for order, (customer, _, _, created_at, _, lines) in zip(orders, batch)
+        ])
+        return len(orders)
+
+    def create_carts(self, customers, menus, fraction):
+        restaurant_ids = list(menus)
+        lines = []
+        for customer in customers:
+            if self.random.random() < fraction:
+                restaurant_id = self.random.choice(restaurant_ids)
+                for dish_id, _ in self.random.sample(menus[restaurant_id], min(len(menus[restaurant_id]), self.random.randint(1, 3))):
+                    lines.append(CartItem(customer=customer, dish_id=dish_id, restaurant_id=restaurant_id,
+                                          quantity=self.random.randint(1, 2)))
+        return len(CartItem.objects.bulk_create(lines, batch_size=self.batch_size))
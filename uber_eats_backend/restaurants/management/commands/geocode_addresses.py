@@ -0,0 +1,46 @@
+# restaurants/management/commands/geocode_addresses.py
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from customers.models import DeliveryAddress
+from restaurants.geo import get_geocoder, grid_cell
+from restaurants.models import Restaurant
+
+
+class Command(BaseCommand):
+    help = 'Fills latitude/longitude (and the restaurant grid cell) from the offline geocoder'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--all', action='store_true', help='Re-geocode rows that already have coordinates')
+
+    def handle(self, *args, **options):
+        geocoder = get_geocoder()
+        now = timezone.now()
+        batch_size = options['batch_size']
+
+        restaurants = Restaurant.objects.only('id', 'address', 'latitude', 'longitude', 'grid_cell', 'updated_at')
+        addresses = DeliveryAddress.objects.only('id', 'address_line1', 'postal_code', 'country', 'latitude', 'longitude')
+        if not options['all']:
+            restaurants = restaurants.filter(latitude__isnull=True)
+            addresses = addresses.filter(latitude__isnull=True)
+
+        # bulk_update skips the save signals, so set the grid cell here as well
+        updated = []
+        for restaurant in restaurants.iterator(chunk_size=batch_size):
+            coordinates = geocoder.geocode(restaurant.address or '')
+            if coordinates:
+                restaurant.latitude, restaurant.longitude = coordinates
+                restaurant.grid_cell = grid_cell(*coordinates)
+                restaurant.updated_at = now
+                updated.append(restaurant)
+        Restaurant.objects.bulk_update(updated, ['latitude', 'longitude', 'grid_cell', 'updated_at'], batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Located {len(updated)} restaurants'))
+
+        updated = []
+        for address in addresses.iterator(chunk_size=batch_size):
+            coordinates = geocoder.geocode(address.address_line1, address.postal_code, address.country)
+            if coordinates:
+                address.latitude, address.longitude = coordinates
+                updated.append(address)
+        DeliveryAddress.objects.bulk_update(updated, ['latitude', 'longitude'], batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Located {len(updated)} delivery addresses'))
@@ -0,0 +1,75 @@
+# restaurants/management/commands/import_catalogue.py
+import itertools
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurants.catalogue import CatalogueImporter, file_format, open_text, read_records
+
+
+class Command(BaseCommand):
+    help = ('Creates or updates restaurants and dishes from a CSV or JSON Lines file (optionally .gz), '
+            'one chunk per transaction, resumable from a checkpoint')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Input file: .csv, .jsonl, .csv.gz or .jsonl.gz, restaurants before their dishes')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Records validated and written per transaction')
+        parser.add_argument('--checkpoint', help='Progress file (default: <path>.checkpoint)')
+        parser.add_argument('--resume', action='store_true', help='Skip the records the checkpoint says are committed')
+        parser.add_argument('--max-errors', type=int, default=100, help='Stop once more records than this were rejected')
+        parser.add_argument('--no-match-ids', action='store_true',
+                            help="Create records that have no ref even if their id exists (importing another database's export)")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        try:
+            fmt = file_format(path)
+        except ValueError as e:
+            raise CommandError(e)
+        checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        progress = {'path': os.path.abspath(path), 'records': 0, 'created': 0, 'updated': 0, 'rejected': 0}
+        if options['resume'] and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as file:
+                saved = json.load(file)
+            if saved.get('path') != progress['path']:
+                raise CommandError(f'{checkpoint_path} belongs to {saved.get("path")}, not {progress["path"]}')
+            progress = saved
+            self.stdout.write(f'Resuming after record {progress["records"]}')
+
+        importer = CatalogueImporter(match_ids=not options['no_match_ids'])
+        started = time.monotonic()
+        with open_text(path, 'r') as file:
+            records = itertools.islice(read_records(file, fmt), progress['records'], None)
+            while chunk := list(itertools.islice(records, options['chunk_size'])):
+                created, updated, errors = importer.import_chunk(chunk)
+                for error in errors:
+                    self.stderr.write(f'Record {error.number}: {error.message}')
+                progress['records'] = chunk[-1][0]
+                progress['created'] += created
+                progress['updated'] += updated
+                progress['rejected'] += len(errors)
+                # Only after the commit, so a restart never skips records that weren't written
+                self.save_checkpoint(checkpoint_path, progress)
+                rate = (progress['created'] + progress['updated']) / max(time.monotonic() - started, 1e-9)
+                self.stdout.write(f'  {progress["records"]} records, {rate:,.0f}/s', ending='\r')
+                if progress['rejected'] > options['max_errors']:
+                    self.stdout.write('')
+                    raise CommandError(f'{progress["rejected"]} records rejected (listed above); '
+                                       'progress is checkpointed, rerun with --resume to continue')
+        self.stdout.write('')
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {progress["records"]} records: {progress["created"]} created, {progress["updated"]} updated, '
+            f'{progress["rejected"]} rejected'
+        ))
+
+    def save_checkpoint(self, checkpoint_path, progress):
+        # Write then rename, so a crash never leaves a half-written checkpoint
+        with open(f'{checkpoint_path}.tmp', 'w') as file:
+            json.dump(progress, file)
+        os.replace(f'{checkpoint_path}.tmp', checkpoint_path)
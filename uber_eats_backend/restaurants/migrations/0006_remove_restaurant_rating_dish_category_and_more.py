@@ -0,0 +1,32 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0005_delete_restaurantowner'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='restaurant',
+            name='rating',
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='category',
+            field=models.CharField(choices=[('Appetizer', 'Appetizer'), ('Salad', 'Salad'), ('Main Course', 'Main Course'), ('Dessert', 'Dessert'), ('Beverage', 'Beverage')], default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='ingredients',
+            field=models.CharField(max_length=150, null=True),
+        ),
+        migrations.AlterField(
+            model_name='restaurant',
+            name='phone_number',
+            field=models.DecimalField(decimal_places=0, default=0, max_digits=12),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0006_remove_restaurant_rating_dish_category_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dish',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
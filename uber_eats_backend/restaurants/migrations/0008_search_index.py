@@ -0,0 +1,50 @@
+# Full-text search index over restaurants and dishes.
+#
+# On SQLite this creates FTS5 external-content tables that mirror the searchable
+# columns, kept in sync by triggers so bulk_create/update and raw SQL writes are
+# indexed too. Other databases fall back to ORM filtering in restaurants.search.
+
+from django.db import migrations
+
+from restaurants.search import TRIGGER_SUFFIXES, search_trigger_sql
+
+SEARCH_TABLES = [
+    ('restaurants_restaurant', ['name', 'description', 'address']),
+    ('restaurants_dish', ['name', 'description', 'ingredients', 'category']),
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, columns in SEARCH_TABLES:
+        fts = f'{table}_fts'
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {fts} USING fts5({', '.join(columns)}, content='{table}', content_rowid='id', "
+            f"tokenize='porter unicode61', prefix='3')"
+        )
+        for sql in search_trigger_sql(table, columns):
+            schema_editor.execute(sql)
+        # Index the rows that already exist
+        schema_editor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, _ in SEARCH_TABLES:
+        fts = f'{table}_fts'
+        for suffix in TRIGGER_SUFFIXES:
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {fts}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0007_dish_updated_at_restaurant_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
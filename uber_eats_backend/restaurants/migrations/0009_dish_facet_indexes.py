@@ -0,0 +1,21 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0008_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dish',
+            index=models.Index(fields=['restaurant', 'category', 'is_vegetarian', 'is_vegan', 'is_gluten_free', 'price'], name='dish_restaurant_facets_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dish',
+            index=models.Index(fields=['category', 'is_vegetarian', 'is_vegan', 'is_gluten_free', 'price'], name='dish_facets_idx'),
+        ),
+    ]
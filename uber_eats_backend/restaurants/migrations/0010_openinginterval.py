@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from restaurants.hours import opening_intervals
+
+
+def backfill_opening_intervals(apps, schema_editor):
+    Restaurant = apps.get_model('restaurants', 'Restaurant')
+    OpeningInterval = apps.get_model('restaurants', 'OpeningInterval')
+    OpeningInterval.objects.bulk_create([
+        OpeningInterval(restaurant_id=restaurant_id, start_minute=start, end_minute=end)
+        for restaurant_id, opening_time, closing_time in Restaurant.objects.values_list('id', 'opening_time', 'closing_time')
+        for start, end in opening_intervals(opening_time, closing_time)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0009_dish_facet_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OpeningInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_minute', models.PositiveIntegerField()),
+                ('end_minute', models.PositiveIntegerField()),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='opening_intervals', to='restaurants.restaurant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['start_minute', 'end_minute', 'restaurant'], name='opening_interval_range_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_opening_intervals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0010_openinginterval'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='grid_cell',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0011_geolocation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dish',
+            name='image_variants',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='image_variants',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
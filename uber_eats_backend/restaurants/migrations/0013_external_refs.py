@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0012_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dish',
+            name='external_ref',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='external_ref',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='dish',
+            constraint=models.UniqueConstraint(condition=models.Q(('external_ref__isnull', False)), fields=('restaurant', 'external_ref'), name='unique_dish_external_ref'),
+        ),
+        migrations.AddConstraint(
+            model_name='restaurant',
+            constraint=models.UniqueConstraint(condition=models.Q(('external_ref__isnull', False)), fields=('external_ref',), name='unique_restaurant_external_ref'),
+        ),
+    ]
@@ -1,5 +1,12 @@
-from django.db import models  
+from django.db import models, transaction
 from django.contrib.auth.models import User  
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .cache import menu_cache
+from .hours import opening_intervals
+from .geo import get_geocoder, grid_cell
+from customers.authentication import forget_user
+from uber_eats_backend.images import track_image
 
 class Restaurant(models.Model):
     # One-to-one relationship with User model, allows each restaurant to be linked to a user
@@ -10,8 +17,23 @@ class Restaurant(models.Model):
     address = models.CharField(max_length=255, null=True, blank=True)  # Address of the restaurant (optional)
     phone_number = models.DecimalField(max_digits=12, decimal_places=0, default=0)  # Phone number of the restaurant
     image = models.ImageField(upload_to='restaurant_images/', null=True, blank=True)  # Image field for restaurant's picture
+    # Resized copies of the image, see uber_eats_backend.images. Nullable so SQLite adds the column in place
+    # rather than rebuilding the table, which would drop the search index triggers
+    image_variants = models.JSONField(null=True, blank=True)
     opening_time = models.TimeField(null=True, blank=True)  # Opening time of the restaurant (optional)
     closing_time = models.TimeField(null=True, blank=True)  # Closing time of the restaurant (optional)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Version stamp for conditional GETs
+    latitude = models.FloatField(null=True, blank=True)  # Geocoded from the address
+    longitude = models.FloatField(null=True, blank=True)
+    grid_cell = models.IntegerField(null=True, blank=True, db_index=True)  # Spatial grid key, see restaurants.geo
+    external_ref = models.CharField(max_length=64, null=True, blank=True)  # The chain's own store id, for catalogue imports
+
+    class Meta:
+        constraints = [
+            # Partial, so restaurants created in the app (no reference) don't collide
+            models.UniqueConstraint(fields=['external_ref'], condition=models.Q(external_ref__isnull=False),
+                                    name='unique_restaurant_external_ref'),
+        ]
 
     def __str__(self):
         return self.name  # Return the restaurant name as its string representation
@@ -26,6 +48,7 @@ class Dish(models.Model):
     description = models.TextField()  # Description of the dish
     price = models.DecimalField(max_digits=6, decimal_places=2)  # Price of the dish
     image = models.ImageField(upload_to='dish_images/', null=True, blank=True)  # Image field for dish's picture
+    image_variants = models.JSONField(null=True, blank=True)  # Resized copies of the image, nullable as on Restaurant
     
     # Define categories for dishes
     categories = [
@@ -39,6 +62,89 @@ class Dish(models.Model):
     is_vegetarian = models.BooleanField(default=False)  # Flag to indicate if the dish is vegetarian
     is_vegan = models.BooleanField(default=False)  # Flag to indicate if the dish is vegan
     is_gluten_free = models.BooleanField(default=False)  # Flag to indicate if the dish is gluten-free
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Version stamp for conditional GETs
+    external_ref = models.CharField(max_length=64, null=True, blank=True)  # The chain's own item id, unique per restaurant
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['restaurant', 'external_ref'], condition=models.Q(external_ref__isnull=False),
+                                    name='unique_dish_external_ref'),
+        ]
+        indexes = [
+            # Cover the dish filters and facet counts, per restaurant and catalogue-wide,
+            # so they are answered from the index without touching the table
+            models.Index(fields=['restaurant', 'category', 'is_vegetarian', 'is_vegan', 'is_gluten_free', 'price'],
+                         name='dish_restaurant_facets_idx'),
+            models.Index(fields=['category', 'is_vegetarian', 'is_vegan', 'is_gluten_free', 'price'],
+                         name='dish_facets_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.restaurant.name}"  # Return a string representation of the dish with its restaurant name
+
+
+class OpeningInterval(models.Model):
+    # Precomputed minute-of-week [start_minute, end_minute) spans when a restaurant is open,
+    # derived from opening_time/closing_time so "open at" is one range scan
+    restaurant = models.ForeignKey(Restaurant, related_name='opening_intervals', on_delete=models.CASCADE)
+    start_minute = models.PositiveIntegerField()  # Minutes since Monday 00:00
+    end_minute = models.PositiveIntegerField()  # Exclusive
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['start_minute', 'end_minute', 'restaurant'], name='opening_interval_range_idx'),
+        ]
+
+
+# Geocode the address and file the restaurant under its grid cell before saving
+@receiver(pre_save, sender=Restaurant)
+def locate_restaurant(sender, instance, **kwargs):
+    coordinates = get_geocoder().geocode(instance.address or '')
+    if coordinates:
+        instance.latitude, instance.longitude = coordinates
+    instance.grid_cell = grid_cell(instance.latitude, instance.longitude)
+
+
+# Recompute the opening intervals whenever a restaurant's hours may have changed; saves naming
+# other update_fields (image variants, geocoding) leave them alone
+@receiver(post_save, sender=Restaurant)
+def sync_opening_intervals(sender, instance, created, update_fields=None, **kwargs):
+    if not created:
+        if update_fields is not None and not {'opening_time', 'closing_time'} & set(update_fields):
+            return
+        OpeningInterval.objects.filter(restaurant=instance).delete()
+    OpeningInterval.objects.bulk_create([
+        OpeningInterval(restaurant=instance, start_minute=start, end_minute=end)
+        for start, end in opening_intervals(instance.opening_time, instance.closing_time)
+    ])
+
+
+# Render thumbnails and responsive sizes of new uploads in the background
+track_image(Restaurant, 'image', 'image_variants')
+track_image(Dish, 'image', 'image_variants')
+
+
+# Drop a restaurant's cached menu whenever one of its dishes is saved or deleted
+@receiver([post_save, post_delete], sender=Dish)
+def invalidate_menu_for_dish(sender, instance, **kwargs):
+    invalidate_menu(instance.restaurant_id)
+
+
+# Drop the cached menu when the restaurant itself changes or goes away
+@receiver([post_save, post_delete], sender=Restaurant)
+def invalidate_menu_for_restaurant(sender, instance, **kwargs):
+    invalidate_menu(instance.id)
+
+
+# The owner's cached token identity carries this restaurant, so drop it too
+@receiver([post_save, post_delete], sender=Restaurant)
+def forget_cached_owner(sender, instance, **kwargs):
+    if instance.user_id:
+        forget_user(instance.user_id)
+
+
+def invalidate_menu(restaurant_id):
+    menu_cache.delete(restaurant_id)
+    # Drop it again once the change is committed, in case a concurrent request
+    # re-cached the old menu while our transaction was still open
+    transaction.on_commit(lambda: menu_cache.delete(restaurant_id))
@@ -0,0 +1,126 @@
+import re
+from collections import namedtuple
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Restaurant, Dish
+
+# A ranked hit: `kind` is 'restaurant' or 'dish', lower `score` is a better match
+SearchHit = namedtuple('SearchHit', ['kind', 'object_id', 'score'])
+
+# FTS5 tables created by migration 0008, and the model columns each one indexes
+SEARCH_INDEXES = {
+    'restaurant': ('restaurants_restaurant_fts', Restaurant, ['name', 'description', 'address']),
+    'dish': ('restaurants_dish_fts', Dish, ['name', 'description', 'ingredients', 'category']),
+}
+
+
+# The triggers that keep each FTS5 table in step with its content table: after insert, delete and update
+TRIGGER_SUFFIXES = ('ai', 'ad', 'au')
+
+
+# Shortest trailing word that is matched as a prefix (the index stores 3-character prefixes)
+MIN_PREFIX_LENGTH = 3
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def search_trigger_sql(table, columns, if_not_exists=False):
+    # CREATE TRIGGER statements mirroring writes to `table` into `{table}_fts`; migration 0008 runs these too
+    fts = f'{table}_fts'
+    cols = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    create = 'CREATE TRIGGER IF NOT EXISTS' if if_not_exists else 'CREATE TRIGGER'
+    return [
+        f"{create} {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"{create} {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        f"{create} {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+    ]
+
+
+def missing_search_triggers():
+    # Names of the triggers gone from existing FTS5 tables; SQLite drops them whenever
+    # a migration rebuilds restaurants_restaurant or restaurants_dish
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT type, name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        present = {(kind, name) for kind, name in cursor.fetchall()}
+    return [
+        f'{table}_{suffix}'
+        for table, _, _ in SEARCH_INDEXES.values() if ('table', table) in present
+        for suffix in TRIGGER_SUFFIXES if ('trigger', f'{table}_{suffix}') not in present
+    ]
+
+
+def build_match_expression(query):
+    # Quote every word so user input can't inject FTS5 syntax; the last word
+    # is a prefix match so results show up while the user is still typing.
+    # Short prefixes expand to too many terms to rank quickly, so they must match whole.
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    if len(words[-1]) >= MIN_PREFIX_LENGTH:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_catalogue(query, kinds=('restaurant', 'dish'), limit=20, offset=0):
+    # Returns up to `limit` SearchHits ranked by bm25 across the requested kinds
+    if fts_available():
+        return _search_fts(query, kinds, limit, offset)
+    return _search_orm(query, kinds, limit, offset)
+
+
+def _search_fts(query, kinds, limit, offset):
+    match = build_match_expression(query)
+    if match is None:
+        return []
+    selects, params = [], []
+    for kind in kinds:
+        table = SEARCH_INDEXES[kind][0]
+        selects.append(f"SELECT '{kind}', rowid, bm25({table}) FROM {table} WHERE {table} MATCH %s")
+        params.append(match)
+    sql = ' UNION ALL '.join(selects) + ' ORDER BY 3 LIMIT %s OFFSET %s'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit, offset])
+        return [SearchHit(*row) for row in cursor.fetchall()]
+
+
+def _search_orm(query, kinds, limit, offset):
+    # Unranked fallback for databases without FTS5: every word must appear in some column
+    words = re.findall(r'\w+', query)
+    if not words:
+        return []
+    hits = []
+    for kind in kinds:
+        _, model, columns = SEARCH_INDEXES[kind]
+        condition = Q()
+        for word in words:
+            word_condition = Q()
+            for column in columns:
+                word_condition |= Q(**{f'{column}__icontains': word})
+            condition &= word_condition
+        ids = model.objects.filter(condition).order_by('id').values_list('id', flat=True)[:offset + limit]
+        hits.extend(SearchHit(kind, object_id, 0.0) for object_id in ids)
+    return hits[offset:offset + limit]
+
+
+def rebuild_search_index():
+    # Restores any dropped triggers, then re-reads every row of the content tables into the index in one pass each
+    if not fts_available():
+        return False
+    with connection.cursor() as cursor:
+        for table, model, columns in SEARCH_INDEXES.values():
+            for sql in search_trigger_sql(model._meta.db_table, columns, if_not_exists=True):
+                cursor.execute(sql)
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+    return True
@@ -1,6 +1,7 @@
 from rest_framework import serializers  
 from django.contrib.auth.models import User 
 from .models import Restaurant, Dish  
+from uber_eats_backend.images import ImageVariantsField
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -8,14 +9,27 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email']  # Define fields to include in the serialized output
 
 
-class RestaurantSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    # Takes an optional `fields` argument naming the only fields to output.
+    # Dropped fields are removed before serialization, so their getters never run.
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+
+class RestaurantSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # Define custom serializer fields for formatted opening and closing times
     opening_time = serializers.SerializerMethodField()
     closing_time = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()  # Thumbnail and responsive image URLs, filled in after upload
 
     class Meta:
         model = Restaurant  # Specify the Restaurant model to serialize
         fields = '__all__'  # Include all fields in the serialized output
+        read_only_fields = ['external_ref']  # Set by catalogue imports only
    
     def get_opening_time(self, obj):
         # Custom method to format the opening_time field
@@ -31,9 +45,12 @@ class RestaurantSerializer(serializers.ModelSerializer):
 
 
 class DishSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()  # Thumbnail and responsive image URLs, filled in after upload
+
     class Meta:
         model = Dish  # Specify the Dish model to serialize
         fields = '__all__'  # Include all fields in the serialized output
         extra_kwargs = {
             'image': {'required': False},  # Make the image field optional during serialization
+            'external_ref': {'read_only': True},  # Set by catalogue imports only
         }
@@ -1,3 +1,1138 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Count
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIHandler
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import resolve
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .catalogue import CatalogueImporter
+from .checks import check_search_triggers
+from .cache import FileMenuCache, LocMemMenuCache, MenuEntry, menu_cache
+from customers.authentication import token_cache
+from customers.models import CartItem, DeliveryAddress, DishDailySales, Order, OrderItem, OrderSummary, RestaurantDailySales
+from .geo import grid_cell, grid_square, haversine_km, nearest
+from .search import missing_search_triggers
+from .hours import MINUTES_PER_DAY, MINUTES_PER_WEEK, open_at_lookup, opening_intervals
+from .models import Restaurant, Dish, OpeningInterval
+from .serializers import RestaurantSerializer
+from uber_eats_backend import benchmarks, images, media, metrics
+from uber_eats_backend.async_views import ASYNC_URLCONF, AsyncReadViewsHandler
+from uber_eats_backend.query_plans import check_query_plans, full_scans
+
+
+class MenuCacheViewTests(TestCase):
+    def setUp(self):
+        menu_cache.clear()
+        self.restaurant = Restaurant.objects.create(name='Pizza Palace', description='Best pizza in town')
+        self.dish = Dish.objects.create(restaurant=self.restaurant, name='Margherita Pizza',
+                                        description='Classic', price=Decimal('10.99'))
+        self.client = APIClient()
+        self.url = f'/api/restaurants/{self.restaurant.id}/dishes/'
+
+    def test_second_request_served_without_queries(self):
+        first = self.client.get(self.url)
+        with CaptureQueriesContext(connection) as context:
+            second = self.client.get(self.url)
+        self.assertEqual(len(context.captured_queries), 0)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(second.json()[0]['name'], 'Margherita Pizza')
+
+    def test_dish_save_and_delete_invalidate(self):
+        etag = self.client.get(self.url)['ETag']
+
+        self.dish.name = 'Pepperoni Pizza'
+        self.dish.save()
+        response = self.client.get(self.url)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()[0]['name'], 'Pepperoni Pizza')
+
+        self.dish.delete()
+        self.assertEqual(self.client.get(self.url).json(), [])
+
+    def test_restaurant_delete_invalidates(self):
+        self.client.get(self.url)
+        self.restaurant.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_conditional_get(self):
+        first = self.client.get(self.url)
+        response = self.client.get(self.url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        response = self.client.get(self.url, headers={'If-Modified-Since': first['Last-Modified']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_hit_and_miss_counters(self):
+        admin = User.objects.create_superuser(username='admin', password='secret')
+        self.client.force_authenticate(user=admin)
+        before = self.client.get('/api/restaurants/menu_cache_stats/').json()
+        self.client.get(self.url)
+        self.client.get(self.url)
+        after = self.client.get('/api/restaurants/menu_cache_stats/').json()
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+
+
+class MenuCacheBackendTests(TestCase):
+    def entry(self, size):
+        return MenuEntry(b'x' * size, '"etag"', 0.0)
+
+    def test_locmem_evicts_least_recently_used_by_size(self):
+        cache = LocMemMenuCache(max_bytes=250)
+        cache.set(1, self.entry(100))
+        cache.set(2, self.entry(100))
+        cache.get(1)  # 2 is now the least recently used
+        cache.set(3, self.entry(100))
+        self.assertIsNotNone(cache.get(1))
+        self.assertIsNone(cache.get(2))
+        self.assertIsNotNone(cache.get(3))
+        self.assertEqual(cache.size, 200)
+
+    def test_file_cache_is_shared_between_instances(self):
+        with tempfile.TemporaryDirectory() as location:
+            writer, reader = FileMenuCache(location), FileMenuCache(location)
+            writer.get_or_build(7, lambda: b'[]')
+            self.assertEqual(reader.get(7).body, b'[]')
+            writer.delete(7)
+            self.assertIsNone(reader.get(7))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.restaurant = Restaurant.objects.create(name='Pizza Palace', description='Best pizza in town')
+        Restaurant.objects.create(name='Burger Bonanza', description='Juicy burgers')
+        self.client = APIClient()
+
+    def revalidate(self, url, response):
+        return self.client.get(url, headers={'If-None-Match': response['ETag']})
+
+    def test_unchanged_list_is_not_modified_after_one_query(self):
+        first = self.client.get('/api/restaurants/')
+        with CaptureQueriesContext(connection) as context:
+            response = self.revalidate('/api/restaurants/', first)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], first['ETag'])
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_list_changes_on_update_insert_and_delete(self):
+        first = self.client.get('/api/restaurants/')
+
+        self.restaurant.description = 'Even better pizza'
+        self.restaurant.save()
+        updated = self.revalidate('/api/restaurants/', first)
+        self.assertEqual(updated.status_code, 200)
+
+        Restaurant.objects.create(name='Taco Town', description='Tacos')
+        inserted = self.revalidate('/api/restaurants/', updated)
+        self.assertEqual(inserted.status_code, 200)
+
+        self.restaurant.delete()
+        deleted = self.revalidate('/api/restaurants/', inserted)
+        self.assertEqual(deleted.status_code, 200)
+        self.assertEqual(len(deleted.json()), 2)
+
+    def test_detail_honours_if_modified_since(self):
+        url = f'/api/restaurants/{self.restaurant.id}/'
+        first = self.client.get(url)
+        response = self.client.get(url, headers={'If-Modified-Since': first['Last-Modified']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+    def test_missing_detail_still_404(self):
+        self.assertEqual(self.client.get('/api/restaurants/999/').status_code, 404)
+
+
+class RestaurantListTests(TestCase):
+    def setUp(self):
+        Restaurant.objects.bulk_create([
+            Restaurant(name=f'Restaurant {index}', description='A very long description ' * 50,
+                       opening_time=time(9), closing_time=time(21))
+            for index in range(25)
+        ])
+        self.client = APIClient()
+
+    def test_unpaginated_by_default(self):
+        self.assertEqual(len(self.client.get('/api/restaurants/').json()), 25)
+
+    def test_keyset_pages_cover_every_restaurant(self):
+        url, ids = '/api/restaurants/?page_size=10', []
+        while url:
+            page = self.client.get(url).json()
+            ids.extend(restaurant['id'] for restaurant in page['results'])
+            url = page['next']
+        self.assertEqual(ids, list(Restaurant.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_sparse_fieldset(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/restaurants/?fields=name,image,opening_time&page_size=5')
+        restaurant = response.json()['results'][0]
+        self.assertEqual(set(restaurant), {'id', 'name', 'image', 'opening_time'})
+        self.assertEqual(restaurant['opening_time'], '09:00 AM')
+        # The description column isn't fetched at all
+        self.assertNotIn('description', context.captured_queries[-1]['sql'])
+
+    def test_sparse_fieldset_skips_dropped_getters(self):
+        with mock.patch.object(RestaurantSerializer, 'get_closing_time') as get_closing_time:
+            self.client.get('/api/restaurants/?fields=name')
+        get_closing_time.assert_not_called()
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.pizza = Restaurant.objects.create(name='Pizza Palace', description='Wood-fired pizza', address='123 Main St')
+        self.burgers = Restaurant.objects.create(name='Burger Bonanza', description='Juicy burgers', address='456 Oak Ave')
+        self.margherita = Dish.objects.create(restaurant=self.pizza, name='Margherita Pizza', description='Tomato and basil',
+                                              ingredients='mozzarella', category='Main Course', price=Decimal('10.99'))
+        Dish.objects.create(restaurant=self.burgers, name='Veggie Burger', description='Plant-based patty',
+                            price=Decimal('9.99'))
+        self.client = APIClient()
+
+    def search(self, **params):
+        return self.client.get('/api/search/', params)
+
+    def test_ranked_hits_across_restaurants_and_dishes(self):
+        results = self.search(q='pizza').json()['results']
+        self.assertEqual({(hit['type'], hit[hit['type']]['id']) for hit in results},
+                         {('restaurant', self.pizza.id), ('dish', self.margherita.id)})
+        self.assertEqual([hit['score'] for hit in results], sorted(hit['score'] for hit in results))
+
+    def test_prefix_and_type_filter(self):
+        results = self.search(q='mozz', type='dish').json()['results']
+        self.assertEqual([hit['dish']['id'] for hit in results], [self.margherita.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.margherita.name = 'Quattro Formaggi'
+        self.margherita.save()
+        self.assertEqual(self.search(q='formaggi').json()['results'][0]['dish']['id'], self.margherita.id)
+        self.margherita.delete()
+        self.assertEqual(self.search(q='formaggi').json()['results'], [])
+
+    def test_pagination_and_hostile_query(self):
+        page = self.search(q='pizza', limit=1).json()
+        self.assertEqual(len(page['results']), 1)
+        self.assertEqual(len(self.client.get(page['next']).json()['results']), 1)
+        self.assertEqual(self.search(q='"pizza AND (').status_code, 200)
+        self.assertEqual(self.search(q='').status_code, 400)
+
+    def test_rebuild_command(self):
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(len(self.search(q='burger').json()['results']), 2)
+
+    def test_triggers_exist_after_migrate(self):
+        # The test database is built by migrate, like any other
+        self.assertEqual(missing_search_triggers(), [])
+        self.assertEqual(check_search_triggers(None, databases=['default']), [])
+
+    def test_rebuild_restores_dropped_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER restaurants_dish_fts_ai')  # As a table rebuild would
+        self.assertEqual([error.id for error in check_search_triggers(None, databases=['default'])], ['restaurants.E001'])
+        self.assertEqual(check_search_triggers(None), [])  # Only checked against a database
+
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(missing_search_triggers(), [])
+        Dish.objects.create(restaurant=self.pizza, name='Calzone', description='Folded', price=Decimal('12.00'))
+        self.assertEqual(len(self.search(q='calzone').json()['results']), 1)
+
+
+class DishFilterTests(TestCase):
+    def setUp(self):
+        self.restaurant = Restaurant.objects.create(name='Green Bowl', description='Salads')
+        other = Restaurant.objects.create(name='Grill House', description='Steaks')
+        dishes = [
+            ('Kale Salad', 'Salad', Decimal('9.50'), True, True, True),
+            ('Caesar Salad', 'Salad', Decimal('8.99'), False, False, False),
+            ('Lentil Curry', 'Main Course', Decimal('13.00'), True, True, False),
+            ('Brownie', 'Dessert', Decimal('5.99'), True, False, False),
+        ]
+        for name, category, price, vegetarian, vegan, gluten_free in dishes:
+            Dish.objects.create(restaurant=self.restaurant, name=name, description='', category=category, price=price,
+                                is_vegetarian=vegetarian, is_vegan=vegan, is_gluten_free=gluten_free)
+        Dish.objects.create(restaurant=other, name='Ribeye', description='', category='Main Course', price=Decimal('29.00'))
+        self.client = APIClient()
+
+    def names(self, results):
+        return sorted(dish['name'] for dish in results)
+
+    def test_filter_combination(self):
+        response = self.client.get('/api/dishes/', {'category': 'Salad,Main Course', 'is_vegan': 'true', 'max_price': '10'})
+        self.assertEqual(self.names(response.json()), ['Kale Salad'])
+
+    def test_facets_with_pagination(self):
+        data = self.client.get('/api/dishes/', {'is_vegetarian': 'true', 'facets': 'true', 'page_size': 2}).json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNotNone(data['next'])
+        facets = data['facets']
+        self.assertEqual(facets['total'], 3)
+        self.assertEqual(facets['category'], {'Dessert': 1, 'Main Course': 1, 'Salad': 1})
+        self.assertEqual((facets['is_vegan'], facets['is_gluten_free']), (2, 1))
+        self.assertEqual(facets['price'], {'min': '5.99', 'max': '13.00'})
+
+    def test_restaurant_menu_filters(self):
+        url = f'/api/restaurants/{self.restaurant.id}/dishes/'
+        data = self.client.get(url, {'category': 'Main Course', 'facets': '1'}).json()
+        self.assertEqual(self.names(data['results']), ['Lentil Curry'])
+        self.assertEqual(data['facets']['category'], {'Main Course': 1})
+
+    def test_invalid_filters(self):
+        self.assertEqual(self.client.get('/api/dishes/', {'category': 'Soup'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/dishes/', {'is_vegan': 'maybe'}).status_code, 400)
+        url = f'/api/restaurants/{self.restaurant.id}/dishes/'
+        self.assertEqual(self.client.get(url, {'min_price': 'cheap'}).status_code, 400)
+
+    def test_facet_query_uses_covering_index(self):
+        queryset = Dish.objects.filter(restaurant=self.restaurant, category='Salad').values('category').annotate(
+            count=Count('id')).order_by()
+        plan = queryset.explain()
+        self.assertIn('COVERING INDEX dish_restaurant_facets_idx', plan)
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_dish_filters', seed=True, restaurants=3, dishes=30, requests=3, stdout=out)
+        self.assertIn('per-restaurant facets', out.getvalue())
+
+
+class OpenNowTests(TestCase):
+    def setUp(self):
+        self.lunch = Restaurant.objects.create(name='Lunch Spot', description='', opening_time=time(11), closing_time=time(15))
+        self.late = Restaurant.objects.create(name='Night Owl', description='', opening_time=time(18), closing_time=time(2))
+        self.always = Restaurant.objects.create(name='Diner', description='', opening_time=time(0), closing_time=time(0))
+        Restaurant.objects.create(name='No Hours', description='')
+        self.client = APIClient()
+
+    def open_at(self, value):
+        response = self.client.get('/api/restaurants/', {'open_at': value})
+        self.assertEqual(response.status_code, 200)
+        return sorted(restaurant['name'] for restaurant in response.json())
+
+    def test_intervals_wrap_past_midnight_and_week_end(self):
+        intervals = opening_intervals(time(18), time(2))
+        self.assertEqual(len(intervals), 8)
+        self.assertIn((0, 120), intervals)  # Sunday night spills into Monday morning
+        self.assertIn((6 * MINUTES_PER_DAY + 18 * 60, MINUTES_PER_WEEK), intervals)
+        self.assertEqual(opening_intervals(time(9), None), [])
+
+    def test_open_at(self):
+        self.assertEqual(self.open_at('2026-10-14T12:30:00+00:00'), ['Diner', 'Lunch Spot'])
+        self.assertEqual(self.open_at('2026-10-14T15:00:00+00:00'), ['Diner'])
+        self.assertEqual(self.open_at('2026-10-14T01:30:00+00:00'), ['Diner', 'Night Owl'])
+        # Monday 01:00 is covered by Sunday night's opening
+        self.assertEqual(self.open_at('2026-10-19T01:00:00+00:00'), ['Diner', 'Night Owl'])
+
+    def test_only_hour_changes_rewrite_intervals(self):
+        for update_fields in (['image_variants'], ['latitude', 'longitude', 'grid_cell']):
+            with CaptureQueriesContext(connection) as queries:
+                self.lunch.save(update_fields=update_fields)
+            self.assertFalse(any('restaurants_openinginterval' in q['sql'] for q in queries))
+        self.lunch.closing_time = time(16)
+        self.lunch.save(update_fields=['closing_time'])
+        self.assertEqual(self.open_at('2026-10-14T15:30:00+00:00'), ['Diner', 'Lunch Spot'])
+
+    def test_open_now_and_hour_changes(self):
+        self.lunch.opening_time, self.lunch.closing_time = '00:00', '23:59'  # As update_profile assigns them
+        self.lunch.save()
+        with mock.patch('restaurants.views.timezone.now', return_value=datetime(2026, 10, 14, 16, 0, tzinfo=dt_timezone.utc)):
+            response = self.client.get('/api/restaurants/', {'open_now': 'true'})
+        self.assertEqual(sorted(restaurant['name'] for restaurant in response.json()), ['Diner', 'Lunch Spot'])
+
+    def test_open_filter_is_one_range_scan(self):
+        plan = Restaurant.objects.filter(**open_at_lookup(datetime(2026, 10, 14, 12, tzinfo=dt_timezone.utc))).explain()
+        self.assertIn('opening_interval_range_idx', plan)
+
+    def test_invalid_open_at(self):
+        self.assertEqual(self.client.get('/api/restaurants/', {'open_at': 'noon'}).status_code, 400)
+
+
+class NearbyTests(TestCase):
+    def setUp(self):
+        hours = {'opening_time': time(0), 'closing_time': time(0)}
+        self.downtown = Restaurant.objects.create(name='Downtown', description='', address='1 Market St, San Jose, CA 95113', **hours)
+        self.campus = Restaurant.objects.create(name='Campus', description='', address='1 Washington Sq, San Jose 95192', **hours)
+        self.fremont = Restaurant.objects.create(name='Fremont', description='', address='Fremont, CA 94538', **hours)
+        self.closed = Restaurant.objects.create(name='Closed', description='', address='San Jose, CA 95112',
+                                                opening_time=time(9), closing_time=time(9, 1))
+        Restaurant.objects.create(name='Nowhere', description='', address='Unknown', **hours)
+        self.user = User.objects.create_user(username='alice', password='secret')
+        self.address = DeliveryAddress.objects.create(customer=self.user.customer, address_line1='1 Main St', city='San Jose',
+                                                      state='CA', postal_code='95112', country='USA')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_models_are_geocoded(self):
+        self.assertAlmostEqual(self.downtown.latitude, 37.3336)
+        self.assertEqual(self.downtown.grid_cell, grid_cell(self.downtown.latitude, self.downtown.longitude))
+        self.assertAlmostEqual(self.address.longitude, -121.8833)
+
+    def test_nearest_open_restaurants(self):
+        with mock.patch('restaurants.views.timezone.now', return_value=datetime(2026, 10, 14, 12, tzinfo=dt_timezone.utc)):
+            response = self.client.get('/api/restaurants/nearby/', {'address_id': self.address.id, 'k': 2})
+        self.assertEqual([r['name'] for r in response.json()], ['Campus', 'Downtown'])
+        self.assertLess(response.json()[0]['distance_km'], response.json()[1]['distance_km'])
+
+    def test_grid_search_matches_full_scan(self):
+        lat, lon = self.address.latitude, self.address.longitude
+        ranked = nearest(Restaurant.objects.all(), lat, lon, k=10, max_km=100)
+        expected = sorted(
+            (haversine_km(lat, lon, r.latitude, r.longitude), r.name)
+            for r in Restaurant.objects.filter(latitude__isnull=False)
+        )
+        self.assertEqual([r.name for _, r in ranked], [name for _, name in expected])
+
+    def test_max_km_is_bounded(self):
+        for max_km in ('nan', 'inf', '-1', '0'):
+            response = self.client.get('/api/restaurants/nearby/', {'address_id': self.address.id, 'max_km': max_km})
+            self.assertEqual(response.status_code, 400, max_km)
+        # Used to widen the square until SQLite rejected the query
+        for max_km in ('2000', '20000', '1e300'):
+            response = self.client.get('/api/restaurants/nearby/', {'address_id': self.address.id, 'max_km': max_km, 'open_now': 'false'})
+            self.assertEqual(response.status_code, 200, max_km)
+            self.assertEqual(len(response.json()), 4, max_km)
+
+    def test_grid_square_is_one_row_range(self):
+        # A square wider than the whole grid still compiles to a handful of conditions
+        lat, lon = self.address.latitude, self.address.longitude
+        self.assertEqual(Restaurant.objects.filter(grid_square(lat, lon, 20000)).count(), 4)
+        self.assertEqual(Restaurant.objects.filter(grid_square(lat, lon, 5000)).count(), 4)
+        self.assertEqual(len(nearest(Restaurant.objects.all(), 89.9, 179.99, k=3, max_km=100)), 0)
+
+    def test_other_customers_address(self):
+        other = User.objects.create_user(username='bob', password='secret')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get('/api/restaurants/nearby/', {'address_id': self.address.id}).status_code, 404)
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_nearby', seed=200, queries=5, stdout=out)
+        self.assertIn('Result mismatches on 20 spot checks: 0', out.getvalue())
+
+
+class RestaurantLoginSignupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_signup_then_login(self):
+        response = self.client.post('/api/restaurants/signup/', {
+            'username': 'owner', 'password': 'pa55word', 'email': 'owner@example.com',
+            'restaurant_name': 'Taco Town', 'address': '1 Main St, San Jose, CA 95112', 'phone_number': '4085550100',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        restaurant = Restaurant.objects.get(pk=response.json()['restaurant_id'])
+        self.assertEqual(restaurant.name, 'Taco Town')
+
+        response = self.client.post('/api/restaurants/login/', {'username': 'owner', 'password': 'pa55word'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['restaurant_id'], restaurant.id)
+
+    def test_missing_fields(self):
+        response = self.client.post('/api/restaurants/signup/', {'username': 'owner'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_customer_cannot_log_in_as_restaurant(self):
+        User.objects.create_user(username='alice', password='secret')
+        response = self.client.post('/api/restaurants/login/', {'username': 'alice', 'password': 'secret'}, format='json')
+        self.assertEqual(response.json(), {'error': 'User does not have an associated restaurant'})
+
+
+class OrderSummaryTests(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.customer_user = User.objects.create_user(username='alice', password='secret')
+        self.owner = User.objects.create_user(username='owner', password='secret')
+        self.restaurant = Restaurant.objects.create(user=self.owner, name='Pizza Palace', description='Pizza')
+        self.dishes = [
+            Dish.objects.create(restaurant=self.restaurant, name=name, description='', price=Decimal('10.00'))
+            for name in ('Margherita', 'Salad')
+        ]
+        self.address = DeliveryAddress.objects.create(
+            customer=self.customer_user.customer, address_line1='1 Main St', city='San Jose',
+            state='CA', postal_code='95112', country='USA',
+        )
+        self.customer = APIClient()
+        self.customer.force_authenticate(user=self.customer_user)
+        self.dashboard = APIClient()
+        self.dashboard.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.owner).key}')
+        self.url = f'/api/restaurants/{self.restaurant.id}/orders/summary/'
+
+    def place_order(self, quantities=(2, 1)):
+        changes = [{'dish_id': dish.id, 'quantity': q} for dish, q in zip(self.dishes, quantities)]
+        self.customer.post('/api/cart-items/batch/', changes, format='json')
+        response = self.customer.post('/api/orders/place_order/', {
+            'restaurant_id': self.restaurant.id, 'delivery_address_id': self.address.id,
+        })
+        return Order.objects.get(id=response.data['id'])
+
+    def test_place_order_writes_summary(self):
+        order = self.place_order()
+        summary = OrderSummary.objects.get(order=order)
+        self.assertEqual((summary.status, summary.item_count, summary.customer_name), ('new', 3, 'alice'))
+        self.assertEqual(summary.total_price, Decimal('30.00'))
+
+    def test_status_update_and_rename_propagate(self):
+        order = self.place_order()
+        self.customer.post('/api/orders/updateOrderStatus/', {'orderId': order.id, 'status': 'preparing'})
+        customer = self.customer_user.customer
+        customer.name = 'Alice Smith'
+        customer.save()
+        summary = OrderSummary.objects.get(order=order)
+        self.assertEqual((summary.status, summary.customer_name), ('preparing', 'Alice Smith'))
+
+    def test_removed_item_is_recounted_after_commit(self):
+        order = self.place_order()
+        with self.captureOnCommitCallbacks(execute=True):
+            order.items.filter(dish=self.dishes[0]).delete()
+        self.assertEqual(OrderSummary.objects.get(order=order).item_count, 1)
+
+    def test_dashboard_list_filters_by_status(self):
+        orders = [self.place_order() for _ in range(3)]
+        orders[0].status = 'delivered'
+        orders[0].save()
+        data = self.dashboard.get(self.url).data
+        self.assertEqual([row['id'] for row in data['results']], [o.id for o in reversed(orders)])
+        self.assertEqual(set(data['results'][0]), {'id', 'status', 'total_price', 'created_at', 'customer_name', 'item_count'})
+        data = self.dashboard.get(self.url, {'status': 'new,preparing'}).data
+        self.assertEqual([row['id'] for row in data['results']], [orders[2].id, orders[1].id])
+        self.assertEqual(self.dashboard.get(self.url, {'status': 'bogus'}).status_code, 400)
+
+    def test_dashboard_reads_one_table(self):
+        self.place_order()
+        self.dashboard.get(self.url)  # Warm the token cache
+        with CaptureQueriesContext(connection) as queries:
+            self.dashboard.get(self.url)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('JOIN', queries[0]['sql'])
+
+    def test_only_the_owner_can_read(self):
+        self.place_order()
+        self.assertEqual(self.customer.get(self.url).status_code, 404)
+
+
+class SalesAnalyticsTests(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.customer = User.objects.create_user(username='alice', password='secret').customer
+        self.owner = User.objects.create_user(username='owner', password='secret')
+        self.restaurant = Restaurant.objects.create(user=self.owner, name='Pizza Palace', description='Pizza')
+        self.pizza = Dish.objects.create(restaurant=self.restaurant, name='Margherita', description='', price=Decimal('12.00'))
+        self.salad = Dish.objects.create(restaurant=self.restaurant, name='Salad', description='', price=Decimal('5.00'))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.owner).key}')
+        self.url = f'/api/restaurants/{self.restaurant.id}/analytics/'
+
+    def order(self, day, lines, status='delivered'):
+        # An order placed at noon on `day`, then moved to `status` through save() like the views do
+        order = Order.objects.create(
+            customer=self.customer, restaurant=self.restaurant,
+            total_price=sum(dish.price * quantity for dish, quantity in lines),
+        )
+        OrderItem.objects.bulk_create([OrderItem(order=order, dish=dish, quantity=quantity) for dish, quantity in lines])
+        Order.objects.filter(id=order.id).update(created_at=datetime.combine(day, time(12), tzinfo=dt_timezone.utc))
+        order = Order.objects.get(id=order.id)
+        order.status = status
+        order.save()
+        return order
+
+    def report(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_delivery_updates_rollups_incrementally(self):
+        self.order(date(2026, 3, 2), [(self.pizza, 2), (self.salad, 1)])
+        self.order(date(2026, 3, 2), [(self.pizza, 1)])
+        self.order(date(2026, 3, 2), [(self.salad, 4)], status='preparing')  # Not delivered, not counted
+        day = RestaurantDailySales.objects.get(restaurant=self.restaurant, day=date(2026, 3, 2))
+        self.assertEqual((day.revenue, day.order_count, day.item_count), (Decimal('41.00'), 2, 4))
+        self.assertEqual(DishDailySales.objects.get(dish=self.pizza).quantity, 3)
+
+    def test_leaving_delivered_takes_the_order_back_out(self):
+        order = self.order(date(2026, 3, 2), [(self.pizza, 2)])
+        order.status = 'cancelled'
+        order.save()
+        order.save()  # Saving again without a status change doesn't subtract twice
+        day = RestaurantDailySales.objects.get(restaurant=self.restaurant, day=date(2026, 3, 2))
+        self.assertEqual((day.revenue, day.order_count, day.item_count), (Decimal('0.00'), 0, 0))
+        self.assertEqual(self.report(start='2026-03-01', end='2026-03-31')['top_dishes'], [])
+
+    def test_stale_copies_count_a_delivery_once(self):
+        order = self.order(date(2026, 3, 2), [(self.pizza, 1)], status='preparing')
+        first, second = Order.objects.get(id=order.id), Order.objects.get(id=order.id)
+        for copy in (first, second):
+            copy.status = 'delivered'
+            copy.save()
+        day = RestaurantDailySales.objects.get(restaurant=self.restaurant, day=date(2026, 3, 2))
+        self.assertEqual((day.revenue, day.order_count), (Decimal('12.00'), 1))
+        # A stale copy still thinking it's delivered takes it out once, too
+        first.status = second.status = 'cancelled'
+        first.save()
+        second.save()
+        day.refresh_from_db()
+        self.assertEqual((day.revenue, day.order_count), (Decimal('0.00'), 0))
+
+    def test_saves_that_keep_the_status_skip_the_claim(self):
+        order = self.order(date(2026, 3, 2), [(self.pizza, 1)], status='preparing')
+        for save in (lambda: order.save(update_fields=['total_price']), order.save):
+            with CaptureQueriesContext(connection) as queries:
+                save()
+            self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE "customers_order"')]), 1)
+        order.status = 'on_the_way'  # Still short of delivered
+        with CaptureQueriesContext(connection) as queries:
+            order.save()
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE "customers_order"')]), 1)
+        self.assertFalse(RestaurantDailySales.objects.exists())
+
+    def test_deleting_a_delivered_order_takes_its_items_out(self):
+        order = self.order(date(2026, 3, 2), [(self.pizza, 2)])
+        self.order(date(2026, 3, 2), [(self.pizza, 1)])
+        order.delete()
+        day = RestaurantDailySales.objects.get(restaurant=self.restaurant, day=date(2026, 3, 2))
+        self.assertEqual((day.revenue, day.order_count, day.item_count), (Decimal('12.00'), 1, 1))
+        dish = DishDailySales.objects.get(dish=self.pizza)
+        self.assertEqual((dish.quantity, dish.revenue), (1, Decimal('12.00')))
+
+    def test_report_by_day_week_and_month(self):
+        self.order(date(2026, 3, 2), [(self.pizza, 2)])   # Monday
+        self.order(date(2026, 3, 4), [(self.salad, 2)])   # Same week
+        self.order(date(2026, 3, 9), [(self.pizza, 1)])   # Next week
+        self.order(date(2026, 4, 1), [(self.salad, 1)])   # Next month
+        data = self.report(start='2026-03-01', end='2026-04-30', period='day')
+        self.assertEqual(len(data['series']), 4)
+        self.assertEqual(data['totals'], {'revenue': '51.00', 'orders': 4, 'average_basket': '12.75'})
+        weeks = self.report(start='2026-03-01', end='2026-04-30', period='week')['series']
+        self.assertEqual([(w['period_start'], w['revenue'], w['orders']) for w in weeks], [
+            (date(2026, 3, 2), '34.00', 2), (date(2026, 3, 9), '12.00', 1), (date(2026, 3, 30), '5.00', 1),
+        ])
+        months = self.report(start='2026-03-01', end='2026-04-30', period='month')['series']
+        self.assertEqual([(m['period_start'], m['revenue'], m['items']) for m in months], [
+            (date(2026, 3, 1), '46.00', 5), (date(2026, 4, 1), '5.00', 1),
+        ])
+        self.assertEqual(
+            [(d['name'], d['quantity'], d['revenue']) for d in self.report(start='2026-03-01', end='2026-04-30')['top_dishes']],
+            [('Margherita', 3, '36.00'), ('Salad', 3, '15.00')],
+        )
+
+    def test_backfill_matches_incremental_rollups(self):
+        for day in (date(2026, 1, 30), date(2026, 2, 1), date(2026, 3, 15)):
+            self.order(day, [(self.pizza, 1), (self.salad, 3)])
+        self.order(date(2026, 2, 1), [(self.pizza, 5)], status='on_the_way')
+        expected = sorted(RestaurantDailySales.objects.values_list('day', 'revenue', 'order_count', 'item_count'))
+        expected_dishes = sorted(DishDailySales.objects.values_list('dish_id', 'day', 'quantity', 'revenue'))
+        RestaurantDailySales.objects.all().delete()
+        DishDailySales.objects.all().delete()
+        call_command('backfill_sales_rollups', '--until', '2026-03-31', '--chunk-days', '7', stdout=io.StringIO())
+        self.assertEqual(sorted(RestaurantDailySales.objects.values_list('day', 'revenue', 'order_count', 'item_count')), expected)
+        self.assertEqual(sorted(DishDailySales.objects.values_list('dish_id', 'day', 'quantity', 'revenue')), expected_dishes)
+
+    def test_report_queries_do_not_grow_with_orders(self):
+        self.client.get(self.url)  # Warm the token cache
+        counts = []
+        for _ in range(2):
+            for day in range(1, 11):
+                self.order(date(2026, 3, day), [(self.pizza, 1), (self.salad, 1)])
+            with CaptureQueriesContext(connection) as queries:
+                self.report(start='2026-03-01', end='2026-03-31')
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(counts[0], 2)
+
+    def test_validation_and_ownership(self):
+        self.assertEqual(self.client.get(self.url, {'period': 'year'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'start': '2026-03-05', 'end': '2026-03-01'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'start': '2020-01-01', 'end': '2026-01-01'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'start': 'yesterday'}).status_code, 400)
+        stranger = APIClient()
+        stranger.force_authenticate(user=self.customer.user)
+        self.assertEqual(stranger.get(self.url).status_code, 404)
+
+
+class QueryPlanTests(TestCase):
+    def test_no_hot_query_reads_a_whole_table(self):
+        out = io.StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('OrderViewSet.order_history', out.getvalue())
+
+    def test_opt_in_pagination_checks_the_unpaged_list_too(self):
+        plans = {result.name: result for result in check_query_plans()}
+        self.assertEqual(plans['RestaurantViewSet.list?cursor'].full_scans, [])
+        # The plain list scans the table, which only the allow-list excuses
+        self.assertTrue(full_scans(plans['RestaurantViewSet.list'].plan))
+        self.assertNotIn('OrderViewSet.list?cursor', plans)
+
+    def test_full_scans_are_reported(self):
+        plan = Order.objects.filter(total_price=Decimal('1.00')).explain()
+        self.assertTrue(full_scans(plan))
+        self.assertFalse(full_scans(Order.objects.filter(restaurant=1, status='new').explain()))
+        # A page that has to sort every row first is as bad as a scan; one read in index order is not
+        self.assertTrue(full_scans(Order.objects.order_by('total_price')[:5].explain(), bounded=True))
+        self.assertFalse(full_scans(Order.objects.order_by('id')[:5].explain(), bounded=True))
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics.registry.clear()
+        self.restaurant = Restaurant.objects.create(name='Pizza Palace', description='Pizza')
+        Dish.objects.create(restaurant=self.restaurant, name='Margherita', description='', price=Decimal('10.00'))
+
+    def test_records_queries_and_sizes_per_action(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/dishes/')
+        histogram = metrics.registry.histogram('DishViewSet.list', 'http_request_db_queries')
+        self.assertEqual((histogram.count, histogram.sum), (1, len(queries)))
+        sizes = metrics.registry.histogram('DishViewSet.list', 'http_response_size_bytes')
+        self.assertEqual(sizes.sum, len(response.content))
+        self.assertEqual(metrics.registry.histogram('DishViewSet.list', 'http_request_serializer_seconds').count, 1)
+
+    def test_async_views_are_measured(self):
+        User.objects.create_user(username='dave', password='secret')
+        self.client.post('/api/customers/login/', {'username': 'dave', 'password': 'secret'}, content_type='application/json')
+        self.assertGreater(metrics.registry.histogram('customers.views.customer_login', 'http_request_db_queries').sum, 0)
+
+    async def test_asgi_handler_is_measured(self):
+        await AsyncClient().get('/api/dishes/')
+        self.assertGreater(metrics.registry.histogram('DishViewSet.list', 'http_request_db_queries').sum, 0)
+
+    def test_prometheus_exposition(self):
+        self.client.get('/api/dishes/')
+        self.client.get('/api/dishes/')
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_duration_seconds_count{endpoint="DishViewSet.list"} 2', body)
+        self.assertIn('http_request_db_queries_bucket{endpoint="DishViewSet.list",le="+Inf"} 2', body)
+        self.assertNotIn('metrics.metrics', body)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.1').status_code, 403)
+
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with mock.patch.dict(metrics.METRICS_SETTINGS, slow_request_seconds=0):
+            with self.assertLogs('uber_eats_backend.metrics', 'WARNING') as logs:
+                self.client.get(f'/api/restaurants/{self.restaurant.id}/dishes/')
+        self.assertIn('RestaurantViewSet.list_dishes', logs.output[0])
+        self.assertIn('FROM "restaurants_dish"', logs.output[0])
+
+    def test_histogram_buckets(self):
+        histogram = metrics.Histogram(1, 1024, sub_buckets=1, zero_bucket=True)
+        for value in (0, 1, 3, 3, 5000):
+            histogram.observe(value)
+        self.assertEqual(histogram.bounds[:4], [0, 1, 2, 4])
+        self.assertEqual(histogram.percentile(50), 4)
+        self.assertEqual(histogram.percentile(100), float('inf'))
+
+
+def png_upload(width, height, name='photo.png'):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), 'tomato').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        workers = mock.patch.object(images.image_pool, 'workers', 0)  # Render inline
+        workers.start()
+        self.addCleanup(workers.stop)
+
+        self.user = User.objects.create_user(username='chef', password='secret')
+        self.restaurant = Restaurant.objects.create(user=self.user, name='Pizza Palace', description='Pizza')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def add_dish(self, image):
+        return self.client.post('/api/restaurants/add_dish/', {
+            'restaurant': self.restaurant.id, 'name': 'Margherita', 'description': 'Classic', 'price': '10.99',
+            'category': 'Main Course', 'image': image,
+        }, format='multipart')
+
+    def test_upload_renders_variants_after_commit(self):
+        with mock.patch.object(images, 'render_variants', wraps=images.render_variants) as render:
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.add_dish(png_upload(1000, 600))
+            render.assert_not_called()  # Nothing is decoded while the request is being handled
+            self.assertEqual(response.status_code, 201)
+            self.assertIsNone(response.json()['image_variants'])
+            for callback in callbacks:
+                callback()
+
+        dish = Dish.objects.get(pk=response.json()['id'])
+        # Responsive sizes stop below the original width; nothing is upscaled
+        self.assertEqual(set(dish.image_variants), {'thumb', 'card', 'w480', 'w960'})
+        self.assertEqual((dish.image_variants['thumb']['width'], dish.image_variants['thumb']['height']), (160, 160))
+        self.assertEqual((dish.image_variants['w480']['width'], dish.image_variants['w480']['height']), (480, 288))
+        for variant in dish.image_variants.values():
+            self.assertRegex(variant['webp'], r'^variants/[0-9a-f]{2}/[0-9a-f]{32}\.webp$')
+            self.assertTrue(default_storage.exists(variant['jpeg']))
+
+        served = self.client.get(f'/api/dishes/{dish.id}/').json()
+        thumb = served['image_variants']['thumb']
+        self.assertEqual(thumb['webp'], f'http://testserver/media/{dish.image_variants["thumb"]["webp"]}')
+        self.assertEqual(thumb['width'], 160)
+
+    def test_identical_renders_share_files(self):
+        first = images.render_variants(default_storage.save('dish_images/a.png', png_upload(200, 200)))
+        second = images.render_variants(default_storage.save('dish_images/b.png', png_upload(200, 200)))
+        self.assertEqual(first, second)
+
+    def test_replacing_the_image_discards_stale_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.restaurant.image = png_upload(300, 300, 'old.png')
+            self.restaurant.save()
+        self.restaurant.refresh_from_db()
+        old_name, old_variants = self.restaurant.image.name, self.restaurant.image_variants
+        self.assertIn('thumb', old_variants)
+
+        with self.captureOnCommitCallbacks():
+            self.restaurant.image = png_upload(300, 300, 'new.png')
+            self.restaurant.save()
+        self.assertIsNone(self.restaurant.image_variants)
+        # A render of the old upload that finishes late doesn't overwrite anything
+        images.apply_variants(Restaurant, self.restaurant.pk, 'image', 'image_variants', old_name, old_variants)
+        self.restaurant.refresh_from_db()
+        self.assertIsNone(self.restaurant.image_variants)
+
+    def test_unreadable_upload_is_logged(self):
+        name = default_storage.save('profile_pics/broken.png', io.BytesIO(b'not an image'))
+        customer = User.objects.create_user(username='eve', password='secret').customer
+        with self.assertLogs('uber_eats_backend.images', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                customer.profile_picture = name
+                customer.save()
+        customer.refresh_from_db()
+        self.assertIsNone(customer.profile_picture_variants)
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.body = bytes(range(256)) * 4
+        self.original = default_storage.save('dish_images/pizza.jpg', io.BytesIO(self.body))
+        self.variant = default_storage.save('variants/ab/abcdef.webp', io.BytesIO(self.body))
+
+    def get(self, name, **headers):
+        return self.client.get(f'/media/{name}', headers=headers)
+
+    def test_whole_file_with_validators(self):
+        response = self.get(self.original)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.body)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Content-Length'], str(len(self.body)))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+        self.assertEqual(self.get(self.original, if_none_match=response['ETag']).status_code, 304)
+        self.assertEqual(self.get(self.original, if_modified_since=response['Last-Modified']).status_code, 304)
+
+    def test_content_hashed_variants_are_immutable(self):
+        self.assertEqual(self.get(self.variant)['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_ranges(self):
+        response = self.get(self.original, range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.body)}')
+        self.assertEqual(b''.join(response.streaming_content), self.body[10:20])
+        self.assertEqual(b''.join(self.get(self.original, range='bytes=-5').streaming_content), self.body[-5:])
+        self.assertEqual(b''.join(self.get(self.original, range='bytes=1000-').streaming_content), self.body[1000:])
+        unsatisfiable = self.get(self.original, range='bytes=5000-')
+        self.assertEqual((unsatisfiable.status_code, unsatisfiable['Content-Range']), (416, f'bytes */{len(self.body)}'))
+        # A stale If-Range gets the whole current file instead of a piece of it
+        self.assertEqual(self.get(self.original, range='bytes=0-9', if_range='"stale"').status_code, 200)
+
+    def test_missing_and_escaping_paths(self):
+        self.assertEqual(self.get('dish_images/missing.jpg').status_code, 404)
+        self.assertEqual(self.get('dish_images').status_code, 404)
+        self.assertEqual(self.get('../settings.py').status_code, 404)
+
+    def test_proxy_offload(self):
+        with mock.patch.dict(media.MEDIA_SERVING, offload='x-accel-redirect'):
+            response = self.get(self.original)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.original}')
+        self.assertEqual(response.content, b'')
+
+    async def test_asgi_app(self):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': f'/media/{self.original}', 'headers': [(b'range', b'bytes=0-99')]}
+        await media.serve_media_asgi(scope, None, send)
+        self.assertEqual(messages[0]['status'], 206)
+        self.assertIn((b'content-length', b'100'), messages[0]['headers'])
+        self.assertEqual(b''.join(message.get('body', b'') for message in messages[1:]), self.body[:100])
+        self.assertFalse(messages[-1].get('more_body'))
+
+
+class CatalogueImportExportTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, lines):
+        path = f'{self.directory}/{name}'
+        with open(path, 'w') as file:
+            file.write(''.join(json.dumps(line) + '\n' for line in lines))
+        return path
+
+    def run_import(self, path, *args):
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_catalogue', path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def chain(self, stores=2, dishes=3):
+        lines = [{'type': 'restaurant', 'ref': f'store-{s}', 'name': f'Store {s}', 'description': 'Chain',
+                  'opening_time': '09:00', 'closing_time': '22:00'} for s in range(stores)]
+        lines += [{'type': 'dish', 'ref': f'item-{d}', 'restaurant_ref': f'store-{s}', 'name': f'Calzone {d}',
+                   'description': 'Folded', 'price': '9.50', 'category': 'Main Course', 'is_vegan': d == 0}
+                  for s in range(stores) for d in range(dishes)]
+        return lines
+
+    def test_import_creates_rows_with_derived_data(self):
+        self.run_import(self.write('chain.jsonl', self.chain()), '--chunk-size', '3')
+        store = Restaurant.objects.get(external_ref='store-1')
+        self.assertEqual(store.dishes.count(), 3)
+        self.assertEqual(OpeningInterval.objects.filter(restaurant=store).count(), 7)
+        self.assertTrue(Dish.objects.get(restaurant=store, external_ref='item-0').is_vegan)
+        # Written by bulk inserts, still found by the search index triggers
+        self.assertEqual(len(self.client.get('/api/search/', {'q': 'calzone'}).json()['results']), 6)
+
+    def test_reimport_updates_in_place(self):
+        self.run_import(self.write('chain.jsonl', self.chain()))
+        dish = Dish.objects.get(external_ref='item-2', restaurant__external_ref='store-0')
+        menu_cache.set(dish.restaurant_id, MenuEntry(b'[]', '"stale"', None))
+
+        export = f'{self.directory}/export.csv'
+        call_command('export_catalogue', export, stdout=io.StringIO())
+        with open(export) as file:
+            text = file.read().replace('Calzone 2', 'Stromboli')
+        with open(export, 'w') as file:
+            file.write(text)
+        out, _ = self.run_import(export)
+
+        self.assertIn('0 created, 8 updated', out)
+        self.assertEqual(Dish.objects.count(), 6)
+        updated = Dish.objects.get(pk=dish.pk)
+        self.assertEqual(updated.name, 'Stromboli')
+        self.assertGreater(updated.updated_at, dish.updated_at)
+        self.assertIsNone(menu_cache.get(dish.restaurant_id))
+        self.assertEqual(self.client.get('/api/search/', {'q': 'stromboli'}).json()['results'][0]['dish']['id'], dish.pk)
+
+    def test_invalid_records_are_skipped_and_reported(self):
+        lines = self.chain(stores=1, dishes=2)
+        lines[1]['price'] = 'free'
+        lines.append({'type': 'dish', 'restaurant_ref': 'nowhere', 'name': 'Ghost', 'description': '', 'price': '1'})
+        lines.append({'type': 'drink'})
+        _, err = self.run_import(self.write('chain.jsonl', lines))
+        self.assertIn('Record 2: price:', err)
+        self.assertIn('Record 4: Unknown restaurant', err)
+        self.assertIn("Record 5: Unknown record type 'drink'", err)
+        self.assertEqual(list(Dish.objects.values_list('external_ref', flat=True)), ['item-1'])
+
+    def test_resumes_from_checkpoint(self):
+        path = self.write('chain.jsonl', self.chain())
+        original = CatalogueImporter.import_chunk
+        calls = []
+
+        def fail_second_chunk(importer, records):
+            calls.append(records[0][0])
+            if len(calls) == 2:
+                raise RuntimeError('disk full')
+            return original(importer, records)
+
+        with mock.patch.object(CatalogueImporter, 'import_chunk', fail_second_chunk):
+            with self.assertRaises(RuntimeError):
+                self.run_import(path, '--chunk-size', '3')
+        with open(f'{path}.checkpoint') as file:
+            self.assertEqual(json.load(file)['records'], 3)
+
+        out, _ = self.run_import(path, '--chunk-size', '3', '--resume')
+        self.assertIn('Resuming after record 3', out)
+        self.assertEqual((Restaurant.objects.count(), Dish.objects.count()), (2, 6))
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+
+class LoadDataBenchmarkTests(TestCase):
+    def generate(self, **options):
+        call_command('generate_load_data', restaurants=3, dishes_per_restaurant=4, customers=5,
+                     orders_per_customer=3, days=30, stdout=io.StringIO(), **options)
+
+    def test_generate_load_data_fills_what_signals_would(self):
+        self.generate()
+        restaurants = Restaurant.objects.filter(user__username__startswith='load-owner-')
+        self.assertEqual(restaurants.count(), 3)
+        self.assertEqual(Dish.objects.filter(restaurant__in=restaurants).count(), 12)
+        self.assertFalse(restaurants.filter(latitude__isnull=True).exists())
+        self.assertEqual(OpeningInterval.objects.filter(restaurant__in=restaurants).values('restaurant').distinct().count(), 3)
+        # Every user got its customer, every order its summary
+        self.assertEqual(User.objects.filter(customer__isnull=True).count(), 0)
+        orders = Order.objects.filter(restaurant__in=restaurants)
+        self.assertEqual(OrderSummary.objects.filter(restaurant__in=restaurants).count(), orders.count())
+        # Spread over the history rather than all stamped "now"
+        oldest = orders.order_by('created_at').first()
+        self.assertLess(oldest.created_at, datetime.now(dt_timezone.utc) - timedelta(days=1))
+        self.assertEqual(OrderSummary.objects.get(order=oldest).created_at, oldest.created_at)
+        self.assertTrue(RestaurantDailySales.objects.filter(restaurant__in=restaurants).exists())
+
+    def test_generate_load_data_refuses_existing_prefix(self):
+        self.generate()
+        with self.assertRaises(CommandError):
+            self.generate()
+
+    def test_benchmark_endpoints_writes_comparable_results(self):
+        self.generate()
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/results.json'
+            call_command('benchmark_endpoints', requests=3, warmup=1, users=2, output=path, stdout=io.StringIO())
+            with open(path) as file:
+                results = json.load(file)
+        self.assertEqual(set(results['scenarios']), {
+            'restaurant_list', 'menu', 'add_to_cart', 'place_order', 'order_history', 'restaurant_orders',
+        })
+        for name, summary in results['scenarios'].items():
+            self.assertEqual(summary['errors'], 0, name)
+            self.assertGreater(summary['queries_per_request'], 0, name)
+        self.assertEqual(results['meta']['dataset']['restaurants'], 3)
+
+    def test_compare_results_flags_regressions(self):
+        def run(p95, queries, errors=0):
+            return {'scenarios': {'menu': {'p50_ms': 5, 'p95_ms': p95, 'p99_ms': 12, 'throughput_rps': 150,
+                                           'queries_per_request': queries, 'errors': errors}}}
+
+        self.assertEqual(benchmarks.compare_results(run(10, 2), run(12, 2), tolerance=0.25), [])
+        self.assertEqual(len(benchmarks.compare_results(run(10, 2), run(14, 2), tolerance=0.25)), 1)
+        self.assertIn('queries_per_request', benchmarks.compare_results(run(10, 2), run(10, 3))[0])
+        self.assertIn('errors', benchmarks.compare_results(run(10, 2), run(10, 2, errors=1))[0])
+
+
+class AsyncReadViewTests(TestCase):
+    def setUp(self):
+        menu_cache.clear()
+        token_cache.clear()
+        self.restaurant = Restaurant.objects.create(name='Pizza Palace', description='Pizza')
+        self.dishes = [
+            Dish.objects.create(restaurant=self.restaurant, name='Margherita', description='', price=Decimal('10.00'), category='Main Course'),
+            Dish.objects.create(restaurant=self.restaurant, name='Tiramisu', description='', price=Decimal('6.00'), category='Dessert'),
+        ]
+        Restaurant.objects.create(name='Taco Corner', description='Tacos')
+        user = User.objects.create_user(username='erin', password='secret')
+        address = DeliveryAddress.objects.create(customer=user.customer, address_line1='1 Main St', city='San Jose',
+                                                 state='CA', postal_code='95112', country='USA', is_default=True)
+        CartItem.objects.create(customer=user.customer, dish=self.dishes[0], quantity=2, restaurant=self.restaurant)
+        self.order = Order.objects.create(customer=user.customer, restaurant=self.restaurant,
+                                          total_price=Decimal('10.00'), delivery_address=address)
+        OrderItem.objects.create(order=self.order, dish=self.dishes[0], quantity=1)
+        self.token = Token.objects.create(user=user).key
+
+    # The async view, then the viewset it stands in for, as the default URLconf serves it
+    def both(self, path, **headers):
+        with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+            asynchronous = self.client.get(path, headers=headers)
+        synchronous = self.client.get(path, headers=headers)
+        return asynchronous, synchronous
+
+    def assertSameResponse(self, path, **headers):
+        asynchronous, synchronous = self.both(path, **headers)
+        self.assertEqual(asynchronous.status_code, synchronous.status_code, path)
+        self.assertEqual(asynchronous.content, synchronous.content, path)
+        for header in ('Content-Type', 'ETag', 'WWW-Authenticate'):
+            self.assertEqual(asynchronous.get(header), synchronous.get(header), f'{path} {header}')
+        return asynchronous
+
+    def test_same_responses_as_the_viewsets(self):
+        auth = {'Authorization': f'Token {self.token}'}
+        for path in [
+            '/api/restaurants/', '/api/restaurants/?page_size=1', '/api/restaurants/?fields=id,name',
+            f'/api/restaurants/{self.restaurant.id}/', '/api/restaurants/999999/',
+            f'/api/restaurants/{self.restaurant.id}/dishes/', f'/api/restaurants/{self.restaurant.id}/dishes/?category=Dessert',
+            f'/api/restaurants/{self.restaurant.id}/dishes/?facets=true', '/api/restaurants/999999/dishes/',
+            '/api/cart-items/', f'/api/orders/getOrderDetail/?orderId={self.order.id}',
+            '/api/orders/getOrderDetail/?orderId=999999',
+        ]:
+            self.assertSameResponse(path, **auth)
+        # Where the viewset fails on the id lookup, the async view answers like a missing order
+        with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+            self.assertEqual(self.client.get('/api/orders/getOrderDetail/?orderId=abc').status_code, 404)
+        self.assertEqual(len(self.client.get('/api/cart-items/', headers=auth).json()), 1)
+
+    def test_conditional_requests_are_answered_the_same(self):
+        auth = {'Authorization': f'Token {self.token}'}
+        for path in [f'/api/restaurants/{self.restaurant.id}/', '/api/cart-items/', f'/api/orders/getOrderDetail/?orderId={self.order.id}']:
+            etag = self.client.get(path, headers=auth)['ETag']
+            self.assertEqual(self.assertSameResponse(path, If_None_Match=etag, **auth).status_code, 304, path)
+
+    def test_cart_needs_a_valid_token(self):
+        self.assertEqual(self.assertSameResponse('/api/cart-items/').status_code, 401)
+        self.assertEqual(self.assertSameResponse('/api/cart-items/', Authorization='Token nope').status_code, 401)
+
+    @override_settings(ROOT_URLCONF=ASYNC_URLCONF)
+    def test_writes_fall_through_to_the_viewsets(self):
+        response = self.client.patch(f'/api/restaurants/{self.restaurant.id}/', {'name': 'Pasta Palace'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.restaurant.refresh_from_db()
+        self.assertEqual(self.restaurant.name, 'Pasta Palace')
+        # Browsers still get DRF's browsable API
+        response = self.client.get('/api/restaurants/', headers={'Accept': 'text/html'})
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+        self.assertContains(response, 'Pasta Palace')
+
+    def test_only_mounted_in_the_async_urlconf(self):
+        # WSGI, and ASGI without ASYNC_READ_VIEWS, keep serving the viewsets
+        self.assertFalse(asyncio.iscoroutinefunction(resolve('/api/restaurants/').func))
+        self.assertTrue(asyncio.iscoroutinefunction(resolve('/api/restaurants/', ASYNC_URLCONF).func))
+        self.assertEqual(resolve('/api/restaurants/1/orders/', ASYNC_URLCONF).url_name, 'restaurant-orders')
+
+    @override_settings(ROOT_URLCONF=ASYNC_URLCONF)
+    async def test_served_natively_under_asgi(self):
+        for path in ['/api/restaurants/', f'/api/restaurants/{self.restaurant.id}/', f'/api/restaurants/{self.restaurant.id}/dishes/',
+                     '/api/cart-items/', f'/api/orders/getOrderDetail/?orderId={self.order.id}']:
+            self.assertTrue(asyncio.iscoroutinefunction(resolve(path.split('?')[0]).func), path)
+            response = await AsyncClient().get(path, headers={'Authorization': f'Token {self.token}'})
+            self.assertEqual(response.status_code, 200, path)
+
+
+class AsyncViewBenchmarkTests(TransactionTestCase):
+    # Transactional, so the threads of the servers see the data
+    def test_handler_resolves_against_the_async_urlconf(self):
+        metrics.registry.clear()
+        Restaurant.objects.create(name='Pizza Palace', description='Pizza')
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            self.assertEqual(async_to_sync(benchmarks.asgi_request)(AsyncReadViewsHandler(), 'GET', '/api/restaurants/'), 200)
+            self.assertEqual(async_to_sync(benchmarks.asgi_request)(ASGIHandler(), 'GET', '/api/restaurants/'), 200)
+        self.assertEqual(metrics.registry.histogram('restaurants.views.restaurant_list', 'http_request_db_queries').count, 1)
+        self.assertEqual(metrics.registry.histogram('RestaurantViewSet.list', 'http_request_db_queries').count, 1)
+
+    def test_benchmark_async_views_compares_the_servers(self):
+        token_cache.clear()
+        call_command('generate_load_data', restaurants=2, dishes_per_restaurant=3, customers=4, orders_per_customer=3,
+                     cart_fraction=1, days=30, stdout=io.StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/results.json'
+            call_command('benchmark_async_views', requests=4, warmup=1, concurrency=[1, 3], output=path, stdout=io.StringIO())
+            with open(path) as file:
+                results = json.load(file)
+        self.assertEqual(len(results['scenarios']), 5 * 2 * 3)
+        for name, summary in results['scenarios'].items():
+            self.assertEqual((summary['requests'], summary['errors']), (4, 0), name)
+        self.assertIn('cart/asgi_async/c3', results['scenarios'])
@@ -1,64 +1,263 @@
 from rest_framework import viewsets, status
-from rest_framework.decorators import action, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.response import Response
-from django.contrib.auth import authenticate
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from asgiref.sync import sync_to_async
+from django.db import transaction
 from rest_framework.authtoken.models import Token
 from .models import Restaurant, Dish
 from .serializers import RestaurantSerializer, DishSerializer, UserSerializer
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils import timezone
+from datetime import date
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+from .cache import menu_cache
+from .pagination import IdCursorPagination
+from .search import SEARCH_INDEXES, search_catalogue
+from .filters import dish_facets, filter_dishes, has_dish_filters, wants_facets
+from .hours import open_at_lookup, parse_open_at
+from .geo import nearest
+from uber_eats_backend import passwords
+from uber_eats_backend.async_views import async_read_view, render_json
+from uber_eats_backend.conditional import ConditionalGetMixin, aversion_for, is_not_modified, with_validators
+from uber_eats_backend.log import field_names, lazy
+from uber_eats_backend.passwords import async_auth_view
 from django.shortcuts import render
-from customers.models import Order
-from customers.serializers import OrderSerializer
+from customers.models import Order, DeliveryAddress, OrderSummary
+from customers.analytics import MAX_RANGE_DAYS, PERIODS, default_range, sales_report
+from customers.pagination import OrderHistoryCursorPagination
+from customers.accounts import create_account
+from customers.authentication import load_profile
+from customers.serializers import OrderSerializer, OrderSummarySerializer
 import logging
+import math
 from django.contrib.auth.models import User
-from rest_framework.permissions import IsAuthenticated, AllowAny  # Ensure this is included
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser  # Ensure this is included
 
 
 logger = logging.getLogger(__name__)
 
+# Card fields returned for restaurant search hits
+SEARCH_RESTAURANT_FIELDS = ['id', 'name', 'image', 'image_variants', 'address', 'opening_time', 'closing_time']
+# Columns the nearby search needs: the card fields plus the coordinates
+NEARBY_RESTAURANT_FIELDS = SEARCH_RESTAURANT_FIELDS + ['latitude', 'longitude']
+# Largest ?max_km the nearby search honours; larger values are clamped to it
+NEARBY_MAX_KM = 100.0
+
 
 def home(request):
     return HttpResponse("Welcome to Uber Eats!")
 
-class RestaurantViewSet(viewsets.ModelViewSet):
+
+def with_facets(data, facets):
+    # Attach facet counts to a paginated ({results, ...}) or plain list payload
+    if isinstance(data, dict):
+        data['facets'] = facets
+        return data
+    return {'results': data, 'facets': facets}
+
+
+def render_menu(dishes):
+    return JSONRenderer().render(DishSerializer(dishes, many=True).data)
+
+
+def requested_fields(params):
+    # ?fields=id,name,image limits list/retrieve output (id is always included)
+    fields = params.get('fields')
+    if not fields:
+        return None
+    return {'id'} | {name.strip() for name in fields.split(',') if name.strip()}
+
+
+def only_requested(queryset, fields):
+    if not fields:
+        return queryset
+    # Don't even load the columns that won't be output, e.g. the long description
+    columns = {field.name for field in Restaurant._meta.concrete_fields} & fields
+    return queryset.only(*columns)
+
+
+def filter_open(queryset, params):
+    # ?open_now=true or ?open_at=<ISO datetime>, matched against the precomputed opening intervals
+    if 'open_at' in params:
+        try:
+            moment = parse_open_at(params['open_at'])
+        except ValueError:
+            raise ValidationError({'open_at': 'Must be an ISO 8601 datetime.'})
+    elif params.get('open_now', '').lower() in ('1', 'true', 'yes'):
+        moment = timezone.now()
+    else:
+        return queryset
+    return queryset.filter(**open_at_lookup(moment))
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def search(request):
+    query = request.GET.get('q', '').strip()
+    kinds = [request.GET['type']] if request.GET.get('type') in SEARCH_INDEXES else list(SEARCH_INDEXES)
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+        offset = max(int(request.GET.get('offset', 0)), 0)
+    except ValueError:
+        return Response({'error': 'limit and offset must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+    if not query:
+        return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # One extra hit tells us whether there is a next page
+    hits = search_catalogue(query, kinds, limit + 1, offset)
+    has_next, hits = len(hits) > limit, hits[:limit]
+
+    # Load the matched rows in one query per kind, then emit them in rank order
+    restaurant_ids = [hit.object_id for hit in hits if hit.kind == 'restaurant']
+    dish_ids = [hit.object_id for hit in hits if hit.kind == 'dish']
+    restaurants = Restaurant.objects.only(*SEARCH_RESTAURANT_FIELDS).in_bulk(restaurant_ids)
+    dishes = Dish.objects.in_bulk(dish_ids)
+
+    results = []
+    for hit in hits:
+        if hit.kind == 'restaurant' and hit.object_id in restaurants:
+            data = RestaurantSerializer(restaurants[hit.object_id], fields=SEARCH_RESTAURANT_FIELDS).data
+        elif hit.kind == 'dish' and hit.object_id in dishes:
+            data = DishSerializer(dishes[hit.object_id]).data
+        else:
+            continue
+        results.append({'type': hit.kind, 'score': hit.score, hit.kind: data})
+
+    next_url = None
+    if has_next:
+        next_url = replace_query_param(request.build_absolute_uri(), 'offset', offset + limit)
+    return Response({'next': next_url, 'results': results})
+
+# Login and signup are async so the password hash runs in the hashing pool
+# without holding a request thread (see uber_eats_backend.passwords)
+@async_auth_view
+async def restaurant_login(request, data):
+    username = data.get('username')
+    password = data.get('password')
+    user = await passwords.authenticate(request, username, password)
+    if user is None:
+        logger.warning('Login failed for user: %s', username)
+        return JsonResponse({'error': 'Invalid credentials'}, status=status.HTTP_400_BAD_REQUEST)
+    # Check if the user has a related restaurant
+    restaurant_id = await Restaurant.objects.filter(user=user).values_list('id', flat=True).afirst()
+    if restaurant_id is None:
+        logger.warning('User %s does not have an associated restaurant.', username)
+        return JsonResponse({'error': 'User does not have an associated restaurant'}, status=status.HTTP_400_BAD_REQUEST)
+    token, _ = await Token.objects.aget_or_create(user=user)
+    return JsonResponse({
+        'token': token.key,
+        'user_id': user.id,
+        'restaurant_id': restaurant_id,
+    })
+
+
+@async_auth_view
+async def restaurant_signup(request, data):
+    username = data.get('username')
+    password = data.get('password')
+    email = data.get('email')
+    restaurant_name = data.get('restaurant_name')
+    address = data.get('address')
+    phone_number = data.get('phone_number')
+
+    if not all([username, password, email, restaurant_name, address, phone_number]):
+        return JsonResponse({'error': 'All fields are required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if await User.objects.filter(username=username).aexists():
+        return JsonResponse({'error': 'Username already exists'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if await User.objects.filter(email=email).aexists():
+        return JsonResponse({'error': 'Email already exists'}, status=status.HTTP_400_BAD_REQUEST)
+
+    encoded = await passwords.make_password(password)
+    try:
+        user, token, restaurant = await sync_to_async(create_restaurant_account)(
+            username, email, encoded, restaurant_name, address, phone_number,
+        )
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return JsonResponse({
+        'token': token.key,
+        'user_id': user.id,
+        'restaurant_id': restaurant.id,
+    }, status=status.HTTP_201_CREATED)
+
+
+# Creates the owner account, its restaurant and token from an already hashed password
+def create_restaurant_account(username, email, encoded_password, restaurant_name, address, phone_number):
+    with transaction.atomic():
+        user, token = create_account(username, email, encoded_password)
+        restaurant = Restaurant.objects.create(user=user, name=restaurant_name, address=address,
+                                               phone_number=phone_number)
+    return user, token, restaurant
+
+
+class RestaurantViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Restaurant.objects.all()
     serializer_class = RestaurantSerializer
+    pagination_class = IdCursorPagination
 
-    @action(detail=False, methods=['post'])
-    def signup(self, request):
-        username = request.data.get('username')
-        password = request.data.get('password')
-        email = request.data.get('email')
-        restaurant_name = request.data.get('restaurant_name')
-        address = request.data.get('address')
-        phone_number=request.data.get('phone_number')
+    def get_requested_fields(self):
+        return requested_fields(self.request.query_params) if self.action in ('list', 'retrieve') else None
 
-        if not all([username, password, email, restaurant_name, address, phone_number]):
-            return Response({'error': 'All fields are required'}, status=status.HTTP_400_BAD_REQUEST)
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = filter_open(queryset, self.request.query_params)
+        return only_requested(queryset, self.get_requested_fields())
 
-        if User.objects.filter(username=username).exists():
-            return Response({'error': 'Username already exists'}, status=status.HTTP_400_BAD_REQUEST)
+    def get_list_version(self):
+        # "Open now" changes with the clock, not with the rows, so it can't be revalidated
+        if 'open_now' in self.request.query_params:
+            return None
+        return super().get_list_version()
 
-        if User.objects.filter(email=email).exists():
-            return Response({'error': 'Email already exists'}, status=status.HTTP_400_BAD_REQUEST)
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
 
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def nearby(self, request):
+        # K nearest restaurants (open now unless ?open_now=false) to one of the customer's delivery addresses
+        address = DeliveryAddress.objects.filter(
+            id=request.GET.get('address_id') or None, customer__user=request.user
+        ).first()
+        if address is None:
+            return Response({'error': 'Delivery address not found'}, status=status.HTTP_404_NOT_FOUND)
+        if address.latitude is None or address.longitude is None:
+            return Response({'error': 'Delivery address could not be located'}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            user = User.objects.create_user(username=username, password=password, email=email)
-            restaurant = Restaurant.objects.create(user=user, name=restaurant_name, address=address,
-            phone_number=phone_number)
-            token, _ = Token.objects.get_or_create(user=user)
-            return Response({
-                'token': token.key,
-                'user_id': user.id,
-                'restaurant_id': restaurant.id,
-            }, status=status.HTTP_201_CREATED)
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            k = min(max(int(request.GET.get('k', 10)), 1), 50)
+            max_km = float(request.GET.get('max_km', 25))
+        except ValueError:
+            return Response({'error': 'k and max_km must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not math.isfinite(max_km) or max_km <= 0:
+            return Response({'error': 'max_km must be a positive number'}, status=status.HTTP_400_BAD_REQUEST)
+        max_km = min(max_km, NEARBY_MAX_KM)  # Beyond delivery range, and each doubling of the search costs a query
+
+        restaurants = Restaurant.objects.only(*NEARBY_RESTAURANT_FIELDS)
+        if request.GET.get('open_now', 'true').lower() not in ('0', 'false', 'no'):
+            restaurants = restaurants.filter(**open_at_lookup(timezone.now()))
+        results = []
+        for distance, restaurant in nearest(restaurants, address.latitude, address.longitude, k, max_km):
+            data = RestaurantSerializer(restaurant, fields=SEARCH_RESTAURANT_FIELDS).data
+            data['distance_km'] = round(distance, 2)
+            results.append(data)
+        return Response(results)
+
+    def get_dashboard_version(self):
+        return self.version_for(Restaurant.objects.filter(user=self.request.user.pk))
 
     @action(detail=False, methods=['get'])
     @permission_classes([IsAuthenticated])
     def dashboard(self, request):
-        restaurant = request.user.restaurant
+        restaurant = load_profile(request.user, 'restaurant')
         serializer = RestaurantSerializer(restaurant)
         return Response(serializer.data)
     
@@ -67,22 +266,60 @@ class RestaurantViewSet(viewsets.ModelViewSet):
     @permission_classes([IsAuthenticated])
     def getOrders(self, request, pk=None):
         try:
-            logger.info(pk)
-            orders = Order.objects.filter(restaurant=pk)
+            orders = OrderSerializer.setup_eager_loading(Order.objects.filter(restaurant=pk))
 
             serializer = OrderSerializer(orders, many=True)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Restaurant.DoesNotExist:
             return Response({'error': 'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
-        except Exception as e:
-            logger.error(f"Error fetching dishes for restaurant {pk}: {str(e)}")
+        except Exception:
+            logger.exception('Error fetching orders for restaurant %s', pk)
             return Response({'error': 'Failed to fetch dishes'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    @action(detail=True, methods=['get'], url_path='orders/summary', permission_classes=[IsAuthenticated])
+    def order_summaries(self, request, pk=None):
+        # Dashboard list from the narrow OrderSummary table; ?status=new,preparing filters, newest first
+        restaurant = getattr(request.user, 'restaurant', None)
+        if restaurant is None or str(restaurant.pk) != pk:
+            return Response({'error': 'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
+        summaries = OrderSummary.objects.filter(restaurant_id=restaurant.pk)
+        statuses = [s for value in request.query_params.getlist('status') for s in value.split(',') if s]
+        if statuses:
+            unknown = [s for s in statuses if s not in dict(Order.STATUS_CHOICES)]
+            if unknown:
+                raise ValidationError({'status': f'Unknown status: {", ".join(unknown)}'})
+            summaries = summaries.filter(status__in=statuses)
+
+        paginator = OrderHistoryCursorPagination()
+        page = paginator.paginate_queryset(summaries, request, view=self)
+        return paginator.get_paginated_response(OrderSummarySerializer(page, many=True).data)
+
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    def analytics(self, request, pk=None):
+        # Sales from the daily rollups: ?period=day|week|month&start=YYYY-MM-DD&end=YYYY-MM-DD (inclusive)
+        restaurant = getattr(request.user, 'restaurant', None)
+        if restaurant is None or str(restaurant.pk) != pk:
+            return Response({'error': 'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
+        period = request.query_params.get('period', 'day')
+        if period not in PERIODS:
+            raise ValidationError({'period': f'Expected one of: {", ".join(PERIODS)}'})
+        start, end = default_range()
+        try:
+            start = date.fromisoformat(request.query_params['start']) if request.query_params.get('start') else start
+            end = date.fromisoformat(request.query_params['end']) if request.query_params.get('end') else end
+        except ValueError:
+            raise ValidationError({'error': 'start and end must be YYYY-MM-DD dates'})
+        if start > end:
+            raise ValidationError({'error': 'start must not be after end'})
+        if (end - start).days >= MAX_RANGE_DAYS:
+            raise ValidationError({'error': f'At most {MAX_RANGE_DAYS} days per request'})
+        return Response(sales_report(restaurant.pk, start, end, period=period))
+
     @action(detail=False, methods=['patch'])
     @permission_classes([IsAuthenticated])
     def update_profile(self, request):
-        restaurant = request.user.restaurant
-        logger.info(request.data)
+        restaurant = load_profile(request.user, 'restaurant')
+        logger.info('Updating restaurant profile', extra={'restaurant_id': restaurant.id, 'fields': lazy(field_names, request.data)})
 
         for field in ['name', 'address', 'description', 'image', 'phone_number','opening_time','closing_time']:
             if field in request.data:
@@ -97,77 +334,88 @@ class RestaurantViewSet(viewsets.ModelViewSet):
     def add_dish(self, request):
         try:
             restaurant = request.user.restaurant  # Ensure this retrieves the correct restaurant instance
-            logger.info(f"Received data for new dish: {request.data}")
-            
             serializer = DishSerializer(data=request.data)
             
             if serializer.is_valid():
                 serializer.save(restaurant=restaurant)  # Associate dish with the restaurant
-                logger.info(f"Successfully added new dish: {serializer.data}")
+                logger.info('Added dish', extra={'restaurant_id': restaurant.id, 'dish_id': serializer.data['id']})
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             
-            logger.error(f"Failed to add dish. Errors: {serializer.errors}")
+            logger.warning('Failed to add dish', extra={'restaurant_id': restaurant.id, 'errors': serializer.errors})
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         except Exception as e:
-            logger.error(f"Exception occurred while adding dish: {str(e)}")
+            logger.exception('Exception occurred while adding dish')
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     @action(detail=True, methods=['get'])
     @permission_classes([IsAuthenticated])
     def list_dishes(self, request, pk=None):
         try:
-            restaurant = self.get_object()  # Get the restaurant instance by ID
-            dishes = restaurant.dishes.all()  # Fetch all dishes associated with this restaurant
-            serializer = DishSerializer(dishes, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except Restaurant.DoesNotExist:
+            if has_dish_filters(request.query_params):
+                # Filtered menus aren't cached; they are narrow index scans instead
+                if not Restaurant.objects.filter(pk=pk).exists():
+                    raise Restaurant.DoesNotExist
+                dishes = filter_dishes(Dish.objects.filter(restaurant_id=pk), request.query_params)
+                data = DishSerializer(dishes, many=True).data
+                if wants_facets(request.query_params):
+                    data = with_facets(data, dish_facets(dishes))
+                return Response(data, status=status.HTTP_200_OK)
+
+            # Menus are served from the menu cache as pre-rendered JSON; the database is only hit on a miss
+            entry = menu_cache.get_or_build(int(pk), lambda: self._render_menu(pk))
+            if is_not_modified(request, entry.etag, entry.last_modified):
+                response = HttpResponseNotModified()
+            else:
+                response = HttpResponse(entry.body, content_type='application/json')
+            response['ETag'] = entry.etag
+            response['Last-Modified'] = http_date(entry.last_modified)
+            return response
+        except (Restaurant.DoesNotExist, ValueError):
             return Response({'error': 'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
-        except Exception as e:
-            logger.error(f"Error fetching dishes for restaurant {pk}: {str(e)}")
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        except Exception:
+            logger.exception('Error fetching dishes for restaurant %s', pk)
             return Response({'error': 'Failed to fetch dishes'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @action(detail=False, methods=['post'])
-    def login(self, request):
-        username = request.data.get('username')
-        password = request.data.get('password')
-        logger.info(f"Login attempt for user: {username}")
-        user = authenticate(username=username, password=password)
-        if user:
-        # Check if the user has a related restaurant
-            if hasattr(user, 'restaurant'):
-              token, _ = Token.objects.get_or_create(user=user)
-              return Response({
-                'token': token.key,
-                'user_id': user.id,
-                'restaurant_id': user.restaurant.id,
-            })
-            else:
-                logger.warning(f"User {username} does not have an associated restaurant.")
-                return Response({'error': 'User does not have an associated restaurant'}, status=status.HTTP_400_BAD_REQUEST)
-        else:
-         logger.warning(f"Login failed for user: {username}")
-         return Response({'error': 'Invalid credentials'}, status=status.HTTP_400_BAD_REQUEST)
-        
-class DishViewSet(viewsets.ModelViewSet):
+    def _render_menu(self, pk):
+        restaurant = Restaurant.objects.get(pk=pk)  # Raises DoesNotExist, never cached
+        return render_menu(restaurant.dishes.all())  # Fetch all dishes associated with this restaurant
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def menu_cache_stats(self, request):
+        return Response(menu_cache.stats())
+
+class DishViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Dish.objects.all()
     serializer_class = DishSerializer
+    pagination_class = IdCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            # ?category=&is_vegan=&min_price=... (see restaurants.filters)
+            queryset = filter_dishes(queryset, self.request.query_params)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if wants_facets(request.query_params):
+            response.data = with_facets(response.data, dish_facets(self.get_queryset()))
+        return response
 
    
     @action(detail=False, methods=['post'])
     def createDish(self, request):
         restaurant_id = request.data.get('restaurant_id')
-        logger.info(restaurant_id)
         serializer = self.get_serializer(Dish.objects.filter(id= 1))
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
     @action(detail=False, methods=['get'])
     def getDish(self, request):
         dish_id = request.GET.get('dishId')
-        logger.info("dish id" + dish_id)
-
         dish = Dish.objects.filter(id=dish_id)
-        logger.info(dish.values())
 
         if(dish) :
             serializer = DishSerializer(dish, many=True)
@@ -177,14 +425,10 @@ class DishViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['put'])
     def editDish(self, request):
         dish_id = request.GET.get('dishId')
-        logger.info("Dish ID: " + str(dish_id))
 
         # Get the dish object or return a 404 if it doesn't exist
         dish = Dish.objects.filter(id=dish_id).first()
-        logger.info(request.data)
-        
-        # Log current dish data for debugging
-        logger.info("Current Dish Data: " + str(dish))
+        logger.info('Editing dish', extra={'dish_id': dish_id, 'fields': lazy(field_names, request.data)})
 
         # Update fields only if they are provided in the request
         for field in ['name', 'ingredients', 'description', 'price', 'category', 'image',]:
@@ -198,3 +442,74 @@ class DishViewSet(viewsets.ModelViewSet):
         serializer = DishSerializer(dish)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+
+
+# Async versions of the hottest reads. Under an ASGI server they run on the event loop:
+# queries go through the async ORM, and a cached token or menu never needs a thread.
+# Writes (and the browsable API) still go to the viewset actions they stand in for.
+
+@async_read_view(RestaurantViewSet.as_view({'get': 'list', 'post': 'create'}))
+async def restaurant_list(request):
+    fields = requested_fields(request.GET)
+    restaurants = only_requested(filter_open(Restaurant.objects.all(), request.GET), fields)
+    # "Open now" changes with the clock, not with the rows, so it can't be revalidated
+    stamp = None if 'open_now' in request.GET else await aversion_for(request, restaurants, many=True)
+    if stamp and is_not_modified(request, *stamp):
+        return with_validators(HttpResponseNotModified(), stamp)
+
+    paginator = IdCursorPagination()
+    # DRF's cursor paginator has no async API; its one query runs in a worker thread
+    page = await sync_to_async(paginator.paginate_queryset)(restaurants, Request(request))
+    context = {'request': request}
+    if page is None:
+        data = RestaurantSerializer([r async for r in restaurants], many=True, fields=fields, context=context).data
+    else:
+        data = paginator.get_paginated_response(RestaurantSerializer(page, many=True, fields=fields, context=context).data).data
+    return with_validators(render_json(data), stamp)
+
+
+@async_read_view(RestaurantViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}))
+async def restaurant_detail(request, pk):
+    fields = requested_fields(request.GET)
+    restaurants = only_requested(Restaurant.objects.filter(pk=pk), fields)
+    stamp = await aversion_for(request, restaurants)
+    if stamp is None:
+        raise Http404('No Restaurant matches the given query.')
+    if is_not_modified(request, *stamp):
+        return with_validators(HttpResponseNotModified(), stamp)
+    restaurant = await restaurants.aget()
+    return with_validators(render_json(RestaurantSerializer(restaurant, fields=fields, context={'request': request}).data), stamp)
+
+
+async def arender_menu(pk):
+    restaurant = await Restaurant.objects.aget(pk=pk)  # Raises DoesNotExist, never cached
+    return render_menu([dish async for dish in restaurant.dishes.all()])
+
+
+@async_read_view(RestaurantViewSet.as_view({'get': 'list_dishes'}))
+async def restaurant_menu(request, pk):
+    try:
+        if has_dish_filters(request.GET):
+            if not await Restaurant.objects.filter(pk=pk).aexists():
+                raise Restaurant.DoesNotExist
+            dishes = filter_dishes(Dish.objects.filter(restaurant_id=pk), request.GET)
+            data = DishSerializer([dish async for dish in dishes], many=True).data
+            if wants_facets(request.GET):
+                data = with_facets(data, await sync_to_async(dish_facets)(dishes))
+            return render_json(data)
+
+        entry = await menu_cache.aget_or_build(pk, lambda: arender_menu(pk))
+        if is_not_modified(request, entry.etag, entry.last_modified):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(entry.body, content_type='application/json')
+        response['ETag'] = entry.etag
+        response['Last-Modified'] = http_date(entry.last_modified)
+        return response
+    except Restaurant.DoesNotExist:
+        return render_json({'error': 'Restaurant not found'}, status.HTTP_404_NOT_FOUND)
+    except ValidationError:
+        raise
+    except Exception:
+        logger.exception('Error fetching dishes for restaurant %s', pk)
+        return render_json({'error': 'Failed to fetch dishes'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -13,4 +13,28 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uber_eats_backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up
+from django.conf import settings  # noqa: E402
+from customers.streams import order_stream  # noqa: E402
+from uber_eats_backend.async_views import AsyncReadViewsHandler  # noqa: E402
+from uber_eats_backend.media import serve_media_asgi  # noqa: E402
+
+if settings.ASYNC_READ_VIEWS:
+    django_application = AsyncReadViewsHandler()
+
+# Long-lived streams bypass the Django request cycle; everything else goes to Django
+STREAM_ROUTES = {
+    '/api/stream/orders/': order_stream,
+}
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] in STREAM_ROUTES:
+        await STREAM_ROUTES[scope['path']](scope, receive, send)
+    elif scope['type'] == 'http' and scope['path'].startswith(settings.MEDIA_URL):
+        # Uploaded images are answered here, without middleware or a worker thread per request
+        await serve_media_asgi(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,17 @@
+# The project URLconf with async views answering GETs of the hottest reads.
+# Only AsyncReadViewsHandler resolves against it (ASGI with ASYNC_READ_VIEWS on);
+# the async views hand every other method back to the viewsets.
+from django.urls import path
+
+from customers.views import cart_items, order_detail
+from restaurants.views import restaurant_detail, restaurant_list, restaurant_menu
+from .urls import urlpatterns as viewset_urlpatterns
+
+urlpatterns = [
+    path('api/restaurants/', restaurant_list, name='restaurant-list'),  # URL for listing restaurants
+    path('api/restaurants/<int:pk>/', restaurant_detail, name='restaurant-detail'),  # URL for retrieving a specific restaurant by ID
+    path('api/restaurants/<int:pk>/dishes/', restaurant_menu, name='restaurant-dishes'),  # URL for listing dishes of a specific restaurant
+    path('api/cart-items/', cart_items, name='cart-item-list'),  # URL for the customer's open cart
+    path('api/orders/getOrderDetail/', order_detail, name='order-getOrderDetail'),  # URL for one order with its items
+    *viewset_urlpatterns,
+]
@@ -0,0 +1,73 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.handlers.asgi import ASGIHandler
+from django.http import Http404, HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+
+from customers.authentication import CachedTokenAuthentication
+
+# URLconf with the async views mounted ahead of the viewsets they stand in for
+ASYNC_URLCONF = 'uber_eats_backend.asgi_urls'
+
+
+def render_json(data, status=200):
+    # Byte for byte what DRF's JSONRenderer sends for the same data
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def error_response(exc):
+    # DRF's exception handler, for the exceptions the async views raise
+    if isinstance(exc, Http404):
+        exc = exceptions.NotFound(*exc.args)
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = render_json(data, exc.status_code)
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        response['WWW-Authenticate'] = 'Token'
+    return response
+
+
+def async_read_view(fallback, login_required=False):
+    """Serve GETs of a DRF endpoint with an async view; everything else goes to `fallback`.
+
+    `fallback` is the viewset view the async one stands in for. It still
+    answers writes and the browsable API (in a worker thread). Before the
+    view runs, request.user is set from the token as DRF would, and DRF
+    exceptions become DRF's JSON errors.
+    """
+    authentication = CachedTokenAuthentication()
+    sync_fallback = sync_to_async(fallback)
+
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or 'text/html' in request.headers.get('Accept', ''):
+                return await sync_fallback(request, *args, **kwargs)
+            try:
+                forced = getattr(request, '_force_auth_user', None), getattr(request, '_force_auth_token', None)
+                if any(forced):
+                    # APIClient.force_authenticate(), which DRF's Request honours too
+                    user_auth = forced
+                else:
+                    user_auth = await authentication.aauthenticate(request)
+                request.user, request.auth = user_auth if user_auth and user_auth[0] else (AnonymousUser(), None)
+                if login_required and not request.user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                return await view(request, *args, **kwargs)
+            except (exceptions.APIException, Http404) as e:
+                return error_response(e)
+
+        return csrf_exempt(wrapper)  # Like every DRF view; token auth isn't open to CSRF
+    return decorator
+
+
+class AsyncReadViewsHandler(ASGIHandler):
+    # Django's ASGI handler resolving every request against ASYNC_URLCONF
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = ASYNC_URLCONF
+        return request, error_response
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import platform
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+# One endpoint under load. request(i) gives the (method, path, body) of the i-th timed
+# request; prepare(i), when set, gives requests sent untimed beforehand (e.g. filling
+# the cart a place_order will empty), so the timings only cover the endpoint itself.
+Scenario = namedtuple('Scenario', ['name', 'request', 'prepare'], defaults=[None])
+
+# Metrics where higher is worse, compared with a relative tolerance
+LATENCY_METRICS = ['p50_ms', 'p95_ms', 'p99_ms']
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percent / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def allow_test_host():
+    # Django's test clients send Host: testserver, which ALLOWED_HOSTS rejects outside the test runner
+    return override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'])
+
+
+class ClientTransport:
+    """Requests through Django's test client, in process, counting SQL queries."""
+
+    counts_queries = True
+
+    def __init__(self, token):
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+
+    def send(self, method, path, body=None):
+        with allow_test_host():
+            if method == 'GET':
+                response = self.client.get(path)
+            else:
+                response = self.client.generic(method, path, json.dumps(body or {}), content_type='application/json')
+        return response.status_code
+
+
+class HttpTransport:
+    """Requests over HTTP to a running server (runserver, gunicorn, uvicorn). Queries aren't visible."""
+
+    counts_queries = False
+
+    def __init__(self, token, base_url):
+        self.headers = {'Authorization': f'Token {token}', 'Content-Type': 'application/json'}
+        self.base_url = base_url.rstrip('/')
+
+    def send(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, headers=self.headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+def run_scenario(scenario, transports, requests, concurrency=1, warmup=5):
+    """Time `requests` requests of a scenario and summarize them.
+
+    Request i goes out on transports[i % len(transports)], i.e. as that user.
+    With concurrency above 1, that many threads keep requests in flight
+    (HTTP transports only; the test client shares one connection).
+    """
+    if scenario.prepare:
+        for i in range(warmup + requests):
+            for method, path, body in scenario.prepare(i):
+                transports[i % len(transports)].send(method, path, body)
+    # Warm caches (tokens, menus, compiled plans) on requests that aren't counted
+    for i in range(warmup):
+        transports[i % len(transports)].send(*scenario.request(i))
+
+    timings, errors, queries = [], 0, 0
+    lock = threading.Lock()
+
+    def timed(i):
+        nonlocal errors, queries
+        i += warmup
+        transport = transports[i % len(transports)]
+        if transport.counts_queries:
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                status = transport.send(*scenario.request(i))
+                elapsed = time.perf_counter() - start
+        else:
+            captured = ()
+            start = time.perf_counter()
+            status = transport.send(*scenario.request(i))
+            elapsed = time.perf_counter() - start
+        with lock:
+            timings.append(elapsed * 1000)
+            queries += len(captured)
+            errors += status >= 400
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(timed, range(requests)))
+    else:
+        for i in range(requests):
+            timed(i)
+    wall = time.perf_counter() - started
+    return summarize(timings, errors, wall, queries if transports[0].counts_queries else None)
+
+
+def summarize(timings, errors, wall, queries=None):
+    # `timings` in milliseconds, `wall` in seconds; queries is None when they weren't counted
+    timings = sorted(timings)
+    requests = len(timings)
+    return {
+        'requests': requests,
+        'errors': errors,
+        'throughput_rps': round(requests / wall, 1) if wall else 0.0,
+        'mean_ms': round(sum(timings) / requests, 2) if timings else 0.0,
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'p99_ms': round(percentile(timings, 99), 2),
+        'max_ms': round(timings[-1], 2) if timings else 0.0,
+        'queries_per_request': round(queries / requests, 2) if queries is not None and requests else None,
+    }
+
+
+async def asgi_request(application, method, path, headers=()):
+    """Send one bodiless request through an ASGI application in process, as a server would; returns the status.
+
+    Unlike AsyncClient this goes through the application's own entry point,
+    so Django's ASGIHandler gives every request its own thread for sync code.
+    """
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method, 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', b'testserver'), *headers], 'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    received = False
+    status = None
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client never disconnects; the handler cancels this wait once it has responded
+        await asyncio.Future()
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await application(scope, receive, send)
+    return status
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment():
+    # Enough to tell apart results that aren't comparable (other machine, other database)
+    return {
+        'revision': git_revision(),
+        'timestamp': timezone.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.machine(),
+    }
+
+
+def compare_results(baseline, current, tolerance=0.25):
+    """Regressions of `current` against `baseline`, as readable lines; empty when there are none.
+
+    Latency percentiles may grow by `tolerance` (a fraction) and throughput
+    shrink by as much, which absorbs timing noise. Query counts are
+    deterministic, so any increase is a regression. Scenarios missing from
+    either side are skipped.
+    """
+    regressions = []
+    for name, now in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        for metric in LATENCY_METRICS:
+            if before.get(metric) and now[metric] > before[metric] * (1 + tolerance):
+                regressions.append(f'{name}: {metric} {before[metric]} -> {now[metric]} (+{now[metric] / before[metric] - 1:.0%})')
+        if before.get('throughput_rps') and now['throughput_rps'] < before['throughput_rps'] * (1 - tolerance):
+            regressions.append(f'{name}: throughput_rps {before["throughput_rps"]} -> {now["throughput_rps"]}')
+        if before.get('queries_per_request') is not None and now['queries_per_request'] is not None \
+                and now['queries_per_request'] > before['queries_per_request']:
+            regressions.append(f'{name}: queries_per_request {before["queries_per_request"]} -> {now["queries_per_request"]}')
+        if now['errors'] > before.get('errors', 0):
+            regressions.append(f'{name}: errors {before.get("errors", 0)} -> {now["errors"]}')
+    return regressions
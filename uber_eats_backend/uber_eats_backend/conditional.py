@@ -0,0 +1,118 @@
+import hashlib
+from collections import namedtuple
+
+from django.db.models import Count, Max
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+# etag is the quoted validator; last_modified is a POSIX timestamp, or None when
+# the stamp can change without any row getting newer (e.g. a list losing a row)
+VersionStamp = namedtuple('VersionStamp', ['etag', 'last_modified'])
+
+
+def is_not_modified(request, etag, last_modified=None):
+    return headers_not_modified(request.headers, etag, last_modified)
+
+
+def headers_not_modified(headers, etag, last_modified=None):
+    # If-None-Match wins over If-Modified-Since, as in RFC 9110
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match:
+        # Weak comparison: W/"x" and "x" match
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return '*' in tags or etag.removeprefix('W/') in tags
+    if_modified_since = parse_http_date_safe(headers.get('If-Modified-Since') or '')
+    return bool(last_modified and if_modified_since and int(last_modified) <= if_modified_since)
+
+
+class NotModified(Exception):
+    pass
+
+
+class ConditionalGetMixin:
+    """Answer GETs with 304 Not Modified before any serializer runs.
+
+    The version of what a GET would return is computed from the `updated_at`
+    columns with one aggregate query. `list` and `retrieve` are covered by
+    default; a custom action opts in by defining `get_<action>_version()`
+    returning a VersionStamp (or None to skip the check).
+    """
+
+    # Timestamp columns (relative to the viewset's model) folded into the version stamp
+    version_fields = ['updated_at']
+
+    def initial(self, request, *args, **kwargs):
+        # Authentication and permissions run first, so a 304 never leaks anything
+        super().initial(request, *args, **kwargs)
+        self.version_stamp = None
+        if request.method not in ('GET', 'HEAD'):
+            return
+        get_version = getattr(self, f'get_{self.action}_version', None)
+        if get_version is None:
+            return
+        self.version_stamp = get_version()
+        if self.version_stamp and is_not_modified(request, *self.version_stamp):
+            raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        return with_validators(response, getattr(self, 'version_stamp', None))
+
+    def get_list_version(self):
+        return self.version_for(self.filter_queryset(self.get_queryset()), many=True)
+
+    def get_retrieve_version(self):
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        if lookup not in self.kwargs:
+            return None
+        return self.version_for(self.get_queryset().filter(**{self.lookup_field: self.kwargs[lookup]}))
+
+    def version_for(self, queryset, many=False):
+        # Prefetches are pointless for an aggregate, drop them
+        fields = _version_aggregates(self.version_fields)
+        stamps = queryset.prefetch_related(None).aggregate(**fields)
+        return _version_stamp(self.request, stamps, fields, many)
+
+
+async def aversion_for(request, queryset, version_fields=('updated_at',), many=False):
+    """ConditionalGetMixin.version_for for async views, with the same ETags."""
+    fields = _version_aggregates(version_fields)
+    stamps = await queryset.prefetch_related(None).aaggregate(**fields)
+    return _version_stamp(request, stamps, fields, many)
+
+
+def with_validators(response, stamp):
+    if stamp and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+        response['ETag'] = stamp.etag
+        if stamp.last_modified:
+            response['Last-Modified'] = http_date(stamp.last_modified)
+    return response
+
+
+def _version_aggregates(version_fields):
+    # Count and highest id catch inserts and deletes, the timestamps catch updates
+    return {
+        'count': Count('pk', distinct=True), 'max_pk': Max('pk'),
+        **{f'updated_{index}': Max(field) for index, field in enumerate(version_fields)},
+    }
+
+
+def _version_stamp(request, stamps, fields, many):
+    if not many and not stamps['count']:
+        return None  # Nothing to retrieve, let the view answer 404
+    timestamps = [stamps[key] for key in fields if key.startswith('updated_') and stamps[key]]
+    last_modified = max(timestamps).timestamp() if timestamps else None
+
+    # Whatever else shapes the response goes into the tag too: the user and the query string
+    token = '|'.join([
+        request.get_full_path(), str(request.user.pk),
+        *[str(stamps[key]) for key in fields],
+    ])
+    etag = 'W/"%s"' % hashlib.md5(token.encode(), usedforsecurity=False).hexdigest()
+    return VersionStamp(etag, None if many else last_modified)
@@ -0,0 +1,224 @@
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_init, post_save, pre_save
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# Derivatives stored next to the uploads, under content-hashed names
+VARIANTS_DIR = 'variants'
+
+# name -> (width, height). Both set: a centre-cropped thumbnail of exactly that size.
+# Height None: a responsive variant at that width, skipped when the original is narrower.
+VARIANTS = {
+    'thumb': (160, 160),
+    'card': (480, 320),
+    'w480': (480, None),
+    'w960': (960, None),
+    'w1600': (1600, None),
+}
+
+# format name -> (file extension, Pillow format, save options)
+FORMATS = {
+    'webp': ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def _setup_worker(niceness):
+    # Lower priority, so on a busy host the CPU goes to serving requests before resizing
+    if niceness and hasattr(os, 'nice'):
+        os.nice(niceness)
+    # Spawned workers start from a fresh interpreter, so load the settings (for the storage) first
+    import django
+    django.setup()
+
+
+def _resize(image, width, height):
+    from PIL import Image, ImageOps
+    if height is not None:
+        return ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+    resized = image.copy()
+    resized.thumbnail((width, image.height), Image.Resampling.LANCZOS)
+    return resized
+
+
+def _encode(image, pil_format, options):
+    from PIL import Image
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        # No alpha in JPEG; flatten transparent logos onto white rather than black
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def _store(data, extension):
+    # Same bytes, same name: re-uploads and identical images share one file
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    name = f'{VARIANTS_DIR}/{digest[:2]}/{digest}.{extension}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    return name
+
+
+def render_variants(source_name):
+    """Decode an uploaded image and write every variant in every format.
+
+    Runs in a pool worker. Returns {variant: {'width', 'height', format: name}}.
+    """
+    from django.core.files.storage import default_storage
+    from PIL import Image, ImageOps
+    with default_storage.open(source_name) as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)  # Phone photos are often stored sideways
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    variants = {}
+    for name, (width, height) in VARIANTS.items():
+        if height is None and image.width < width:
+            continue  # Never upscale; clients fall back to the next size down
+        resized = _resize(image, width, height)
+        variant = {'width': resized.width, 'height': resized.height}
+        for format_name, (extension, pil_format, options) in FORMATS.items():
+            variant[format_name] = _store(_encode(resized, pil_format, options), extension)
+        variants[name] = variant
+    return variants
+
+
+class ImagePool:
+    """Process pool that renders image variants off the request path.
+
+    Jobs are submitted once the upload is committed and their results are
+    written back from the pool's callback thread, so a request never waits
+    on decoding. workers=0 renders inline instead (tests, management commands).
+    """
+
+    def __init__(self, workers=1, niceness=10):
+        self.workers = workers
+        self.niceness = niceness
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_setup_worker,
+                    initargs=(self.niceness,),
+                )
+            return self._executor
+
+    def submit(self, model, pk, field_name, variants_field, source_name):
+        if not self.workers:
+            try:
+                variants = render_variants(source_name)
+            except Exception:
+                logger.exception('Could not render variants of %s', source_name)
+                return
+            apply_variants(model, pk, field_name, variants_field, source_name, variants)
+            return
+        future = self.executor().submit(render_variants, source_name)
+        future.add_done_callback(lambda f: self._finished(f, model, pk, field_name, variants_field, source_name))
+
+    def _finished(self, future, model, pk, field_name, variants_field, source_name):
+        # Runs on the executor's management thread, which has its own database connection
+        try:
+            variants = future.result()
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory on a huge image); start a fresh pool for the next upload
+            logger.exception('Image worker died while rendering %s', source_name)
+            with self._lock:
+                if self._executor is not None and self._executor._broken:
+                    self._executor = None
+            return
+        except Exception:
+            logger.exception('Could not render variants of %s', source_name)
+            return
+        try:
+            apply_variants(model, pk, field_name, variants_field, source_name, variants)
+        except Exception:
+            logger.exception('Could not save variants of %s', source_name)
+        finally:
+            connection.close()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+image_pool = ImagePool(**getattr(settings, 'IMAGE_VARIANTS_POOL', {}))
+
+
+def apply_variants(model, pk, field_name, variants_field, source_name, variants):
+    # Saved through the model so the usual post_save invalidation (menus, cached identities) runs
+    instance = model._default_manager.filter(pk=pk).first()
+    if instance is None or getattr(instance, field_name).name != source_name:
+        return  # Deleted, or a newer upload replaced the image while this one rendered
+    setattr(instance, variants_field, variants)
+    instance.save(update_fields=[variants_field, 'updated_at'])
+
+
+def track_image(model, field_name, variants_field):
+    """Render variants of `model.<field_name>` into `<variants_field>` whenever a new image is saved."""
+    attribute = f'_loaded_{field_name}'
+
+    def remember_image(sender, instance, **kwargs):
+        # Deferred (.only()) loads don't track the image; they don't save it either
+        if field_name in instance.__dict__:
+            instance.__dict__[attribute] = getattr(instance, field_name).name
+
+    def image_changed(instance):
+        return attribute in instance.__dict__ and getattr(instance, field_name).name != instance.__dict__[attribute]
+
+    def clear_stale_variants(sender, instance, **kwargs):
+        # The old variants show the old picture; clients use the original until the new ones are ready
+        if image_changed(instance) and getattr(instance, variants_field):
+            setattr(instance, variants_field, None)
+
+    def schedule_variants(sender, instance, created=False, raw=False, **kwargs):
+        if raw or not (created or image_changed(instance)):
+            return
+        name = instance.__dict__[attribute] = getattr(instance, field_name).name
+        if name:
+            # Only once committed: the worker reads the file and the row from outside this transaction
+            pk = instance.pk
+            transaction.on_commit(lambda: image_pool.submit(model, pk, field_name, variants_field, name))
+
+    uid = f'{model._meta.label}.{field_name}'
+    post_init.connect(remember_image, sender=model, weak=False, dispatch_uid=f'{uid}.remember')
+    pre_save.connect(clear_stale_variants, sender=model, weak=False, dispatch_uid=f'{uid}.clear')
+    post_save.connect(schedule_variants, sender=model, weak=False, dispatch_uid=f'{uid}.schedule')
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Variant names as URLs, absolute when the serializer has the request."""
+
+    def to_representation(self, value):
+        from django.core.files.storage import default_storage
+        request = self.context.get('request')
+        variants = {}
+        for name, variant in (value or {}).items():
+            variants[name] = {
+                key: (request.build_absolute_uri(default_storage.url(item)) if request else default_storage.url(item))
+                if key in FORMATS else item
+                for key, item in variant.items()
+            }
+        return variants
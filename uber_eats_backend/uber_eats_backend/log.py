@@ -0,0 +1,131 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else on a record came in through `extra`
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class Lazy:
+    """A log argument computed only if the record is actually emitted.
+
+    `logger.info('Cart for %s', lazy(describe, cart))` costs nothing when
+    INFO is off or the record is sampled out.
+    """
+
+    __slots__ = ('fn', 'args', 'kwargs')
+
+    def __init__(self, fn, *args, **kwargs):
+        self.fn, self.args, self.kwargs = fn, args, kwargs
+
+    def __str__(self):
+        return str(self.fn(*self.args, **self.kwargs))
+
+    __repr__ = __str__
+
+
+lazy = Lazy
+
+
+def field_names(data):
+    # What a payload contained, without the values (passwords, addresses, images)
+    return sorted(data) if hasattr(data, 'keys') else type(data).__name__
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps `rate` of the records at or below `max_level`; more severe records always pass."""
+
+    def __init__(self, rate=1.0, max_level='INFO'):
+        super().__init__()
+        self.rate = float(rate)
+        self.max_level = logging.getLevelName(max_level) if isinstance(max_level, str) else max_level
+
+    def filter(self, record):
+        return record.levelno > self.max_level or self.rate >= 1 or random.random() < self.rate
+
+
+class StructuredFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any `extra` fields."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in STANDARD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class AsyncQueueHandler(QueueHandler):
+    """Hands records to a background QueueListener thread that does the formatting and writing.
+
+    The request thread only merges the message (evaluating lazy arguments)
+    and enqueues it; when the queue is full the record is dropped and
+    counted rather than blocking the request.
+    """
+
+    def __init__(self, stream=None, queue_size=10_000):
+        super().__init__(queue.Queue(queue_size))
+        self.dropped = 0
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def setFormatter(self, fmt):
+        # The formatter runs in the listener thread, on the target
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Resolve everything that depends on request-time state before leaving the request thread
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        for key, value in vars(record).items():
+            if isinstance(value, Lazy):
+                setattr(record, key, str(value))
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        # Flushes what's queued; safe to call more than once (atexit, then logging.shutdown)
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def close(self):
+        self.stop()
+        super().close()
+
+
+def parse_levels(value):
+    # "customers=DEBUG,django.db.backends=WARNING" -> {'customers': 'DEBUG', ...}
+    levels = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        name, _, level = item.partition('=')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def logger_levels(defaults, env_var='DJANGO_LOG_LEVELS'):
+    # dictConfig `loggers` from per-module defaults, overridden by the environment
+    levels = {**defaults, **parse_levels(os.environ.get(env_var))}
+    return {name: {'level': level} for name, level in levels.items()}
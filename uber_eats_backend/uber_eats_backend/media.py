@@ -0,0 +1,196 @@
+import asyncio
+import mimetypes
+import os
+import stat
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse, HttpResponseNotAllowed
+from django.utils._os import safe_join
+from django.utils.datastructures import CaseInsensitiveMapping
+from django.utils.http import http_date
+
+from .conditional import headers_not_modified
+from .images import VARIANTS_DIR
+
+MEDIA_SERVING = {
+    'offload': None,  # 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache, lighttpd) to hand the bytes to the proxy
+    'accel_prefix': '/protected-media/',  # nginx `internal` location aliased to MEDIA_ROOT
+    'immutable_prefixes': [f'{VARIANTS_DIR}/'],  # Content-hashed names; a new image always gets a new URL
+    'max_age': 3600,  # Everything else is cached this long, then revalidated with its ETag
+    **getattr(settings, 'MEDIA_SERVING', {}),
+}
+# Bytes read per chunk when a range or the ASGI app streams a file
+CHUNK_SIZE = 256 * 1024
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# What to send for a media request: headers always; the body is `length` bytes of
+# `path` from `start`, or nothing when path is None (304, 404, 416, offloaded)
+MediaResponse = namedtuple('MediaResponse', ['status', 'headers', 'path', 'start', 'length'])
+
+
+def parse_range(header, size):
+    """(start, length) for a single `bytes=` range, None to send the whole file.
+
+    Raises ValueError when the range can't be satisfied. Malformed and
+    multi-range headers are ignored, which RFC 9110 allows.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, _, last = spec.strip().partition('-')
+    if not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+    if not first:
+        # bytes=-500: the last 500 bytes
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise ValueError('Empty suffix range')
+        start = max(0, size - suffix)
+        return start, size - start
+    start, end = int(first), int(last) if last else size - 1
+    if last and end < start:
+        return None
+    if start >= size:
+        raise ValueError('Range starts past the end of the file')
+    return start, min(end, size - 1) - start + 1
+
+
+def plan_media_response(name, headers):
+    """Work out the response to a GET for MEDIA_ROOT/<name> from the request headers.
+
+    Shared by the WSGI view and the ASGI app, so both answer conditional and
+    range requests identically.
+    """
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+        info = os.stat(path)
+    except (SuspiciousFileOperation, OSError):
+        return MediaResponse(404, {'Content-Length': '0'}, None, 0, 0)
+    if not stat.S_ISREG(info.st_mode):
+        return MediaResponse(404, {'Content-Length': '0'}, None, 0, 0)
+
+    etag = f'"{info.st_mtime_ns:x}-{info.st_size:x}"'
+    last_modified = http_date(info.st_mtime)
+    immutable = any(name.startswith(prefix) for prefix in MEDIA_SERVING['immutable_prefixes'])
+    response_headers = {
+        'ETag': etag,
+        'Last-Modified': last_modified,
+        'Cache-Control': IMMUTABLE if immutable else f'public, max-age={MEDIA_SERVING["max_age"]}',
+        'Accept-Ranges': 'bytes',
+    }
+    if headers_not_modified(headers, etag, info.st_mtime):
+        return MediaResponse(304, response_headers, None, 0, 0)
+
+    content_type, encoding = mimetypes.guess_type(path)
+    response_headers['Content-Type'] = content_type or 'application/octet-stream'
+    if encoding:
+        response_headers['Content-Encoding'] = encoding
+    response_headers['X-Content-Type-Options'] = 'nosniff'
+
+    offload = MEDIA_SERVING['offload']
+    if offload == 'x-accel-redirect':
+        # nginx serves the file itself, ranges included; no Content-Length, nginx sets it
+        response_headers['X-Accel-Redirect'] = MEDIA_SERVING['accel_prefix'] + name
+        return MediaResponse(200, response_headers, None, 0, 0)
+    if offload == 'x-sendfile':
+        response_headers['X-Sendfile'] = path
+        return MediaResponse(200, response_headers, None, 0, 0)
+
+    size = info.st_size
+    byte_range = None
+    if_range = headers.get('If-Range')
+    # A Range is only honoured if the client's copy (If-Range) is still current
+    if headers.get('Range') and (not if_range or if_range in (etag, last_modified)):
+        try:
+            byte_range = parse_range(headers['Range'], size)
+        except ValueError:
+            response_headers.update({'Content-Range': f'bytes */{size}', 'Content-Length': '0'})
+            return MediaResponse(416, response_headers, None, 0, 0)
+    if byte_range is None:
+        response_headers['Content-Length'] = str(size)
+        return MediaResponse(200, response_headers, path, 0, size)
+    start, length = byte_range
+    response_headers['Content-Range'] = f'bytes {start}-{start + length - 1}/{size}'
+    response_headers['Content-Length'] = str(length)
+    return MediaResponse(206, response_headers, path, start, length)
+
+
+class FileRange:
+    """Read-only view of `length` bytes of an open file, for FileResponse."""
+
+    def __init__(self, file, length):
+        self.file, self.remaining = file, length
+
+    def read(self, size=-1):
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def serve_media(request, path):
+    """Serve an uploaded file with ETag revalidation, byte ranges and long-lived caching.
+
+    Whole files go out as a FileResponse, which WSGI servers send with
+    sendfile(); with MEDIA_SERVING['offload'] set the proxy sends the bytes.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    plan = plan_media_response(path, request.headers)
+    if plan.path is None or request.method == 'HEAD':
+        response = HttpResponse(status=plan.status)
+    else:
+        file = open(plan.path, 'rb')
+        file.seek(plan.start)
+        if plan.start + plan.length == os.fstat(file.fileno()).st_size:
+            # Runs to the end of the file, so the server's file_wrapper can sendfile() it
+            response = FileResponse(file, status=plan.status)
+        else:
+            response = FileResponse(FileRange(file, plan.length), status=plan.status)
+        response.block_size = CHUNK_SIZE
+    for header, value in plan.headers.items():
+        response[header] = value
+    return response
+
+
+async def serve_media_asgi(scope, receive, send):
+    """ASGI app for MEDIA_URL, answering without the Django request cycle.
+
+    No middleware, no thread per request: the file is read in chunks off the
+    event loop, or handed over whole when the server supports the
+    `http.response.zerocopysend` extension.
+    """
+    method = scope['method']
+    if method not in ('GET', 'HEAD'):
+        await send({'type': 'http.response.start', 'status': 405, 'headers': [(b'allow', b'GET, HEAD')]})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+    name = scope['path'][len(settings.MEDIA_URL):]
+    headers = CaseInsensitiveMapping({key.decode('latin-1'): value.decode('latin-1') for key, value in scope['headers']})
+    plan = plan_media_response(name, headers)
+    await send({'type': 'http.response.start', 'status': plan.status, 'headers': [
+        (header.lower().encode('latin-1'), value.encode('latin-1')) for header, value in plan.headers.items()
+    ]})
+    if plan.path is None or method == 'HEAD':
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    with open(plan.path, 'rb') as file:
+        if 'http.response.zerocopysend' in scope.get('extensions', {}):
+            await send({'type': 'http.response.zerocopysend', 'file': file, 'offset': plan.start, 'count': plan.length})
+            return
+        file.seek(plan.start)
+        remaining = plan.length
+        while remaining:
+            chunk = await asyncio.to_thread(file.read, min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break  # Truncated while we were sending
+            remaining -= len(chunk)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': bool(remaining)})
+        if remaining:
+            await send({'type': 'http.response.body', 'body': b''})
@@ -0,0 +1,262 @@
+import heapq
+import logging
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+METRICS_SETTINGS = {
+    'slow_request_seconds': 1.0,  # None turns the slow-request log off
+    'slow_request_queries': 5,  # How many of the slowest statements a slow-request line shows
+    'allowed_ips': ['127.0.0.1', '::1'],  # Who may read /metrics; None for anyone
+    **getattr(settings, 'REQUEST_METRICS', {}),
+}
+# SQL statements remembered per request for the slow-request log
+MAX_RECORDED_QUERIES = 200
+# Scrapes of /metrics aren't recorded themselves
+METRICS_ENDPOINT = 'uber_eats_backend.metrics.metrics'
+
+
+class Histogram:
+    """Log-linear histogram in the spirit of HdrHistogram.
+
+    Each power of two between `lowest` and `highest` is split into
+    `sub_buckets` buckets, so the relative error is the same at every scale
+    and memory is fixed however many values are recorded.
+    """
+
+    def __init__(self, lowest, highest, sub_buckets=2, zero_bucket=False):
+        steps = math.ceil(math.log2(highest / lowest) * sub_buckets)
+        self.bounds = ([0] if zero_bucket else []) + [lowest * 2 ** (i / sub_buckets) for i in range(steps + 1)]
+        self.counts = [0] * (len(self.bounds) + 1)  # The last one is +Inf
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, percent):
+        # Upper bound of the bucket holding the given percentile (None when empty)
+        if not self.count:
+            return None
+        rank, seen = math.ceil(self.count * percent / 100), 0
+        for bound, count in zip(self.bounds + [math.inf], self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return math.inf
+
+
+# name -> (help, histogram factory, RequestStats attribute)
+METRICS = {
+    'http_request_duration_seconds': ('Wall time per request', lambda: Histogram(0.0005, 60), 'duration'),
+    'http_request_db_queries': ('Database queries per request', lambda: Histogram(1, 1024, sub_buckets=1, zero_bucket=True), 'queries'),
+    'http_request_db_seconds': ('Time spent in the database per request', lambda: Histogram(0.0001, 60), 'db_seconds'),
+    'http_request_serializer_seconds': ('Time spent in DRF serializers per request', lambda: Histogram(0.0001, 60), 'serializer_seconds'),
+    'http_response_size_bytes': ('Response body size', lambda: Histogram(64, 16 * 1024 * 1024, sub_buckets=1, zero_bucket=True), 'response_bytes'),
+}
+
+
+class RequestStats:
+    __slots__ = ('duration', 'queries', 'db_seconds', 'serializer_seconds', 'response_bytes', 'statements', 'serializing')
+
+    def __init__(self):
+        self.duration = None
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.response_bytes = None
+        self.statements = []  # (seconds, sql), only while the slow-request log is on
+        self.serializing = False
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.endpoints = {}  # endpoint -> {metric name: Histogram}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, stats):
+        with self._lock:
+            histograms = self.endpoints.get(endpoint)
+            if histograms is None:
+                histograms = self.endpoints[endpoint] = {name: factory() for name, (_, factory, _) in METRICS.items()}
+            for name, (_, _, attribute) in METRICS.items():
+                value = getattr(stats, attribute)
+                if value is not None:
+                    histograms[name].observe(value)
+
+    def histogram(self, endpoint, name):
+        return self.endpoints.get(endpoint, {}).get(name)
+
+    def clear(self):
+        with self._lock:
+            self.endpoints.clear()
+
+    def render(self):
+        """The Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            snapshot = {
+                endpoint: {name: (h.bounds, list(h.counts), h.count, h.sum) for name, h in histograms.items()}
+                for endpoint, histograms in self.endpoints.items()
+            }
+        lines = []
+        for name, (help_text, _, _) in METRICS.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+            for endpoint, histograms in sorted(snapshot.items()):
+                bounds, counts, count, total = histograms[name]
+                label = endpoint.replace('\\', '\\\\').replace('"', '\\"')
+                cumulative = 0
+                for bound, bucket in zip(bounds + [math.inf], counts):
+                    cumulative += bucket
+                    le = '+Inf' if bound == math.inf else f'{bound:.6g}'
+                    lines.append(f'{name}_bucket{{endpoint="{label}",le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{endpoint="{label}"}} {total:.6g}')
+                lines.append(f'{name}_count{{endpoint="{label}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+# The stats of the request being handled; context-local, so it follows async code and sync_to_async threads
+current_stats = ContextVar('request_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    # Installed on every connection; a no-op outside an instrumented request
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if METRICS_SETTINGS['slow_request_seconds'] is not None and len(stats.statements) < MAX_RECORDED_QUERIES:
+            stats.statements.append((elapsed, sql))
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+def instrument_serializers():
+    """Time every top-level `serializer.data`, the one place DRF turns instances into primitives."""
+    data = serializers.BaseSerializer.data
+    if getattr(data.fget, 'instrumented', False):
+        return
+
+    def timed_data(serializer):
+        stats = current_stats.get()
+        if stats is None or stats.serializing:
+            return data.fget(serializer)
+        stats.serializing = True
+        started = time.perf_counter()
+        try:
+            return data.fget(serializer)
+        finally:
+            stats.serializer_seconds += time.perf_counter() - started
+            stats.serializing = False
+
+    timed_data.instrumented = True
+    serializers.BaseSerializer.data = property(timed_data)
+
+
+def endpoint_name(request):
+    # Viewset.action for DRF routes, the dotted view path otherwise; one label for every 404
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    view_class = getattr(match.func, 'cls', None)
+    actions = getattr(match.func, 'actions', None)
+    if view_class is not None and actions:
+        return f'{view_class.__name__}.{actions.get(request.method.lower(), request.method.lower())}'
+    if view_class is not None:
+        return f'{view_class.__name__}.{request.method.lower()}'
+    return match._func_path
+
+
+class RequestMetricsMiddleware:
+    """Records wall time, query count, DB time, serializer time and response size per endpoint.
+
+    Works for sync and async views alike. Requests slower than
+    REQUEST_METRICS['slow_request_seconds'] are logged with their slowest SQL.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        instrument_serializers()
+        # Connections opened before this middleware was loaded missed connection_created
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, started = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        self.finish(request, response, stats, started)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, started = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        self.finish(request, response, stats, started)
+        return response
+
+    def start(self, request):
+        stats = RequestStats()
+        return stats, current_stats.set(stats), time.perf_counter()
+
+    def finish(self, request, response, stats, started):
+        stats.duration = time.perf_counter() - started
+        if not response.streaming:
+            stats.response_bytes = len(response.content)
+        endpoint = endpoint_name(request)
+        if endpoint == METRICS_ENDPOINT:
+            return
+        registry.record(endpoint, stats)
+
+        threshold = METRICS_SETTINGS['slow_request_seconds']
+        if threshold is not None and stats.duration >= threshold:
+            slowest = heapq.nlargest(METRICS_SETTINGS['slow_request_queries'], stats.statements, key=lambda s: s[0])
+            logger.warning(
+                'Slow request %s %s (%s): %.3fs, %d queries in %.3fs, serializers %.3fs%s',
+                request.method, request.path, endpoint, stats.duration, stats.queries, stats.db_seconds,
+                stats.serializer_seconds, ''.join(f'\n  {seconds * 1000:.1f} ms  {sql}' for seconds, sql in slowest),
+            )
+
+
+def metrics(request):
+    # Prometheus scrape endpoint
+    allowed = METRICS_SETTINGS['allowed_ips']
+    if allowed is not None and request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
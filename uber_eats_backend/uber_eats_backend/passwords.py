@@ -0,0 +1,198 @@
+import asyncio
+import functools
+import json
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+
+# Only with Django's default backend can authenticate() take the pooled fast path
+MODEL_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+# What Django puts in place of the password in user_login_failed's credentials
+CLEANSED_SUBSTITUTE = '********************'
+
+
+class HashingPoolSaturated(Exception):
+    # Too many hashes already queued; retry_after is a hint in whole seconds
+    def __init__(self, retry_after):
+        super().__init__(f'Password hashing pool is saturated, retry in {retry_after}s')
+        self.retry_after = retry_after
+
+
+def _setup_worker(niceness):
+    # Lower priority, so on a busy host the CPU goes to serving requests before hashing
+    if niceness and hasattr(os, 'nice'):
+        os.nice(niceness)
+    # Spawned workers start from a fresh interpreter, so load the settings (for the hashers) first
+    import django
+    django.setup()
+
+
+def _check_password(password, encoded):
+    # (valid, must_update): check_password calls the setter when the hash is outdated
+    from django.contrib.auth.hashers import check_password
+    outdated = []
+    return check_password(password, encoded, setter=outdated.append), bool(outdated)
+
+
+def _make_password(password):
+    from django.contrib.auth.hashers import make_password
+    return make_password(password)
+
+
+class HashingPool:
+    """Bounded process pool for password hashing, with fail-fast admission.
+
+    At most max_pending hashes may be queued or running at once; past that,
+    submit() raises HashingPoolSaturated instead of queueing, so a login
+    storm turns into quick 429s rather than workers stuck waiting. Workers
+    are spawned (not forked) because the server process has threads.
+    """
+
+    def __init__(self, workers=2, max_pending=16, niceness=10):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.niceness = niceness
+        self.pending = 0
+        self.average_seconds = 0.1  # Moving average of one hash, for Retry-After
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_setup_worker,
+                    initargs=(self.niceness,),
+                )
+            return self._executor
+
+    def check_capacity(self):
+        # Cheap early rejection, before a request spends any database work on a hash it won't get
+        if self.pending >= self.max_pending:
+            raise HashingPoolSaturated(self.retry_after())
+
+    def retry_after(self):
+        # Time for the current backlog to drain, rounded up to whole seconds
+        return max(1, math.ceil(self.pending / self.workers * self.average_seconds))
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise HashingPoolSaturated(self.retry_after())
+            self.pending += 1
+        started = time.monotonic()
+        try:
+            future = self.executor().submit(fn, *args)
+        except BaseException:
+            with self._lock:
+                self.pending -= 1
+            raise
+        # The slot frees up when the worker is done with the job, not when the caller stops
+        # waiting: a cancelled request (client gone) leaves its hash running in the worker
+        future.add_done_callback(lambda _: self._finished(started))
+        return await asyncio.wrap_future(future)
+
+    def _finished(self, started):
+        with self._lock:
+            self.pending -= 1
+            self.average_seconds = 0.8 * self.average_seconds + 0.2 * (time.monotonic() - started)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+hashing_pool = HashingPool(**getattr(settings, 'PASSWORD_HASHING_POOL', {}))
+
+
+async def check_password(password, encoded):
+    """(valid, must_update) for a password against its stored hash, checked in the pool."""
+    if not password or not encoded:
+        return False, False
+    return await hashing_pool.run(_check_password, password, encoded)
+
+
+async def make_password(password):
+    return await hashing_pool.run(_make_password, password)
+
+
+async def authenticate(request, username, password):
+    """Async stand-in for django.contrib.auth.authenticate with ModelBackend.
+
+    The user lookup uses the async ORM and the hashes run in hashing_pool;
+    otherwise it behaves like ModelBackend: inactive users are refused,
+    outdated hashes are upgraded on a successful login, and failures send
+    user_login_failed. Unknown usernames still pay for one hash, so response
+    time doesn't reveal which usernames exist. With other AUTHENTICATION_BACKENDS
+    configured, it defers to Django's aauthenticate().
+    """
+    from django.contrib.auth import aauthenticate, get_user_model
+    from django.contrib.auth.signals import user_login_failed
+    if settings.AUTHENTICATION_BACKENDS != [MODEL_BACKEND]:
+        return await aauthenticate(request, username=username, password=password)
+    if username is None or password is None:
+        return None
+    User = get_user_model()
+    user = await User._default_manager.filter(**{User.USERNAME_FIELD: username}).afirst()
+    if user is None:
+        await make_password(password)
+    else:
+        valid, must_update = await check_password(password, user.password)
+        if valid and user.is_active:
+            if must_update:
+                # What user.set_password() does, with the new hash made in the pool too
+                user.password = await make_password(password)
+                await user.asave(update_fields=['password'])
+            return user
+    await user_login_failed.asend(
+        sender=__name__, credentials={'username': username, 'password': CLEANSED_SUBSTITUTE}, request=request,
+    )
+    return None
+
+
+def _request_data(request):
+    # JSON from the React app, form or multipart from anything else
+    if request.content_type == 'application/json':
+        data = json.loads(request.body or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError('Expected a JSON object')
+        return data
+    return request.POST
+
+
+def async_auth_view(view):
+    """Turn `async def view(request, data)` into a POST-only credentials endpoint.
+
+    `data` is the parsed request body. Like the DRF views it replaces, the
+    endpoint is CSRF-exempt. A saturated hashing pool becomes 429 with
+    Retry-After.
+    """
+    @csrf_exempt
+    @require_POST
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            data = _request_data(request)
+        except ValueError:
+            return JsonResponse({'error': 'Malformed request body'}, status=400)
+        try:
+            hashing_pool.check_capacity()
+            return await view(request, data, *args, **kwargs)
+        except HashingPoolSaturated as e:
+            response = JsonResponse({'error': 'Too many sign-in attempts in progress, try again shortly'}, status=429)
+            response['Retry-After'] = str(e.retry_after)
+            return response
+    return wrapper
@@ -0,0 +1,97 @@
+import re
+from collections import namedtuple
+
+from django.contrib.auth.models import User
+from django.http import HttpRequest
+from rest_framework.request import Request
+
+# One EXPLAIN result: the full plan and the lines that read (or sort) every matching row
+QueryPlan = namedtuple('QueryPlan', ['name', 'plan', 'full_scans'])
+
+# SQLite reports "SCAN <table> ...", PostgreSQL "Seq Scan on <table>"
+FULL_SCAN_PATTERNS = [re.compile(r'\bSCAN (?!CONSTANT ROW)(?!\()(\w+)'), re.compile(r'\bSeq Scan on (\w+)')]
+
+# Queries that may read a whole table, and why
+ALLOWED_FULL_SCANS = {
+    'CustomerViewSet.list': 'lists every customer by design',
+    # IdCursorPagination is opt-in; the paged shape is checked separately as .list?cursor
+    'RestaurantViewSet.list': 'without ?cursor or ?page_size the whole catalogue is returned, for older clients',
+    'DishViewSet.list': 'without ?cursor or ?page_size every dish is returned, for older clients',
+}
+
+# Identifier used for every parameter in the plans; EXPLAIN doesn't care whether the row exists
+SAMPLE_PK = 1
+
+
+def sample_user():
+    """An unsaved user with both a customer and a restaurant profile, for building querysets."""
+    from customers.models import Customer
+    from restaurants.models import Restaurant
+    user = User(pk=SAMPLE_PK, username='query-plan-check')
+    for accessor, profile in (('customer', Customer(pk=SAMPLE_PK, user=user)), ('restaurant', Restaurant(pk=SAMPLE_PK, user=user))):
+        getattr(User, accessor).related.set_cached_value(user, profile)
+    return user
+
+
+def viewset_querysets(user):
+    # (name, queryset) for each router viewset's list and detail lookups, as the views build them
+    from uber_eats_backend.urls import router
+    for prefix, viewset, basename in router.registry:
+        request = Request(HttpRequest())
+        request.user = user
+        view = viewset(request=request, action='list', kwargs={}, format_kwarg=None)
+        queryset = view.get_queryset()
+        paginator = view.paginator
+        if getattr(paginator, 'ordering', None):
+            # Cursor-paginated lists read one ordered page at a time
+            yield f'{viewset.__name__}.list?cursor', queryset.order_by(paginator.ordering)[:paginator.page_size]
+        if not getattr(paginator, 'ordering', None) or getattr(paginator, 'opt_in', False):
+            # Without a paginator that always applies, the plain list is what requests run
+            yield f'{viewset.__name__}.list', queryset
+        yield f'{viewset.__name__}.retrieve', view.get_queryset().filter(pk=SAMPLE_PK)
+
+
+def action_querysets(user):
+    # (name, queryset) for the hot lookups the custom actions make
+    from customers.models import CartItem, DeliveryAddress, FavoriteRestaurant, Order, OrderSummary
+    from customers.pagination import OrderHistoryCursorPagination
+    customer = user.customer
+    page_size = OrderHistoryCursorPagination.page_size + 1
+    yield 'OrderViewSet.place_order', CartItem.objects.filter(customer=customer, restaurant_id=SAMPLE_PK, state='placing')
+    yield 'OrderViewSet.order_history', Order.objects.filter(customer=customer).order_by('-created_at', '-id')[:page_size]
+    yield 'RestaurantViewSet.getOrders', Order.objects.filter(restaurant=SAMPLE_PK)
+    yield 'RestaurantViewSet.getOrders?status', Order.objects.filter(restaurant=SAMPLE_PK, status='new')
+    yield 'RestaurantViewSet.order_summaries', (
+        OrderSummary.objects.filter(restaurant_id=SAMPLE_PK, status='new').order_by('-created_at', '-id')[:page_size]
+    )
+    yield 'FavoriteRestaurantViewSet.toggle_favorite', FavoriteRestaurant.objects.filter(customer=customer, restaurant_id=SAMPLE_PK)
+    yield 'DeliveryAddressViewSet.default', DeliveryAddress.objects.filter(customer=customer, is_default=True)
+
+
+def full_scans(plan, bounded=False):
+    """Plan lines that read every row a query matches rather than just the rows it returns.
+
+    Table scans count. With bounded=True (the query has a LIMIT) a scan that
+    walks the table in the requested order stops after the page, so it is
+    fine; what counts there is having to sort all the matches first.
+    """
+    lines = plan.splitlines()
+    scans = [line for line in lines if any(pattern.search(line) for pattern in FULL_SCAN_PATTERNS)]
+    if not bounded:
+        return scans
+    sorts = [line for line in lines if 'USE TEMP B-TREE FOR ORDER BY' in line]
+    return scans + sorts if sorts else []
+
+
+def check_query_plans():
+    """EXPLAIN every viewset and hot action query; returns a QueryPlan per query."""
+    user = sample_user()
+    results = []
+    for name, queryset in [*viewset_querysets(user), *action_querysets(user)]:
+        if queryset.query.is_empty():
+            continue  # .none() never reaches the database
+        plan = queryset.explain()
+        bounded = queryset.query.high_mark is not None
+        scans = [] if name in ALLOWED_FULL_SCANS else full_scans(plan, bounded=bounded)
+        results.append(QueryPlan(name, plan, scans))
+    return results
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from uber_eats_backend.log import logger_levels
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -49,15 +52,59 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'customers.authentication.CachedTokenAuthentication',
     ],
 }
 
+# Password hashing for login/signup runs in this process pool; past max_pending
+# queued hashes the endpoints answer 429 with Retry-After instead of waiting
+PASSWORD_HASHING_POOL = {
+    'workers': 2,
+    'max_pending': 16,
+    'niceness': 10,  # Workers run at lower CPU priority than the request handlers
+}
+
+# Resolved tokens are cached per process; saves and logout drop entries early
+TOKEN_AUTH_CACHE = {
+    'timeout': 60,
+    'max_entries': 10_000,
+}
+
+# Per-endpoint histograms served on /metrics; requests slower than slow_request_seconds
+# are logged with their slowest SQL statements
+REQUEST_METRICS = {
+    'slow_request_seconds': 1.0,
+    'slow_request_queries': 5,
+    'allowed_ips': ['127.0.0.1', '::1'],  # Prometheus scraper addresses; None lets anyone read them
+}
+
+# Renders thumbnails and responsive sizes of uploaded images; workers=0 renders inline
+IMAGE_VARIANTS_POOL = {
+    'workers': 1,
+    'niceness': 10,
+}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# How uber_eats_backend.media serves MEDIA_URL. Behind nginx, set 'offload': 'x-accel-redirect' with
+# `location /protected-media/ { internal; alias <MEDIA_ROOT>/; }` so the proxy sends the bytes
+MEDIA_SERVING = {
+    'offload': None,
+    'max_age': 3600,  # Seconds before an original upload is revalidated; variants are cached for good
+}
+
+# Serialized restaurant menus; use restaurants.cache.FileMenuCache to share it across worker processes
+MENU_CACHE = {
+    'BACKEND': 'restaurants.cache.LocMemMenuCache',
+    'OPTIONS': {
+        'max_bytes': 32 * 1024 * 1024,
+    },
+}
 ###Added
 
 MIDDLEWARE = [
+    'uber_eats_backend.metrics.RequestMetricsMiddleware',  # First, so its timings cover the other middleware
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -90,6 +137,21 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'uber_eats_backend.wsgi.application'
+ASGI_APPLICATION = 'uber_eats_backend.asgi.application'
+# Under ASGI, answer GETs of the hottest reads with the async views of uber_eats_backend.asgi_urls.
+# Off until benchmark_async_views shows them ahead of the viewsets; WSGI always serves the viewsets.
+ASYNC_READ_VIEWS = False
+
+# Offline geocoder filling latitude/longitude on restaurants and delivery addresses
+GEOCODER = {
+    'BACKEND': 'restaurants.geo.PostalCodeGeocoder',
+    'OPTIONS': {
+        'path': BASE_DIR / 'restaurants' / 'data' / 'postal_codes.csv',
+    },
+}
+
+# Pub/sub behind the order status stream (/api/stream/orders/, ASGI only)
+ORDER_EVENT_BROKER = 'customers.events.LocalBroker'
 
 
 # Database
@@ -99,6 +161,14 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Writers wait up to this many seconds for the write lock (see customers.cart.lock_cart_rows)
+            'timeout': 20,
+        },
+        'TEST': {
+            # A file-backed test database so concurrent tests see real SQLite locking
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -153,16 +223,38 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:3000",
 ]  
 
+# Records go through a queue to a background thread, so logging never blocks a request on I/O.
+# Per-module levels below can be overridden with DJANGO_LOG_LEVELS="customers=DEBUG,restaurants=WARNING";
+# DJANGO_LOG_SAMPLE_RATE keeps only that fraction of INFO and DEBUG records
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'structured': {
+            '()': 'uber_eats_backend.log.StructuredFormatter',
+        },
+    },
+    'filters': {
+        'sample': {
+            '()': 'uber_eats_backend.log.SamplingFilter',
+            'rate': os.environ.get('DJANGO_LOG_SAMPLE_RATE', 1.0),
+        },
+    },
     'handlers': {
         'console': {
-            'class': 'logging.StreamHandler',
+            '()': 'uber_eats_backend.log.AsyncQueueHandler',
+            'formatter': 'structured',
+            'filters': ['sample'],
         },
     },
     'root': {
         'handlers': ['console'],
         'level': 'INFO',
     },
-}
\ No newline at end of file
+    'loggers': logger_levels({
+        'customers': 'INFO',
+        'restaurants': 'INFO',
+        'uber_eats_backend': 'INFO',
+        'django.db.backends': 'WARNING',
+    }),
+}
@@ -1,10 +1,11 @@
 from django.contrib import admin
 from django.urls import path, include
-from django.conf.urls.static import static
 from django.conf import settings
 from rest_framework.routers import DefaultRouter
-from customers.views import CustomerViewSet, OrderViewSet, FavoriteRestaurantViewSet, CartItemViewSet, DeliveryAddressViewSet, me, CustomAuthToken
-from restaurants.views import RestaurantViewSet, DishViewSet
+from customers.views import CustomerViewSet, OrderViewSet, FavoriteRestaurantViewSet, CartItemViewSet, DeliveryAddressViewSet, me, customer_login, customer_signup
+from restaurants.views import RestaurantViewSet, DishViewSet, search, restaurant_login, restaurant_signup
+from uber_eats_backend.media import serve_media
+from uber_eats_backend.metrics import metrics
 
 # Create a router object to handle API routes
 router = DefaultRouter()
@@ -19,10 +20,18 @@ router.register(r'delivery-addresses', DeliveryAddressViewSet, basename='deliver
 # Define URL patterns for the application
 urlpatterns = [
     path('admin/', admin.site.urls),  # Admin site URL
+    # Async credential endpoints, listed ahead of the router so they take these paths
+    path('api/customers/login/', customer_login, name='customer_login'),  # URL for customer login
+    path('api/customers/signup/', customer_signup, name='customer_signup'),  # URL for customer signup
+    path('api/restaurants/login/', restaurant_login, name='restaurant_login'),  # URL for restaurant login
+    path('api/restaurants/signup/', restaurant_signup, name='restaurant_signup'),  # URL for restaurant signup
     path('api/', include(router.urls)),  # Include the router's URLs under the 'api/' path
     path('api/restaurants/dashboard/', RestaurantViewSet.as_view({'get': 'dashboard'}), name='restaurant_dashboard'),  # URL for restaurant dashboard
     path('api/restaurants/<int:pk>/', RestaurantViewSet.as_view({'get': 'retrieve'}), name='restaurant-detail'),  # URL for retrieving a specific restaurant by ID
     path('api/restaurants/<int:pk>/orders/', RestaurantViewSet.as_view({'get': 'getOrders'}), name='restaurant-orders'),  # URL for getting orders for a specific restaurant
     path('api/restaurants/<int:pk>/dishes/', RestaurantViewSet.as_view({'get': 'list_dishes'}), name='restaurant-dishes'),  # URL for listing dishes of a specific restaurant
-    path('api/customers/login/', CustomAuthToken.as_view(), name='api_token_auth'),  # URL for customer login via token authentication
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)  # Serve media files during development
\ No newline at end of file
+    path('api/search/', search, name='search'),  # URL for full-text search over restaurants and dishes
+    path('metrics', metrics, name='metrics'),  # Per-endpoint request histograms for Prometheus
+    # Uploaded files, with ranges and cache headers; under ASGI uber_eats_backend.asgi answers these before Django
+    path(f'{settings.MEDIA_URL.lstrip("/")}<path:path>', serve_media, name='media'),
+]
\ No newline at end of file